@@ -0,0 +1,80 @@
+"""
+Recall@k and latency of SimpleVectorStore's IVF index against exact search.
+
+Vectors are drawn around random cluster centres, which is closer to real sentence
+embeddings than isotropic noise (on which no coarse quantizer can do well).
+
+Usage:
+    python benchmarks/bench_ann.py --size 100000 --nprobe 1 4 16 64
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.append(str(project_root))
+
+from src.retrieval.embedding_matrix import EmbeddingMatrix
+from src.retrieval.vector_store import SimpleVectorStore
+
+
+def clustered_vectors(rng, size, dim, clusters, spread=1.5):
+    centres = rng.standard_normal((clusters, dim), dtype=np.float32)
+    vectors = centres[rng.integers(0, clusters, size)]
+    vectors += spread * rng.standard_normal((size, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--clusters', type=int, default=2000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--n-lists', type=int, default=None)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = clustered_vectors(rng, args.size + args.queries, args.dim, args.clusters)
+    corpus, queries = vectors[:args.size], vectors[args.size:]
+
+    with tempfile.TemporaryDirectory() as storage_dir:
+        store = SimpleVectorStore(storage_dir, index_type="ivf", ann_params={'n_lists': args.n_lists})
+        store.text.records = [{'chunk_id': i} for i in range(args.size)]
+        store.text.embeddings = EmbeddingMatrix(corpus)
+
+        start = time.perf_counter()
+        store.build_ann_indexes()
+        print(f"Trained IVF with {store.text.ann.n_lists} lists on {args.size} vectors "
+              f"in {time.perf_counter() - start:.1f}s")
+
+        def run(**search_args):
+            latencies, results = [], []
+            for query in queries:
+                start = time.perf_counter()
+                hits = store.search_text(query, top_k=args.top_k, **search_args)
+                latencies.append(time.perf_counter() - start)
+                results.append({hit['chunk_id'] for hit in hits})
+            latencies = np.array(latencies) * 1000
+            return results, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+        exact, p50, p99 = run(exact=True)
+        print(f"{'search':>12} {'recall@' + str(args.top_k):>10} {'p50 ms':>8} {'p99 ms':>8}")
+        print(f"{'exact':>12} {1.0:>10.3f} {p50:>8.2f} {p99:>8.2f}")
+
+        for nprobe in args.nprobe:
+            approx, p50, p99 = run(nprobe=nprobe)
+            recall = np.mean([len(a & e) / len(e) for a, e in zip(approx, exact)])
+            print(f"{'nprobe=' + str(nprobe):>12} {recall:>10.3f} {p50:>8.2f} {p99:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
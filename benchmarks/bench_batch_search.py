@@ -0,0 +1,55 @@
+"""
+Throughput of SimpleVectorStore.search_text_many against one search_text call per query.
+
+Usage:
+    python benchmarks/bench_batch_search.py --size 100000 --queries 1000 2000
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.append(str(project_root))
+
+from benchmarks.bench_vector_search import make_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--queries', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--top-k', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((args.size, args.dim), dtype=np.float32)
+
+    with tempfile.TemporaryDirectory() as storage_dir:
+        store = make_store(embeddings, storage_dir)
+        print(f"{'queries':>8} {'loop q/s':>10} {'batch q/s':>10} {'speedup':>8}")
+
+        for count in args.queries:
+            queries = rng.standard_normal((count, args.dim), dtype=np.float32)
+
+            start = time.perf_counter()
+            looped = [store.search_text(query, top_k=args.top_k, exact=True) for query in queries]
+            loop_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            batched = store.search_text_many(queries, top_k=args.top_k)
+            batch_seconds = time.perf_counter() - start
+
+            same = all([hit['chunk_id'] for hit in a] == [hit['chunk_id'] for hit in b]
+                       for a, b in zip(looped, batched))
+            print(f"{count:>8} {count / loop_seconds:>10.1f} {count / batch_seconds:>10.1f} "
+                  f"{loop_seconds / batch_seconds:>7.1f}x{'' if same else '  (results differ)'}")
+
+
+if __name__ == "__main__":
+    main()
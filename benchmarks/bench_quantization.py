@@ -0,0 +1,114 @@
+"""
+Load time, memory, recall@k and latency of SimpleVectorStore with binary quantization.
+
+Each configuration opens the same clustered corpus from its segment files in a fresh
+process and searches it with the default search_text, as an application would; recall
+is measured against exact float32 search. Memory is the growth of the process's
+resident set size (RSS) from opening the store to the end of its queries, split into
+anonymous memory (the process's own allocations) and file pages of the memory-mapped
+segments and codes it read, which the kernel can reclaim.
+
+Usage:
+    python benchmarks/bench_quantization.py --size 100000 --dims 384 512 --rescore 4 10 20
+"""
+import argparse
+import multiprocessing
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.append(str(project_root))
+
+from benchmarks.bench_ann import clustered_vectors
+from src.retrieval.segment_log import SegmentLog
+from src.retrieval.vector_store import SimpleVectorStore
+
+
+def resident_mb():
+    """
+    (anonymous, file-backed) RSS of this process in MB.
+
+    Where /proc is not available, the peak RSS is reported as anonymous memory.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            fields = dict(line.split(':', 1) for line in f)
+        return int(fields['RssAnon'].split()[0]) / 1e3, int(fields['RssFile'].split()[0]) / 1e3
+    except (OSError, KeyError):
+        import resource
+        # Kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return (peak / 1e6 if sys.platform == 'darwin' else peak / 1e3), 0.0
+
+
+def run(store, queries, top_k):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = store.search_text(query, top_k=top_k)
+        latencies.append(time.perf_counter() - start)
+        results.append({hit['chunk_id'] for hit in hits})
+    latencies = np.array(latencies) * 1000
+    return results, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def measure(storage_dir, queries, top_k, quantization, factor):
+    """Open the store and run the queries; returns (results, load s, anon MB, file MB, p50, p99)."""
+    before = resident_mb()
+    start = time.perf_counter()
+    store = SimpleVectorStore(storage_dir, quantization=quantization, rescore_factor=factor,
+                              lexical_index=False)
+    load = time.perf_counter() - start
+    results, p50, p99 = run(store, queries, top_k)
+    anon, mapped = np.subtract(resident_mb(), before)
+    return results, load, anon, mapped, p50, p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--dims', type=int, nargs='+', default=[384, 512],
+                        help="384 matches MiniLM text vectors, 512 CLIP image vectors")
+    parser.add_argument('--clusters', type=int, default=2000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--rescore', type=int, nargs='+', default=[4, 10, 20],
+                        help="Shortlist sizes to try, as multiples of top-k")
+    args = parser.parse_args()
+
+    print(f"{'dim':>5} {'mode':>12} {'load s':>7} {'anon MB':>8} {'file MB':>8} "
+          f"{'recall@' + str(args.top_k):>10} {'p50 ms':>8} {'p99 ms':>8}")
+
+    for dim in args.dims:
+        rng = np.random.default_rng(0)
+        vectors = clustered_vectors(rng, args.size + args.queries, dim, args.clusters)
+        corpus, queries = vectors[:args.size], vectors[args.size:]
+
+        with tempfile.TemporaryDirectory() as storage_dir:
+            SegmentLog(storage_dir, "text").append([{'chunk_id': i} for i in range(args.size)], corpus)
+            # The first quantized open encodes the codes and saves them next to the segment
+            SimpleVectorStore(storage_dir, quantization='binary', lexical_index=False)
+
+            for quantization in [None, 'binary']:
+                for factor in ([None] if quantization is None else args.rescore):
+                    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                        results, load, anon, mapped, p50, p99 = pool.submit(
+                            measure, storage_dir, queries, args.top_k, quantization, factor
+                        ).result()
+                    if quantization is None:
+                        exact, mode = results, 'float32'
+                    else:
+                        mode = f"{quantization} x{factor}"
+                    recall = np.mean([len(a & e) / len(e) for a, e in zip(results, exact)])
+                    print(f"{dim:>5} {mode:>12} {load:>7.2f} {anon:>8.1f} {mapped:>8.1f} "
+                          f"{recall:>10.3f} {p50:>8.2f} {p99:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Query throughput of ShardedVectorStore with increasing shard counts against one store.
+
+Vectors are added in documents of --document-size rows, so they spread over the shards
+the way ingested PDFs would. Each configuration reports single-query p50/p99 latency
+and the throughput of search_text_many, and checks that results match the single store.
+
+Usage:
+    python benchmarks/bench_sharded.py --size 200000 --shards 1 2 4 8
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.append(str(project_root))
+
+from benchmarks.bench_vector_search import time_queries
+from src.retrieval.sharded_store import ShardedVectorStore
+from src.retrieval.vector_store import SimpleVectorStore
+
+
+def fill(store, embeddings, document_size):
+    for start in range(0, len(embeddings), document_size):
+        store.add_text_vectors([
+            {'document_id': f"doc_{start // document_size}.pdf", 'chunk_id': f"chunk_{i}", 'page_num': 1,
+             'chunk_type': 'text', 'embedding': embeddings[i]}
+            for i in range(start, min(start + document_size, len(embeddings)))
+        ])
+
+
+def measure(store, queries, batch, top_k):
+    p50, p99 = time_queries(lambda q: store.search_text(q, top_k=top_k), queries)
+    start = time.perf_counter()
+    results = store.search_text_many(batch, top_k=top_k)
+    throughput = len(batch) / (time.perf_counter() - start)
+    return p50, p99, throughput, [[hit['chunk_id'] for hit in hits] for hits in results]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=200000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--document-size', type=int, default=500)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--batch', type=int, default=2000)
+    parser.add_argument('--top-k', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((args.size, args.dim), dtype=np.float32)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    batch = rng.standard_normal((args.batch, args.dim), dtype=np.float32)
+
+    print(f"{'shards':>8} {'p50 ms':>8} {'p99 ms':>8} {'batch q/s':>10}")
+    with tempfile.TemporaryDirectory() as storage_dir:
+        store = SimpleVectorStore(f"{storage_dir}/single")
+        fill(store, embeddings, args.document_size)
+        p50, p99, throughput, expected = measure(store, queries, batch, args.top_k)
+        print(f"{'single':>8} {p50:>8.2f} {p99:>8.2f} {throughput:>10.1f}")
+        del store
+
+        for num_shards in args.shards:
+            with ShardedVectorStore(f"{storage_dir}/sharded_{num_shards}", num_shards=num_shards) as store:
+                fill(store, embeddings, args.document_size)
+                p50, p99, throughput, results = measure(store, queries, batch, args.top_k)
+                same = '' if results == expected else '  (results differ)'
+                print(f"{num_shards:>8} {p50:>8.2f} {p99:>8.2f} {throughput:>10.1f}{same}")
+
+
+if __name__ == "__main__":
+    main()
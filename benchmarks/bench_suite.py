@@ -0,0 +1,269 @@
+"""
+Offline end-to-end benchmark of ingestion, store loading, retrieval and answering.
+
+Each corpus is either a synthetic one of the given number of pages (see
+benchmarks/stubs.generate_pdf) or "raw", the PDFs in data/raw. Documents go through the
+real PDFProcessor, IngestionPipeline, SimpleVectorStore, MultimodalRetriever and
+ResponseBuilder; only the models are replaced by deterministic stubs, OCR by a fixed
+string and the LLM API by a local fake endpoint, so runs need no network or weights and
+are comparable between commits.
+
+Every corpus runs in its own process so that its peak RSS is measured in isolation.
+Results are written as JSON; pass a previous results file to --compare to print the
+change of every metric.
+
+Usage:
+    python benchmarks/bench_suite.py --corpora 50 200 1000 raw
+    python benchmarks/bench_suite.py --corpora 50 200 --compare benchmarks/results/suite-<time>.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.append(str(project_root))
+
+from benchmarks.bench_vector_search import percentiles
+
+
+# Metrics where a lower value is better, for --compare
+LOWER_IS_BETTER = ('seconds', '_ms', 'rss')
+
+
+def run_corpus(corpus, args):
+    """Benchmark one corpus in this process and return its metrics."""
+    from benchmarks.stubs import (
+        StubTextEmbedder, StubImageEmbedder, StubOCREngine, FakeLLMServer, generate_pdf, VOCABULARY, IDENTIFIERS
+    )
+    from src.ingestion.pdf_processor import PDFProcessor
+    from src.ingestion.pipeline import IngestionPipeline
+    from src.retrieval.vector_store import SimpleVectorStore
+    from src.retrieval.retriever import MultimodalRetriever
+    from src.generation.llm_interface import LLMInterface
+    from src.generation.response_builder import ResponseBuilder
+    from src.utils.metrics import metrics, STAGE_HISTOGRAM
+
+    rng = np.random.default_rng(args.seed)
+    results = {'corpus': corpus}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        if corpus == 'raw':
+            raw_dir = project_root / 'data' / 'raw'
+            pdf_paths = sorted(str(path) for path in raw_dir.glob('*.pdf'))
+        else:
+            start = time.perf_counter()
+            pdf_paths = []
+            pages = int(corpus)
+            for i, first_page in enumerate(range(0, pages, args.pages_per_document)):
+                path = os.path.join(work_dir, f"synthetic_{i:04d}.pdf")
+                generate_pdf(path, min(args.pages_per_document, pages - first_page), rng)
+                pdf_paths.append(path)
+            results['generate_seconds'] = time.perf_counter() - start
+        results['documents'] = len(pdf_paths)
+
+        # Ingestion
+        storage_dir = os.path.join(work_dir, 'embeddings')
+        text_embedder = StubTextEmbedder()
+        image_embedder = StubImageEmbedder()
+        store = SimpleVectorStore(storage_dir)
+        pipeline = IngestionPipeline(
+            PDFProcessor(ocr_engine=StubOCREngine(), num_workers=args.workers),
+            text_embedder, image_embedder, store
+        )
+
+        counts = {'pages': 0, 'text_vectors': 0, 'image_vectors': 0}
+        start = time.perf_counter()
+        for path in pdf_paths:
+            stats = pipeline.ingest(path)
+            for key in counts:
+                counts[key] += stats[key]
+        ingest_seconds = time.perf_counter() - start
+
+        results.update(
+            pages=counts['pages'],
+            chunks=counts['text_vectors'],
+            images=counts['image_vectors'],
+            ingest_seconds=ingest_seconds,
+            pages_per_second=counts['pages'] / ingest_seconds,
+            chunks_per_second=counts['text_vectors'] / ingest_seconds,
+            images_per_second=counts['image_vectors'] / ingest_seconds
+        )
+        del pipeline, store
+
+        # Store load (a fresh process opening an existing index)
+        start = time.perf_counter()
+        store = SimpleVectorStore(storage_dir)
+        results['store_load_seconds'] = time.perf_counter() - start
+
+        # Retrieval; distinct queries so the result cache never answers
+        retriever = MultimodalRetriever(store, text_embedder, image_embedder)
+        queries = []
+        for i in range(args.queries):
+            words = list(rng.choice(VOCABULARY, size=int(rng.integers(3, 9))))
+            if i % 2:
+                words.append(str(rng.choice(IDENTIFIERS)))
+            queries.append(f"{' '.join(words)} {i}")
+
+        for mode in ('text', 'lexical_hybrid'):
+            latencies = []
+            for query in queries:
+                query_start = time.perf_counter()
+                retriever.retrieve(query, top_k=args.top_k, mode=mode)
+                latencies.append(time.perf_counter() - query_start)
+            p50, p99 = percentiles(latencies)
+            results[f'{mode}_query_p50_ms'] = p50
+            results[f'{mode}_query_p99_ms'] = p99
+
+        # Retrieval plus a streamed answer from the fake LLM endpoint
+        with FakeLLMServer(args.llm_first_token_delay, args.llm_token_delay) as server:
+            llm = LLMInterface(api_key='benchmark', model='fake', base_url=server.base_url)
+            response_builder = ResponseBuilder(llm, work_dir)
+            first_token, total = [], []
+            for query in queries[:args.answer_queries]:
+                query_start = time.perf_counter()
+                items = retriever.retrieve(f"answer {query}", top_k=args.top_k)
+                responses = response_builder.stream_response(query, items, include_images=False)
+                next(responses)
+                first_token.append(time.perf_counter() - query_start)
+                for _ in responses:
+                    pass
+                total.append(time.perf_counter() - query_start)
+            llm.http_client.close()
+
+        results['answer_ttft_p50_ms'], results['answer_ttft_p99_ms'] = percentiles(first_token)
+        results['answer_total_p50_ms'], results['answer_total_p99_ms'] = percentiles(total)
+
+    # Where the time went, per instrumented stage (see src/utils/metrics.py)
+    results['stage_seconds'] = {
+        ",".join(f"{key}={value}" for key, value in sorted(labels.items())): state['sum']
+        for name, labels, state in metrics.snapshot()['histograms'] if name == STAGE_HISTOGRAM
+    }
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results['peak_rss_mb'] = max_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    return results
+
+
+def run_in_subprocess(corpus, args):
+    """Run one corpus in a child process (for an isolated peak RSS) and return its metrics."""
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+        result_file = f.name
+    try:
+        command = [sys.executable, __file__, '--single-corpus', corpus, '--result-file', result_file,
+                   '--pages-per-document', str(args.pages_per_document), '--queries', str(args.queries),
+                   '--answer-queries', str(args.answer_queries), '--top-k', str(args.top_k),
+                   '--workers', str(args.workers), '--seed', str(args.seed),
+                   '--llm-first-token-delay', str(args.llm_first_token_delay),
+                   '--llm-token-delay', str(args.llm_token_delay)]
+        # The pipeline's progress output goes to the child's stdout; keep ours for the summary
+        completed = subprocess.run(command, stdout=subprocess.DEVNULL)
+        if completed.returncode != 0:
+            print(f"Benchmark of corpus {corpus} failed with exit code {completed.returncode}")
+            return None
+        with open(result_file) as f:
+            return json.load(f)
+    finally:
+        os.remove(result_file)
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=project_root, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def compare(previous, current):
+    """Print the relative change of every metric of corpora present in both runs."""
+    before = {result['corpus']: result for result in previous['results']}
+    print(f"\nChange against {previous['environment'].get('commit') or 'previous run'}:")
+    for result in current['results']:
+        old = before.get(result['corpus'])
+        if old is None:
+            continue
+        print(f"corpus {result['corpus']}:")
+        for metric, value in result.items():
+            if metric == 'corpus' or not isinstance(value, (int, float)) or not old.get(metric):
+                continue
+            change = (value - old[metric]) / old[metric] * 100
+            worse = change > 0 if metric.endswith(LOWER_IS_BETTER) else change < 0
+            flag = '  (worse)' if worse and abs(change) >= 10 else ''
+            print(f"  {metric:<28} {old[metric]:>12.2f} -> {value:>12.2f} {change:>+8.1f}%{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--corpora', nargs='+', default=['50', '200', '1000', 'raw'],
+                        help="Synthetic corpus sizes in pages, and/or 'raw' for data/raw")
+    parser.add_argument('--pages-per-document', type=int, default=25)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--answer-queries', type=int, default=20)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=1, help="PDFProcessor worker processes")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--llm-first-token-delay', type=float, default=0.05)
+    parser.add_argument('--llm-token-delay', type=float, default=0.002)
+    parser.add_argument('--output', help="Results file (default: benchmarks/results/suite-<time>.json)")
+    parser.add_argument('--compare', help="Previous results file to compare against")
+    parser.add_argument('--single-corpus', help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single_corpus:
+        with open(args.result_file, 'w') as f:
+            json.dump(run_corpus(args.single_corpus, args), f)
+        return
+
+    results = []
+    print(f"{'corpus':>8} {'pages/s':>9} {'chunks/s':>9} {'images/s':>9} {'load s':>8} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'ttft ms':>8} {'rss MB':>8}")
+    for corpus in args.corpora:
+        result = run_in_subprocess(corpus, args)
+        if result is None:
+            continue
+        results.append(result)
+        print(f"{corpus:>8} {result['pages_per_second']:>9.1f} {result['chunks_per_second']:>9.1f} "
+              f"{result['images_per_second']:>9.1f} {result['store_load_seconds']:>8.3f} "
+              f"{result['text_query_p50_ms']:>8.2f} {result['text_query_p99_ms']:>8.2f} "
+              f"{result['answer_ttft_p50_ms']:>8.1f} {result['peak_rss_mb']:>8.1f}")
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': environment(),
+        'settings': {key: value for key, value in vars(args).items()
+                     if key not in ('output', 'compare', 'single_corpus', 'result_file')},
+        'results': results
+    }
+    output = args.output or str(project_root / 'benchmarks' / 'results' /
+                                f"suite-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
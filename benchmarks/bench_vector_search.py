@@ -0,0 +1,111 @@
+"""
+Query latency of SimpleVectorStore.search_text against the previous search path.
+
+The previous path rebuilt an embedding matrix from the list of dicts on every query,
+scored it with sklearn's cosine_similarity and ran a full argsort. The current path
+scores the resident normalized matrix with one matrix-vector product and selects the
+top k with argpartition.
+
+Usage:
+    python benchmarks/bench_vector_search.py --sizes 10000 100000 1000000
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent.absolute()
+sys.path.append(str(project_root))
+
+from src.retrieval.embedding_matrix import EmbeddingMatrix
+from src.retrieval.vector_store import SimpleVectorStore
+
+
+def legacy_search(text_vectors, query_vector, top_k=5):
+    """The search_text implementation before the resident matrix was introduced."""
+    embeddings = np.array([item['embedding'] for item in text_vectors])
+    query_vector = np.array(query_vector).reshape(1, -1)
+    similarities = cosine_similarity(query_vector, embeddings)[0]
+    top_indices = np.argsort(similarities)[-top_k:][::-1]
+
+    results = []
+    for idx in top_indices:
+        result = text_vectors[idx].copy()
+        result['similarity'] = float(similarities[idx])
+        results.append(result)
+    return results
+
+
+def percentiles(latencies):
+    """p50/p99 of a list of latencies in seconds, reported in milliseconds."""
+    latencies = np.array(latencies) * 1000
+    return float(np.percentile(latencies, 50)), float(np.percentile(latencies, 99))
+
+
+def time_queries(search, queries, warmup=3):
+    """Latency percentiles of search over the queries, after a few untimed warm-up queries."""
+    for query in queries[:warmup]:
+        search(query)
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        latencies.append(time.perf_counter() - start)
+    return percentiles(latencies)
+
+
+def make_store(embeddings, storage_dir):
+    """Build a store around an existing matrix without going through disk."""
+    store = SimpleVectorStore(storage_dir)
+    store.text.records = [
+        {'document_id': 'synthetic.pdf', 'page_num': i // 10 + 1, 'chunk_id': f"chunk_{i}", 'chunk_type': 'text'}
+        for i in range(len(embeddings))
+    ]
+    # Normalize in place: at 1M x 384 every extra copy costs 1.5 GB
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    store.text.embeddings = EmbeddingMatrix(embeddings)
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--legacy-max-size', type=int, default=100000,
+                        help="Skip the previous path above this size (it holds every float as a Python object)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'vectors':>10} {'path':>8} {'p50 ms':>10} {'p99 ms':>10}")
+
+    for size in args.sizes:
+        embeddings = rng.standard_normal((size, args.dim), dtype=np.float32)
+        queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+        with tempfile.TemporaryDirectory() as storage_dir:
+            store = make_store(embeddings, storage_dir)
+            p50, p99 = time_queries(lambda q: store.search_text(q, top_k=args.top_k), queries)
+            print(f"{size:>10} {'resident':>8} {p50:>10.2f} {p99:>10.2f}")
+            del store
+
+        if size > args.legacy_max_size:
+            print(f"{size:>10} {'legacy':>8} {'skipped':>10} {'':>10}")
+            continue
+
+        text_vectors = [{'chunk_id': f"chunk_{i}", 'embedding': row.tolist()} for i, row in enumerate(embeddings)]
+        # The legacy path is slow; a handful of queries is enough for stable percentiles
+        p50, p99 = time_queries(lambda q: legacy_search(text_vectors, q, top_k=args.top_k), queries[:20])
+        print(f"{size:>10} {'legacy':>8} {p50:>10.2f} {p99:>10.2f}")
+        del text_vectors
+
+
+if __name__ == "__main__":
+    main()
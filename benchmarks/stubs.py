@@ -0,0 +1,225 @@
+"""
+Offline stand-ins for the models and the LLM API, plus a synthetic PDF generator.
+
+The stub embedders plug into TextEmbedder/ImageEmbedder in place of the models they
+would lazily load, so everything around the forward pass (chunking, batching, caching,
+indexing) runs unchanged and no model weights or network access are needed.
+"""
+import io
+import json
+import time
+import zlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+
+from src.embedding.text_embedder import TextEmbedder
+from src.embedding.image_embedder import ImageEmbedder
+
+
+VOCABULARY = (
+    "thrust nozzle combustion chamber pressure oxidizer propellant turbopump injector "
+    "valve manifold coolant regenerative ablative throat expansion ratio specific impulse "
+    "structural load margin fatigue fracture composite laminate bolt torque flange seal "
+    "outgassing flammability toxicity material requirement verification inspection test "
+    "analysis qualification acceptance vibration thermal vacuum cycle sensor telemetry "
+    "avionics harness connector redundancy fault tolerance hazard control mitigation"
+).split()
+
+IDENTIFIERS = ["NASA-STD-6016C", "MSFC-SPEC-3679", "AS9100D", "MIL-STD-1540", "P/N 12-3456", "4.2.1", "7.3.2"]
+
+
+class HashEncoder:
+    """
+    Deterministic stand-in for a SentenceTransformer.
+
+    Each word is hashed to a fixed random direction and a text's embedding is the
+    normalized sum over its words, so texts sharing words get similar embeddings and
+    retrieval results are meaningful.
+    """
+
+    def __init__(self, dim=384):
+        self.dim = dim
+        self._word_vectors = {}
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else texts
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                embeddings[i] += self._word_vector(word)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        embeddings /= norms
+        return embeddings[0] if single else embeddings
+
+    def _word_vector(self, word):
+        vector = self._word_vectors.get(word)
+        if vector is None:
+            rng = np.random.default_rng(zlib.crc32(word.encode('utf-8')))
+            vector = rng.standard_normal(self.dim).astype(np.float32)
+            self._word_vectors[word] = vector
+        return vector
+
+
+class StubTextEmbedder(TextEmbedder):
+    """TextEmbedder whose model is a HashEncoder (no sentence_transformers import)."""
+
+    def __init__(self, dim=384, **kwargs):
+        super().__init__(model_name=f"stub-hash-{dim}", **kwargs)
+        self._model = HashEncoder(dim)
+        self.load_seconds = 0.0
+
+
+class StubImageEmbedder(ImageEmbedder):
+    """ImageEmbedder returning a deterministic vector per distinct image (no torch/CLIP)."""
+
+    def __init__(self, dim=512, **kwargs):
+        super().__init__(model_name=f"stub-image-{dim}", **kwargs)
+        self.dim = dim
+
+    def load(self):
+        pass
+
+    def _embed_images(self, images_bytes):
+        embeddings = []
+        for image_bytes in images_bytes:
+            rng = np.random.default_rng(zlib.crc32(image_bytes))
+            embeddings.append(rng.standard_normal(self.dim).astype(np.float32).tolist())
+        return embeddings
+
+
+class StubOCREngine:
+    """OCR engine returning fixed text, so image pages exercise the OCR path without tesseract."""
+
+    def extract_text(self, image):
+        return self.extract_texts([image])[0]
+
+    def extract_texts(self, images):
+        return [f"figure {image.width}x{image.height} thrust chamber schematic" for image in images]
+
+
+def generate_pdf(path, pages, rng, image_every=3, paragraphs_per_page=6):
+    """
+    Write a synthetic technical document.
+
+    Pages hold paragraphs of domain vocabulary with occasional standard identifiers;
+    every `image_every`-th page also carries a generated image, and a logo repeated on
+    every page exercises image deduplication.
+
+    Args:
+        path: Output PDF path
+        pages: Number of pages
+        rng: numpy Generator driving the content
+        image_every: Put a unique image on every n-th page (0 for none)
+        paragraphs_per_page: Paragraphs of about 60 words per page
+    """
+    import fitz
+    from PIL import Image
+
+    logo = _png(Image.new('RGB', (120, 40), (20, 60, 120)))
+    document = fitz.open()
+    for page_num in range(pages):
+        page = document.new_page()
+        paragraphs = []
+        for _ in range(paragraphs_per_page):
+            words = list(rng.choice(VOCABULARY, size=60))
+            if rng.random() < 0.3:
+                words.insert(int(rng.integers(len(words))), str(rng.choice(IDENTIFIERS)))
+            paragraphs.append(" ".join(words))
+        page.insert_textbox(fitz.Rect(50, 80, 545, 800), "\n\n".join(paragraphs), fontsize=9)
+        page.insert_image(fitz.Rect(50, 20, 170, 60), stream=logo)
+
+        if image_every and page_num % image_every == 0:
+            pixels = rng.integers(0, 255, size=(160, 240, 3), dtype=np.uint8)
+            page.insert_image(fitz.Rect(350, 20, 545, 150), stream=_png(Image.fromarray(pixels)))
+
+    document.save(path)
+    document.close()
+
+
+def _png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class FakeLLMServer:
+    """
+    Local OpenAI-compatible /chat/completions endpoint with configurable latency.
+
+    Supports plain and streaming ("stream": true, server-sent events) completions. Use
+    as a context manager; `base_url` is what LLMInterface expects.
+    """
+
+    def __init__(self, first_token_delay=0.05, token_delay=0.005, tokens=40):
+        """
+        Args:
+            first_token_delay: Seconds before the first token (or the whole plain response)
+            token_delay: Seconds between streamed tokens
+            tokens: Number of tokens in every answer
+        """
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.tokens = tokens
+        self.requests = 0
+        self._server = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_port}/v1"
+
+    def __enter__(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                server.requests += 1
+                words = [VOCABULARY[i % len(VOCABULARY)] for i in range(server.tokens)]
+                time.sleep(server.first_token_delay)
+
+                if not body.get('stream'):
+                    payload = json.dumps({'choices': [{'message': {'content': " ".join(words)}}]}).encode()
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                try:
+                    for i, word in enumerate(words):
+                        if i:
+                            time.sleep(server.token_delay)
+                        delta = {'choices': [{'delta': {'content': (" " if i else "") + word}}]}
+                        self._chunk(f"data: {json.dumps(delta)}\n\n".encode())
+                    self._chunk(b"data: [DONE]\n\n")
+                    self._chunk(b"")
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client stopped reading the stream early
+                    self.close_connection = True
+
+            def _chunk(self, data):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,207 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from src.utils.atomic_write import atomic_write
+from src.utils.lru_cache import cache_stats
+
+
+class EmbeddingCache:
+    """
+    Disk-backed cache of float32 embeddings for one model, keyed by content hash.
+
+    Vectors live in fixed-size slots of a binary file (`vectors.bin`); each slot holds the
+    32-byte SHA-256 key followed by the float32 vector, so a slot that was reused after an
+    unflushed eviction is detected and treated as a miss. `index.json` maps keys to slots
+    in least-recently-used order and `index.log` lists the entries written since, so a
+    flush appends only what is new; the index is rewritten (and the log emptied) once the
+    log is as long as the index. When the cache is full the least recently used entry's
+    slot is reused. Recency from hits is kept in memory and saved with the next rewrite.
+
+    The cache may be shared between threads.
+    """
+
+    KEY_BYTES = 32
+
+    def __init__(self, cache_dir, model_name, max_size_bytes=1024 * 1024 * 1024):
+        """
+        Args:
+            cache_dir: Root directory; each model gets its own subdirectory
+            model_name: Model the embeddings come from (part of every key)
+            max_size_bytes: Upper bound on the size of the vectors file
+        """
+        self.model_name = model_name
+        self.max_size_bytes = max_size_bytes
+        self.directory = os.path.join(cache_dir, re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name))
+        self.vectors_file = os.path.join(self.directory, "vectors.bin")
+        self.index_file = os.path.join(self.directory, "index.json")
+        self.log_file = os.path.join(self.directory, "index.log")
+        self.hits = 0
+        self.misses = 0
+
+        self.dim = None
+        self.index = OrderedDict()
+        self.slot_count = 0
+        self.free_slots = []
+        self._file = None
+        self._lock = threading.Lock()
+        # Entries written since the last flush, and entries in the log
+        self._pending = []
+        self._log_entries = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self.index_file):
+            with open(self.index_file, 'r') as f:
+                state = json.load(f)
+            self.dim = state['dim']
+            self.index = OrderedDict(state['entries'])
+            self.slot_count = state['slot_count']
+            if os.path.exists(self.log_file):
+                self._replay_log()
+            used = set(self.index.values())
+            self.free_slots = [slot for slot in range(self.slot_count) if slot not in used]
+
+    def make_key(self, content):
+        """SHA-256 of the model name and the content (str or bytes), as hex."""
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        digest = hashlib.sha256(self.model_name.encode('utf-8') + b'\0')
+        digest.update(content)
+        return digest.hexdigest()
+
+    @property
+    def slot_bytes(self):
+        return self.KEY_BYTES + 4 * self.dim
+
+    @property
+    def max_entries(self):
+        return max(1, self.max_size_bytes // self.slot_bytes)
+
+    def get_many(self, keys):
+        """Return a list aligned with keys holding float32 vectors or None for misses."""
+        vectors = []
+        with self._lock:
+            for key in keys:
+                vector = self._read(key)
+                if vector is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                    self.index.move_to_end(key)
+                vectors.append(vector)
+        return vectors
+
+    def put_many(self, keys, vectors):
+        """Store vectors under their keys, evicting least recently used entries when full."""
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                vector = np.asarray(vector, dtype=np.float32)
+                if self.dim is None:
+                    self.dim = len(vector)
+                elif len(vector) != self.dim:
+                    raise ValueError(f"Expected embeddings of dimension {self.dim}, got {len(vector)}")
+
+                slot = self.index.pop(key, None)
+                if slot is None:
+                    slot = self._allocate_slot()
+
+                handle = self._handle()
+                handle.seek(slot * self.slot_bytes)
+                handle.write(bytes.fromhex(key) + vector.tobytes())
+                self.index[key] = slot
+                self._pending.append((key, slot))
+
+    def flush(self):
+        """Persist the vectors file and the entries written since the last flush."""
+        with self._lock:
+            if not self._pending:
+                return
+
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+            if not os.path.exists(self.index_file) or self._log_entries + len(self._pending) > len(self.index):
+                self._write_index()
+            else:
+                with open(self.log_file, 'a') as f:
+                    f.write("".join(f"{key} {slot}\n" for key, slot in self._pending))
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._log_entries += len(self._pending)
+            self._pending = []
+
+    def stats(self):
+        return cache_stats(self.hits, self.misses, entries=len(self.index))
+
+    def _write_index(self):
+        """Rewrite index.json with every entry in recency order and empty the log."""
+        state = {'dim': self.dim, 'slot_count': self.slot_count, 'entries': list(self.index.items())}
+        atomic_write(self.index_file, lambda f: json.dump(state, f, separators=(',', ':')))
+        if os.path.exists(self.log_file):
+            os.remove(self.log_file)
+        self._log_entries = 0
+
+    def _replay_log(self):
+        """
+        Apply the entries appended since index.json was written.
+
+        A later entry for a slot replaces the key that held it. A torn last line from an
+        interrupted flush is skipped; so are entries that point at a slot which was
+        overwritten again later, since _read checks the key stored in the slot.
+        """
+        owners = {slot: key for key, slot in self.index.items()}
+        with open(self.log_file, 'r') as f:
+            for line in f:
+                parts = line.split()
+                if not line.endswith("\n") or len(parts) != 2 or not parts[1].isdigit():
+                    continue
+                key, slot = parts[0], int(parts[1])
+                previous = owners.get(slot)
+                if previous is not None and previous != key:
+                    self.index.pop(previous, None)
+                old_slot = self.index.pop(key, None)
+                if old_slot is not None and owners.get(old_slot) == key:
+                    del owners[old_slot]
+                self.index[key] = slot
+                owners[slot] = key
+                self.slot_count = max(self.slot_count, slot + 1)
+                self._log_entries += 1
+
+    def _read(self, key):
+        slot = self.index.get(key)
+        if slot is None:
+            return None
+
+        handle = self._handle()
+        handle.seek(slot * self.slot_bytes)
+        data = handle.read(self.slot_bytes)
+        if len(data) != self.slot_bytes or data[:self.KEY_BYTES] != bytes.fromhex(key):
+            # Slot was overwritten after the index was last flushed
+            del self.index[key]
+            self.free_slots.append(slot)
+            return None
+
+        return np.frombuffer(data[self.KEY_BYTES:], dtype=np.float32)
+
+    def _allocate_slot(self):
+        if self.free_slots:
+            return self.free_slots.pop()
+
+        if self.slot_count < self.max_entries:
+            self.slot_count += 1
+            return self.slot_count - 1
+
+        # Full: reuse the least recently used entry's slot
+        _, slot = self.index.popitem(last=False)
+        return slot
+
+    def _handle(self):
+        if self._file is None:
+            mode = 'r+b' if os.path.exists(self.vectors_file) else 'w+b'
+            self._file = open(self.vectors_file, mode)
+        return self._file
@@ -1,55 +1,184 @@
 from PIL import Image
-import torch
-from transformers import CLIPProcessor, CLIPModel
 import io
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.embedding.embedding_cache import EmbeddingCache
+from src.utils.metrics import metrics
 
 class ImageEmbedder:
-    def __init__(self, model_name="openai/clip-vit-base-patch32"):
-        self.model = CLIPModel.from_pretrained(model_name)
-        self.processor = CLIPProcessor.from_pretrained(model_name)
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.model.to(self.device)
-    
+    def __init__(self, model_name="openai/clip-vit-base-patch32", batch_size=32, num_workers=4, cache_dir=None):
+        """
+        Args:
+            model_name: CLIP model to load
+            batch_size: Number of images per get_image_features forward pass
+            num_workers: Threads decoding and preprocessing images ahead of the model
+            cache_dir: Optional directory for a persistent EmbeddingCache keyed by image bytes
+        """
+        self.model_name = model_name
+        self.cache = EmbeddingCache(cache_dir, model_name) if cache_dir else None
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.load_seconds = None
+        self._model = None
+        self._processor = None
+        self._device = None
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        """Import torch/transformers and load the CLIP model and processor, once."""
+        if self._model is not None:
+            return
+        with self._load_lock:
+            if self._model is not None:
+                return
+            start = time.perf_counter()
+            import torch
+            from transformers import CLIPProcessor, CLIPModel
+
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            model = CLIPModel.from_pretrained(self.model_name)
+            model.to(device)
+            self._processor = CLIPProcessor.from_pretrained(self.model_name)
+            self._device = device
+            self._model = model
+            self.load_seconds = time.perf_counter() - start
+
+    @property
+    def model(self):
+        self.load()
+        return self._model
+
+    @property
+    def processor(self):
+        self.load()
+        return self._processor
+
+    @property
+    def device(self):
+        self.load()
+        return self._device
+
+    @property
+    def is_loaded(self):
+        return self._model is not None
+
     def generate_embedding(self, image_bytes):
         """Generate embedding for an image."""
+        return self.generate_embeddings([image_bytes])[0]
+
+    def generate_embeddings(self, images_bytes):
+        """
+        Generate embeddings for many images in batched forward passes.
+
+        Images are decoded and preprocessed in a thread pool while the previous batch runs
+        through the model. An image that fails to decode gets None and does not hold up
+        the rest of its batch. Images found in the embedding cache are not embedded again.
+
+        Returns:
+            List of embeddings (lists of floats) aligned with images_bytes
+        """
+        if self.cache is None:
+            metrics.inc("images_embedded_total", len(images_bytes))
+            with metrics.span("image_embedding"):
+                return self._embed_images(images_bytes)
+
+        keys = [self.cache.make_key(image_bytes) for image_bytes in images_bytes]
+        embeddings = [None if vector is None else vector.tolist() for vector in self.cache.get_many(keys)]
+
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        metrics.inc("images_embedded_total", len(missing))
+        metrics.inc("embedding_cache_hits_total", len(images_bytes) - len(missing), modality="image")
+        with metrics.span("image_embedding"):
+            computed = self._embed_images([images_bytes[i] for i in missing])
+        for i, embedding in zip(missing, computed):
+            embeddings[i] = embedding
+
+        stored = [(keys[i], embedding) for i, embedding in zip(missing, computed) if embedding is not None]
+        self.cache.put_many([key for key, _ in stored], [embedding for _, embedding in stored])
+        self.cache.flush()
+        return embeddings
+
+    def _embed_images(self, images_bytes):
+        """Decode, preprocess and embed images without consulting the cache."""
+        embeddings = [None] * len(images_bytes)
+        if not images_bytes:
+            return embeddings
+
+        import torch
+        self.load()
+        starts = range(0, len(images_bytes), self.batch_size)
+        with ThreadPoolExecutor(max_workers=self.num_workers) as pool:
+            def submit(start):
+                indices = range(start, min(start + self.batch_size, len(images_bytes)))
+                return [(i, pool.submit(self._preprocess, images_bytes[i])) for i in indices]
+
+            pending = submit(starts[0])
+            for next_start in list(starts[1:]) + [None]:
+                current = pending
+                # Queue the next batch's preprocessing before running the model on this one
+                pending = submit(next_start) if next_start is not None else None
+
+                batch = [(i, future.result()) for i, future in current]
+                batch = [(i, pixels) for i, pixels in batch if pixels is not None]
+                if not batch:
+                    continue
+
+                try:
+                    pixel_values = torch.stack([pixels for _, pixels in batch]).to(self.device)
+                    with torch.no_grad():
+                        image_features = self.model.get_image_features(pixel_values=pixel_values)
+                    image_features = image_features.cpu().numpy()
+                except Exception as e:
+                    print(f"Error generating image embedding: {e}")
+                    continue
+
+                for (i, _), features in zip(batch, image_features):
+                    embeddings[i] = features.tolist()
+
+        return embeddings
+
+    def _preprocess(self, image_bytes):
+        """Decode an image and run the CLIP processor on it; None if it can't be decoded."""
         try:
             # Convert bytes to PIL Image
             image = Image.open(io.BytesIO(image_bytes))
-            
+
             # Process image for CLIP
-            inputs = self.processor(images=image, return_tensors="pt").to(self.device)
-            
-            # Generate embeddings
-            with torch.no_grad():
-                image_features = self.model.get_image_features(**inputs)
-            
-            # Convert to list and return
-            return image_features.cpu().numpy()[0].tolist()
+            inputs = self.processor(images=image, return_tensors="pt")
+            return inputs['pixel_values'][0]
         except Exception as e:
             print(f"Error generating image embedding: {e}")
             return None
-    
+
     def embed_document_images(self, document_data):
         """Process a document and generate embeddings for all images."""
         results = []
-        
+        units = []
+
         for page in document_data['pages']:
             for i, image in enumerate(page.get('images', [])):
+                # Repeated images carry no bytes; they are embedded once via their first occurrence
                 if 'image_bytes' not in image:
                     continue
-                
-                embedding = self.generate_embedding(image['image_bytes'])
-                
-                if embedding:
-                    results.append({
-                        'document_id': document_data['metadata']['filename'],
-                        'page_num': page['page_num'],
-                        'chunk_id': f"page_{page['page_num']}_img_{i+1}",
-                        'chunk_type': 'image',
-                        'width': image.get('width'),
-                        'height': image.get('height'),
-                        'extracted_text': image.get('extracted_text', ''),
-                        'embedding': embedding
-                    })
-        
-        return results
\ No newline at end of file
+                units.append((page, i, image))
+
+        embeddings = self.generate_embeddings([image['image_bytes'] for _, _, image in units])
+
+        for (page, i, image), embedding in zip(units, embeddings):
+            if embedding:
+                results.append({
+                    'document_id': document_data['metadata']['filename'],
+                    'page_num': page['page_num'],
+                    'chunk_id': f"page_{page['page_num']}_img_{i+1}",
+                    'chunk_type': 'image',
+                    'image_id': image.get('id'),
+                    'page_nums': image.get('page_nums', [page['page_num']]),
+                    'width': image.get('width'),
+                    'height': image.get('height'),
+                    'extracted_text': image.get('extracted_text', ''),
+                    'embedding': embedding
+                })
+
+        return results
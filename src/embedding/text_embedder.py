@@ -1,93 +1,189 @@
-from sentence_transformers import SentenceTransformer
+import time
+import threading
+
+from src.embedding.embedding_cache import EmbeddingCache
+from src.utils.metrics import metrics
 
 class TextEmbedder:
-    def __init__(self, model_name="all-MiniLM-L6-v2"):
-        self.model = SentenceTransformer(model_name)
-    
+    def __init__(self, model_name="all-MiniLM-L6-v2", batch_size=64, cache_dir=None):
+        """
+        Args:
+            model_name: SentenceTransformer model to load
+            batch_size: Number of texts per forward pass when embedding documents
+            cache_dir: Optional directory for a persistent EmbeddingCache; document chunks
+                already embedded by this model are read from it instead of encoded again
+        """
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache = EmbeddingCache(cache_dir, model_name) if cache_dir else None
+        self.last_throughput = None
+        self.load_seconds = None
+        self._model = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def model(self):
+        """The SentenceTransformer, loaded (and sentence_transformers imported) on first use."""
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    start = time.perf_counter()
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name)
+                    self.load_seconds = time.perf_counter() - start
+        return self._model
+
+    @property
+    def is_loaded(self):
+        return self._model is not None
+
     def generate_embeddings(self, texts):
         """Generate embeddings for a list of texts."""
         if not texts:
             return []
-        
-        embeddings = self.model.encode(texts)
+
+        embeddings = self.model.encode(texts, batch_size=self.batch_size)
         return embeddings.tolist()
-    
+
     def embed_document(self, document_data, chunk_size=1000, chunk_overlap=200):
         """Process a document and generate embeddings for text chunks."""
+        return self.embed_documents([document_data], chunk_size, chunk_overlap)
+
+    def embed_documents(self, documents, chunk_size=1000, chunk_overlap=200):
+        """
+        Generate embeddings for the text chunks of several documents in batched forward passes.
+
+        Every embeddable unit (text chunk, table, formula, OCR text) across all pages and
+        documents is collected first, encoded in length-sorted batches, and the embeddings
+        are attached to records with the same structure embed_document has always returned.
+        """
         results = []
-        
+        texts = []
+
+        for document_data in documents:
+            for record in self._collect_units(document_data, chunk_size, chunk_overlap):
+                texts.append(record['content'])
+                results.append(record)
+
+        start = time.perf_counter()
+        embeddings = self._encode_batched(texts)
+        elapsed = time.perf_counter() - start
+
+        for record, embedding in zip(results, embeddings):
+            record['embedding'] = embedding
+
+        self.last_throughput = {
+            'chunks': len(texts),
+            'seconds': elapsed,
+            'chunks_per_sec': len(texts) / elapsed if elapsed > 0 else 0.0
+        }
+        if texts:
+            print(f"Embedded {len(texts)} text chunks in {elapsed:.2f}s "
+                  f"({self.last_throughput['chunks_per_sec']:.1f} chunks/sec)")
+
+        return results
+
+    def _collect_units(self, document_data, chunk_size, chunk_overlap):
+        """Yield a record (without embedding) for every embeddable unit of a document."""
+        document_id = document_data['metadata']['filename']
+
         for page in document_data['pages']:
+            page_num = page['page_num']
+
             # Process main text content
-            text = page['text']
-            chunks = self._chunk_text(text, chunk_size, chunk_overlap)
-            
+            chunks = self._chunk_text(page['text'], chunk_size, chunk_overlap)
             for i, chunk in enumerate(chunks):
                 if not chunk.strip():
                     continue
-                    
-                embedding = self.model.encode(chunk)
-                results.append({
-                    'document_id': document_data['metadata']['filename'],
-                    'page_num': page['page_num'],
-                    'chunk_id': f"page_{page['page_num']}_chunk_{i+1}",
+                yield {
+                    'document_id': document_id,
+                    'page_num': page_num,
+                    'chunk_id': f"page_{page_num}_chunk_{i+1}",
                     'chunk_type': 'text',
-                    'content': chunk,
-                    'embedding': embedding.tolist()
-                })
-            
+                    'content': chunk
+                }
+
             # Process text from tables
             for i, table in enumerate(page.get('tables', [])):
                 if 'text' in table and table['text'].strip():
-                    embedding = self.model.encode(table['text'])
-                    results.append({
-                        'document_id': document_data['metadata']['filename'],
-                        'page_num': page['page_num'],
-                        'chunk_id': f"page_{page['page_num']}_table_{i+1}",
+                    yield {
+                        'document_id': document_id,
+                        'page_num': page_num,
+                        'chunk_id': f"page_{page_num}_table_{i+1}",
                         'chunk_type': 'table',
-                        'content': table['text'],
-                        'embedding': embedding.tolist()
-                    })
-            
+                        'content': table['text']
+                    }
+
             # Process text from formulas
             for i, formula in enumerate(page.get('formulas', [])):
                 if 'text' in formula and formula['text'].strip():
-                    embedding = self.model.encode(formula['text'])
-                    results.append({
-                        'document_id': document_data['metadata']['filename'],
-                        'page_num': page['page_num'],
-                        'chunk_id': f"page_{page['page_num']}_formula_{i+1}",
+                    yield {
+                        'document_id': document_id,
+                        'page_num': page_num,
+                        'chunk_id': f"page_{page_num}_formula_{i+1}",
                         'chunk_type': 'formula',
-                        'content': formula['text'],
-                        'embedding': embedding.tolist()
-                    })
-            
-            # Process OCR text from images
+                        'content': formula['text']
+                    }
+
+            # Process OCR text from images (repeated images only once, at their first occurrence)
             for i, image in enumerate(page.get('images', [])):
+                if 'duplicate_of' in image:
+                    continue
                 if 'extracted_text' in image and image['extracted_text'].strip():
-                    embedding = self.model.encode(image['extracted_text'])
-                    results.append({
-                        'document_id': document_data['metadata']['filename'],
-                        'page_num': page['page_num'],
-                        'chunk_id': f"page_{page['page_num']}_img_{i+1}_text",
+                    yield {
+                        'document_id': document_id,
+                        'page_num': page_num,
+                        'chunk_id': f"page_{page_num}_img_{i+1}_text",
                         'chunk_type': 'image_text',
                         'content': image['extracted_text'],
-                        'embedding': embedding.tolist()
-                    })
-        
-        return results
-    
+                        'image_id': image.get('id'),
+                        'page_nums': image.get('page_nums', [page_num])
+                    }
+
+    def _encode_batched(self, texts):
+        """Encode texts in batches of similar length and return embeddings in input order."""
+        embeddings = [None] * len(texts)
+
+        keys = None
+        if self.cache is not None:
+            keys = [self.cache.make_key(text) for text in texts]
+            for i, vector in enumerate(self.cache.get_many(keys)):
+                if vector is not None:
+                    embeddings[i] = vector.tolist()
+
+        missing = [i for i in range(len(texts)) if embeddings[i] is None]
+        metrics.inc("text_chunks_embedded_total", len(missing))
+        metrics.inc("embedding_cache_hits_total", len(texts) - len(missing), modality="text")
+
+        # Sorting by length keeps padding within each batch small
+        order = sorted(missing, key=lambda i: len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            with metrics.span("text_embedding"):
+                batch_embeddings = self.model.encode([texts[i] for i in batch], batch_size=len(batch))
+            for i, embedding in zip(batch, batch_embeddings):
+                embeddings[i] = embedding.tolist()
+
+            if self.cache is not None:
+                self.cache.put_many([keys[i] for i in batch], batch_embeddings)
+
+        if self.cache is not None:
+            self.cache.flush()
+
+        return embeddings
+
     def _chunk_text(self, text, chunk_size, chunk_overlap):
         """Split text into chunks with overlap."""
         if not text:
             return []
-            
+
         chunks = []
         start = 0
         text_length = len(text)
-        
+
         while start < text_length:
             end = min(start + chunk_size, text_length)
             chunks.append(text[start:end])
             start += (chunk_size - chunk_overlap)
-        
+
         return chunks
@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import threading
+
+import numpy as np
+
+from src.utils.atomic_write import atomic_write
+from src.utils.lru_cache import cache_stats
+
+
+class SemanticAnswerCache:
+    """
+    Persistent cache of LLM answers for semantically repeated questions.
+
+    An answer is reused when a new query's embedding has cosine similarity of at least
+    `similarity_threshold` with a cached query's, and both were answered from the same
+    retrieved chunks, vector store version and LLM model. Entries expire after
+    `ttl_seconds`; beyond `max_entries` the least recently used entry is evicted. The
+    cache is saved to a single .npz file after every change and loaded on start.
+    """
+
+    def __init__(self, path, similarity_threshold=0.95, max_entries=1000, ttl_seconds=7 * 24 * 3600):
+        """
+        Args:
+            path: .npz file the cache is persisted to
+            similarity_threshold: Minimum cosine similarity between query embeddings for a hit
+            max_entries: Maximum number of cached answers
+            ttl_seconds: Age after which an answer is no longer served
+        """
+        self.path = path
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+        # Row-aligned: normalized query embeddings and entry metadata
+        self.embeddings = None
+        self.entries = []
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            try:
+                data = np.load(path)
+                self.embeddings = data['embeddings']
+                self.entries = json.loads(str(data['entries']))
+            except Exception as e:
+                print(f"Error loading answer cache {path}: {e}")
+                self.embeddings, self.entries = None, []
+
+    def make_key(self, retrieved_items, store_version, model):
+        """Identity of the context an answer was generated from."""
+        chunks = sorted(f"{item.get('document_id')}/{item.get('chunk_id')}" for item in retrieved_items)
+        return json.dumps([chunks, store_version, model])
+
+    def get(self, query_embedding, key):
+        """
+        Return the cached response for a similar query over the same context, or None.
+
+        Args:
+            query_embedding: Embedding of the new query
+            key: make_key() of its retrieved items, store version and model
+        """
+        query = self._normalize(query_embedding)
+        with self._lock:
+            self._expire()
+            rows = [i for i, entry in enumerate(self.entries) if entry['key'] == key]
+            if rows and query is not None:
+                similarities = self.embeddings[rows] @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    entry = self.entries[rows[best]]
+                    entry['last_used'] = time.time()
+                    self.hits += 1
+                    return entry['response']
+
+            self.misses += 1
+            return None
+
+    def put(self, query_embedding, key, response):
+        """Cache a response (a JSON-serializable dict) and persist the cache."""
+        query = self._normalize(query_embedding)
+        if query is None:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._expire()
+            entry = {'key': key, 'response': response, 'created': now, 'last_used': now}
+            if self.embeddings is None or len(self.entries) == 0 or self.embeddings.shape[1] != len(query):
+                self.embeddings = query[np.newaxis]
+                self.entries = [entry]
+            else:
+                self.embeddings = np.vstack([self.embeddings, query])
+                self.entries.append(entry)
+
+            if len(self.entries) > self.max_entries:
+                order = np.argsort([entry['last_used'] for entry in self.entries])
+                self._keep(np.sort(order[len(self.entries) - self.max_entries:]))
+
+            self._save()
+
+    def stats(self):
+        return cache_stats(self.hits, self.misses, entries=len(self.entries))
+
+    def _normalize(self, embedding):
+        if embedding is None:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl_seconds
+        if any(entry['created'] < cutoff for entry in self.entries):
+            self._keep([i for i, entry in enumerate(self.entries) if entry['created'] >= cutoff])
+
+    def _keep(self, rows):
+        self.entries = [self.entries[i] for i in rows]
+        self.embeddings = self.embeddings[np.asarray(rows, dtype=np.int64)] if len(rows) else None
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        embeddings = self.embeddings if self.embeddings is not None else np.zeros((0, 0), dtype=np.float32)
+        atomic_write(
+            self.path,
+            lambda f: np.savez(f, embeddings=embeddings, entries=np.array(json.dumps(self.entries))),
+            mode='wb'
+        )
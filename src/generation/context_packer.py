@@ -0,0 +1,145 @@
+import re
+
+
+_CHUNK_ID_PATTERN = re.compile(r"^page_(\d+)_chunk_(\d+)$")
+
+# Shortest suffix/prefix match treated as chunk overlap rather than coincidence
+_MIN_OVERLAP = 10
+
+
+def estimate_tokens(text):
+    """Rough token count for English text (about four characters per token)."""
+    return (len(text) + 3) // 4
+
+
+class ContextPacker:
+    """
+    Turns retrieved items into a prompt context that fits a token budget.
+
+    Consecutive text chunks of the same page (which TextEmbedder cuts with overlapping
+    ends) are merged into one passage with the overlap removed. Passages whose word
+    shingles are mostly contained in a better-ranked passage are dropped as near
+    duplicates. The remaining passages are added in relevance order until the budget
+    is used up.
+    """
+
+    def __init__(self, max_tokens=3000, duplicate_threshold=0.9, shingle_size=3, count_tokens=estimate_tokens):
+        """
+        Args:
+            max_tokens: Token budget of the packed context
+            duplicate_threshold: Fraction of a passage's shingles found in a better-ranked
+                passage above which it is dropped
+            shingle_size: Words per shingle for near-duplicate detection
+            count_tokens: Function returning the token count of a string
+        """
+        self.max_tokens = max_tokens
+        self.duplicate_threshold = duplicate_threshold
+        self.shingle_size = shingle_size
+        self.count_tokens = count_tokens
+
+    def pack(self, retrieved_items):
+        """
+        Select and merge passages for the context.
+
+        Args:
+            retrieved_items: Retrieved records, most relevant first
+
+        Returns:
+            (passages, stats): passages are dicts with 'text', 'document_id', 'page_num'
+            and 'chunk_ids', most relevant first; stats counts tokens before and after
+            packing, tokens saved, and passages merged, deduplicated or left out
+        """
+        items = [(rank, item) for rank, item in enumerate(retrieved_items) if item.get('content')]
+        passages = self._merge(items)
+        stats = {
+            'tokens_before': sum(self.count_tokens(item['content']) for _, item in items),
+            'merged': len(items) - len(passages),
+            'duplicates_removed': 0,
+            'over_budget': 0
+        }
+
+        kept, kept_shingles, used = [], [], 0
+        for passage in passages:
+            shingles = self._shingles(passage['text'])
+            if any(self._contained(shingles, other) for other in kept_shingles):
+                stats['duplicates_removed'] += 1
+                continue
+
+            tokens = self.count_tokens(passage['text'])
+            if not kept and tokens > self.max_tokens:
+                # Even the best passage is too long on its own: keep its beginning
+                passage['text'] = passage['text'][:len(passage['text']) * self.max_tokens // tokens]
+                tokens = self.count_tokens(passage['text'])
+            if used + tokens > self.max_tokens:
+                stats['over_budget'] += 1
+                continue
+
+            kept.append(passage)
+            kept_shingles.append(shingles)
+            used += tokens
+
+        stats['tokens_after'] = used
+        stats['tokens_saved'] = stats['tokens_before'] - used
+        return kept, stats
+
+    def _merge(self, items):
+        """Merge consecutive chunks of the same page; passages keep their best rank."""
+        passages = []
+        runs = {}
+
+        for rank, item in items:
+            match = _CHUNK_ID_PATTERN.match(str(item.get('chunk_id', '')))
+            passage = {
+                'text': item['content'],
+                'document_id': item.get('document_id'),
+                'page_num': item.get('page_num'),
+                'chunk_ids': [item.get('chunk_id')],
+                'rank': rank
+            }
+            if match is None or item.get('chunk_type', 'text') != 'text':
+                passages.append(passage)
+            else:
+                key = (item.get('document_id'), item.get('page_num'))
+                runs.setdefault(key, []).append((int(match.group(2)), passage))
+
+        for chunks in runs.values():
+            chunks.sort(key=lambda chunk: chunk[0])
+            previous_index, current = chunks[0]
+            for index, passage in chunks[1:]:
+                if index == previous_index + 1:
+                    current['text'] = self._join(current['text'], passage['text'])
+                    current['chunk_ids'].extend(passage['chunk_ids'])
+                    current['rank'] = min(current['rank'], passage['rank'])
+                else:
+                    passages.append(current)
+                    current = passage
+                previous_index = index
+            passages.append(current)
+
+        passages.sort(key=lambda passage: passage['rank'])
+        for passage in passages:
+            del passage['rank']
+        return passages
+
+    def _join(self, first, second):
+        """
+        Concatenate two consecutive chunks, dropping the longest suffix of first that
+        starts second. Chunks are contiguous slices of the page text, so without a
+        (non-trivial) overlap they are simply concatenated.
+        """
+        for overlap in range(min(len(first), len(second)), _MIN_OVERLAP - 1, -1):
+            if first.endswith(second[:overlap]):
+                return first + second[overlap:]
+        return first + second
+
+    def _shingles(self, text):
+        words = text.lower().split()
+        if len(words) < self.shingle_size:
+            return {" ".join(words)}
+        return {" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+
+    def _contained(self, shingles, other):
+        """Whether nearly all of a passage's shingles appear in another passage."""
+        if not shingles:
+            return True
+        return len(shingles & other) / len(shingles) >= self.duplicate_threshold
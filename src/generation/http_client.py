@@ -0,0 +1,133 @@
+import time
+import random
+import asyncio
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+
+class HTTPClient:
+    """
+    Connection-pooled JSON-over-HTTP client with timeouts, retries and a concurrency limit.
+
+    One requests.Session is shared by all calls, so TLS connections to the API are reused
+    instead of being set up per request. Failed attempts (connection errors, timeouts and
+    RETRY_STATUS_CODES) are retried with exponential backoff and full jitter, honouring a
+    Retry-After header when the server sends one. At most `max_concurrent_requests`
+    requests are in flight at once; further callers wait for a slot.
+    """
+
+    def __init__(self, connect_timeout=5.0, read_timeout=60.0, max_retries=3, backoff_base=0.5,
+                 backoff_max=8.0, max_concurrent_requests=8, pool_size=None):
+        """
+        Args:
+            connect_timeout: Seconds to wait for a connection to be established
+            read_timeout: Seconds to wait between bytes of the response
+            max_retries: Retries after the first attempt (0 disables retrying)
+            backoff_base: Upper bound of the first retry's delay; doubles on each retry
+            backoff_max: Cap on the delay between retries
+            max_concurrent_requests: Requests allowed in flight at once
+            pool_size: Connections kept open per host (defaults to max_concurrent_requests)
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_concurrent_requests = max_concurrent_requests
+        self._slots = threading.BoundedSemaphore(max_concurrent_requests)
+
+        pool_size = pool_size or max_concurrent_requests
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def post_json(self, url, payload, headers=None):
+        """
+        POST a JSON payload and return the decoded JSON response.
+
+        Raises:
+            requests.RequestException: When the last attempt fails
+        """
+        with self._slots:
+            response = self._post_with_retries(url, payload, headers)
+            try:
+                return response.json()
+            finally:
+                response.close()
+
+    def post_stream(self, url, payload, headers=None):
+        """
+        POST a JSON payload and yield the response body line by line as it arrives.
+
+        Retries cover establishing the response only; once lines are being yielded an
+        error is raised to the caller. The concurrency slot is held until the generator
+        is exhausted or closed.
+        """
+        with self._slots:
+            response = self._post_with_retries(url, payload, headers, stream=True)
+            try:
+                # Server-sent events are UTF-8, but without a charset requests would decode
+                # text/event-stream as ISO-8859-1
+                response.encoding = 'utf-8'
+                # chunk_size=None hands over data as it arrives instead of in 512-byte blocks
+                for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                    yield line
+            finally:
+                response.close()
+
+    async def post_json_async(self, url, payload, headers=None):
+        """
+        Awaitable post_json for use from an event loop.
+
+        The request runs on the default executor over the same pooled session and limiter,
+        so the loop is never blocked on network I/O.
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, self.post_json, url, payload, headers)
+
+    def close(self):
+        self.session.close()
+
+    def _post_with_retries(self, url, payload, headers, stream=False):
+        """Send the request, retrying transient failures; returns a successful response."""
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                response = self.session.post(url, json=payload, headers=headers, timeout=self.timeout,
+                                             stream=stream)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    if not response.ok:
+                        response.close()
+                        response.raise_for_status()
+                    return response
+
+                retry_after = self._retry_after(response)
+                error = requests.HTTPError(f"{response.status_code} error from {url}", response=response)
+                response.close()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+
+            if attempt >= self.max_retries:
+                raise error
+
+            delay = self._backoff(attempt) if retry_after is None else min(retry_after, self.backoff_max)
+            print(f"Request to {url} failed ({error}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+
+    def _backoff(self, attempt):
+        """Full jitter: uniform between 0 and the exponential bound for this attempt."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _retry_after(self, response):
+        value = response.headers.get("Retry-After")
+        try:
+            return max(0.0, float(value)) if value is not None else None
+        except ValueError:
+            return None
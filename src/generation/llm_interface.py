@@ -1,21 +1,52 @@
 import os
-import requests
 import json
+import time
 from dotenv import load_dotenv
 
+from src.generation.http_client import HTTPClient
+from src.utils.metrics import metrics
+
 # Load environment variables from .env file
 load_dotenv()
 
+
+class LLMStreamError(Exception):
+    """A streamed response failed or ended before the server finished it."""
+
+
 class LLMInterface:
-    def __init__(self, api_key=None, model="gpt-4-turbo"):
+    def __init__(self, api_key=None, model="gpt-4-turbo", base_url=None, http_client=None,
+                 connect_timeout=5.0, read_timeout=60.0, max_retries=3, max_concurrent_requests=8):
+        """
+        Args:
+            api_key: API key (defaults to OPENAI_API_KEY)
+            model: Chat completion model
+            base_url: API root the /chat/completions path is appended to (defaults to
+                OPENAI_BASE_URL, then https://api.openai.com/v1); point it at a local
+                server for testing
+            http_client: Optional HTTPClient to share; otherwise one is created from the
+                timeout, retry and concurrency settings below
+            connect_timeout: Seconds to wait for a connection
+            read_timeout: Seconds to wait between bytes of the response
+            max_retries: Retries on connection errors, timeouts, 429 and 5xx responses
+            max_concurrent_requests: Requests to the API allowed in flight at once
+        """
         self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
         self.model = model
+        self.base_url = (base_url or os.environ.get("OPENAI_BASE_URL") or "https://api.openai.com/v1").rstrip("/")
+        self.endpoint = f"{self.base_url}/chat/completions"
+        self.http_client = http_client or HTTPClient(
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            max_retries=max_retries,
+            max_concurrent_requests=max_concurrent_requests
+        )
         
         if not self.api_key:
             raise ValueError("API key is required. Set OPENAI_API_KEY in .env file or pass it directly.")
-    
-    def generate_response(self, prompt, system_message=None, temperature=0.7, max_tokens=1000):
-        """Generate a response from the LLM."""
+
+    def _request(self, prompt, system_message, temperature, max_tokens):
+        """Headers and JSON body of a chat completion request."""
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
@@ -33,15 +64,72 @@ class LLMInterface:
             "temperature": temperature,
             "max_tokens": max_tokens
         }
+        return headers, data
+    
+    def generate_response(self, prompt, system_message=None, temperature=0.7, max_tokens=1000):
+        """Generate a response from the LLM."""
+        headers, data = self._request(prompt, system_message, temperature, max_tokens)
         
         try:
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                data=json.dumps(data)
-            )
-            response.raise_for_status()
-            return response.json()["choices"][0]["message"]["content"]
+            with metrics.span("llm_request"):
+                response = self.http_client.post_json(self.endpoint, data, headers)
+            return response["choices"][0]["message"]["content"]
         except Exception as e:
             print(f"Error generating response: {e}")
             return f"Error generating response: {e}"
+
+    async def agenerate_response(self, prompt, system_message=None, temperature=0.7, max_tokens=1000):
+        """Async variant of generate_response for use from an event loop."""
+        headers, data = self._request(prompt, system_message, temperature, max_tokens)
+
+        try:
+            with metrics.span("llm_request"):
+                response = await self.http_client.post_json_async(self.endpoint, data, headers)
+            return response["choices"][0]["message"]["content"]
+        except Exception as e:
+            print(f"Error generating response: {e}")
+            return f"Error generating response: {e}"
+
+    def stream_response(self, prompt, system_message=None, temperature=0.7, max_tokens=1000):
+        """
+        Generate a response from the LLM as a stream of text fragments.
+
+        Consumes the server-sent event stream of a `"stream": true` chat completion and
+        yields each content delta as it arrives.
+
+        Raises:
+            LLMStreamError: When the request fails, or the stream breaks off before the
+                server's [DONE] event; fragments yielded until then are incomplete
+        """
+        headers, data = self._request(prompt, system_message, temperature, max_tokens)
+        data["stream"] = True
+
+        start = time.perf_counter()
+        first_token = True
+        finished = False
+        with metrics.span("llm_stream"):
+            try:
+                for line in self.http_client.post_stream(self.endpoint, data, headers):
+                    # Events are "data: <json>" lines separated by blank lines
+                    if not line or not line.startswith("data:"):
+                        continue
+                    payload = line[len("data:"):].strip()
+                    if payload == "[DONE]":
+                        finished = True
+                        break
+
+                    choices = json.loads(payload).get("choices") or [{}]
+                    content = choices[0].get("delta", {}).get("content")
+                    if content:
+                        if first_token:
+                            metrics.observe("llm_time_to_first_token_seconds", time.perf_counter() - start)
+                            first_token = False
+                        yield content
+                if not finished:
+                    raise LLMStreamError("the response stream ended before it was complete")
+            except Exception as e:
+                metrics.inc("errors_total", stage="llm_stream")
+                print(f"Error generating response: {e}")
+                if isinstance(e, LLMStreamError):
+                    raise
+                raise LLMStreamError(str(e)) from e
@@ -1,25 +1,147 @@
 from PIL import Image
 import io
 import os
+import time
 import base64
 
+from src.generation.context_packer import ContextPacker
+from src.generation.llm_interface import LLMStreamError
+from src.utils.metrics import metrics
+
 class ResponseBuilder:
-    def __init__(self, llm_interface, data_dir):
+    def __init__(self, llm_interface, data_dir, answer_cache=None, context_packer=None):
+        """
+        Args:
+            llm_interface: LLMInterface generating the answers
+            data_dir: Root data directory
+            answer_cache: Optional SemanticAnswerCache consulted before calling the LLM
+                when a query embedding is passed to build_response/stream_response
+            context_packer: ContextPacker that merges, deduplicates and budgets the
+                retrieved text (defaults to a 3000-token budget)
+        """
         self.llm_interface = llm_interface
         self.data_dir = data_dir
+        self.answer_cache = answer_cache
+        self.context_packer = context_packer or ContextPacker()
     
-    def build_response(self, query, retrieved_items, include_images=True):
-        """Build a comprehensive response based on retrieved items."""
-        # Prepare context from retrieved items
+    def build_response(self, query, retrieved_items, include_images=True, query_embedding=None,
+                       store_version=None):
+        """
+        Build a comprehensive response based on retrieved items.
+
+        With an answer cache, query_embedding and store_version identify the question and
+        the index state; a similar question answered from the same retrieved chunks is
+        served from the cache (with 'cached' set) without calling the LLM.
+        """
+        cache_key = self._cache_key(retrieved_items, query_embedding, store_version, include_images)
+        if cache_key is not None:
+            cached = self.answer_cache.get(query_embedding, cache_key)
+            if cached is not None:
+                metrics.inc("answer_cache_hits_total")
+                return dict(cached, cached=True)
+
+        prompt, system_message, image_data, context_stats = self._prepare_prompt(
+            query, retrieved_items, include_images
+        )
+        
+        # Generate the text response
+        text_response = self.llm_interface.generate_response(prompt, system_message)
+        
+        response = self._response(text_response, retrieved_items, image_data, include_images, context_stats)
+        self._cache_answer(cache_key, query_embedding, response)
+        return response
+
+    async def abuild_response(self, query, retrieved_items, include_images=True):
+        """Async variant of build_response; awaits the LLM instead of blocking a thread."""
+        prompt, system_message, image_data, context_stats = self._prepare_prompt(
+            query, retrieved_items, include_images
+        )
+        text_response = await self.llm_interface.agenerate_response(prompt, system_message)
+        return self._response(text_response, retrieved_items, image_data, include_images, context_stats)
+
+    def stream_response(self, query, retrieved_items, include_images=True, query_embedding=None,
+                        store_version=None):
+        """
+        Build a response while the LLM streams it.
+
+        Yields the response object (as build_response returns it) after every text
+        fragment, with 'text_response' holding the text so far. Each carries 'timings'
+        with 'time_to_first_token' (None until the first fragment) and, once 'done' is
+        set on the last one, 'total' seconds. An answer cache hit is yielded at once as
+        the last response. If the stream fails, the last response has the error message
+        appended to the text so far and in 'error', and is not cached.
+        """
+        start = time.perf_counter()
+        cache_key = self._cache_key(retrieved_items, query_embedding, store_version, include_images)
+        if cache_key is not None:
+            cached = self.answer_cache.get(query_embedding, cache_key)
+            if cached is not None:
+                metrics.inc("answer_cache_hits_total")
+                elapsed = time.perf_counter() - start
+                yield dict(cached, cached=True, done=True,
+                           timings={'time_to_first_token': elapsed, 'total': elapsed})
+                return
+
+        prompt, system_message, image_data, context_stats = self._prepare_prompt(
+            query, retrieved_items, include_images
+        )
+
+        timings = {'time_to_first_token': None, 'total': None}
+        text_response = ""
+        error = None
+        try:
+            for fragment in self.llm_interface.stream_response(prompt, system_message):
+                if timings['time_to_first_token'] is None:
+                    timings['time_to_first_token'] = time.perf_counter() - start
+                text_response += fragment
+                response = self._response(text_response, retrieved_items, image_data, include_images, context_stats)
+                response.update(timings=dict(timings), done=False)
+                yield response
+        except LLMStreamError as e:
+            error = f"Error generating response: {e}"
+            text_response = f"{text_response}\n\n{error}" if text_response else error
+
+        timings['total'] = time.perf_counter() - start
+        response = self._response(text_response, retrieved_items, image_data, include_images, context_stats)
+        if error is None:
+            self._cache_answer(cache_key, query_embedding, response)
+        else:
+            response['error'] = error
+        response.update(timings=timings, done=True)
+        yield response
+
+    def _cache_key(self, retrieved_items, query_embedding, store_version, include_images):
+        """Answer cache key, or None when the cache is not in use for this call."""
+        if self.answer_cache is None or query_embedding is None:
+            return None
+        key = self.answer_cache.make_key(retrieved_items, store_version, self.llm_interface.model)
+        return key if include_images else key + "/no-images"
+
+    def _cache_answer(self, cache_key, query_embedding, response):
+        # Failed generations come back as an error message; never serve those again
+        if cache_key is None or response['text_response'].startswith("Error generating response"):
+            return
+        self.answer_cache.put(query_embedding, cache_key, dict(response))
+
+    def _prepare_prompt(self, query, retrieved_items, include_images):
+        """Prompt, system message, image info and context packing stats for a query."""
+        # Prepare context from retrieved items: overlapping chunks merged, near-duplicates
+        # dropped, and the rest packed into the token budget in relevance order
+        with metrics.span("context_packing"):
+            passages, context_stats = self.context_packer.pack(retrieved_items)
+        metrics.inc("context_tokens_saved_total", context_stats['tokens_saved'])
+        print(f"Context: {context_stats['tokens_after']} tokens, {context_stats['tokens_saved']} saved "
+              f"({context_stats['merged']} chunks merged, {context_stats['duplicates_removed']} near-duplicates "
+              f"removed, {context_stats['over_budget']} over budget)")
+
         context_parts = []
         image_data = []
         
+        for passage in passages:
+            source_info = f"[Source: {passage['document_id']}, Page {passage['page_num']}]"
+            context_parts.append(f"{passage['text']} {source_info}")
+
         for item in retrieved_items:
-            # Add text content
-            if 'content' in item and item['content']:
-                source_info = f"[Source: {item['document_id']}, Page {item['page_num']}]"
-                context_parts.append(f"{item['content']} {source_info}")
-            
             # Collect image info if needed
             if include_images and item.get('chunk_type') == 'image':
                 image_info = {
@@ -51,16 +173,16 @@ class ResponseBuilder:
         
         Please provide a comprehensive and accurate response to the query.
         """
-        
-        # Generate the text response
-        text_response = self.llm_interface.generate_response(prompt, system_message)
-        
+        return prompt, system_message, image_data, context_stats
+
+    def _response(self, text_response, retrieved_items, image_data, include_images, context_stats):
         # Create the final response object
         response = {
             'text_response': text_response,
             'sources': [{'document_id': item['document_id'], 'page_num': item['page_num']} 
                        for item in retrieved_items],
-            'images': image_data if include_images else []
+            'images': image_data if include_images else [],
+            'context_stats': context_stats
         }
         
         return response
\ No newline at end of file
@@ -0,0 +1,87 @@
+import os
+import json
+import hashlib
+
+from src.utils.atomic_write import atomic_write
+
+
+class DocumentManifest:
+    """
+    Fingerprints (size, mtime, SHA-256) of the PDFs that have been ingested.
+
+    Comparing the raw directory against the manifest tells which files are new, which
+    changed since they were ingested and which were removed. A file is only hashed when
+    its size or mtime differ from the recorded ones, so an unchanged corpus is checked
+    with one stat call per file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.entries = json.load(f)
+
+    def __contains__(self, filename):
+        return filename in self.entries
+
+    def fingerprint(self, file_path, sha256=None):
+        """Return {'size', 'mtime', 'sha256'} for a file, hashing it unless sha256 is given."""
+        stat = os.stat(file_path)
+        if sha256 is None:
+            digest = hashlib.sha256()
+            with open(file_path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(block)
+            sha256 = digest.hexdigest()
+        return {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': sha256}
+
+    def diff(self, directory, filenames):
+        """
+        Compare files in a directory against the manifest.
+
+        A file whose size or mtime changed but whose content hash did not (e.g. after a
+        copy or touch) counts as unchanged and only its recorded fingerprint is updated.
+
+        Args:
+            directory: Directory holding the files
+            filenames: Names of the files currently present
+
+        Returns:
+            Dict with lists of filenames under 'new', 'changed', 'removed' and 'unchanged'
+        """
+        result = {'new': [], 'changed': [], 'removed': [], 'unchanged': []}
+
+        for filename in filenames:
+            entry = self.entries.get(filename)
+            if entry is None:
+                result['new'].append(filename)
+                continue
+
+            path = os.path.join(directory, filename)
+            stat = os.stat(path)
+            if stat.st_size == entry['size'] and stat.st_mtime == entry['mtime']:
+                result['unchanged'].append(filename)
+                continue
+
+            fingerprint = self.fingerprint(path)
+            if fingerprint['sha256'] == entry['sha256']:
+                self.entries[filename] = fingerprint
+                result['unchanged'].append(filename)
+            else:
+                result['changed'].append(filename)
+
+        present = set(filenames)
+        result['removed'] = [filename for filename in self.entries if filename not in present]
+        return result
+
+    def record(self, filename, file_path):
+        """Record the current fingerprint of an ingested file."""
+        self.entries[filename] = self.fingerprint(file_path)
+
+    def remove(self, filename):
+        self.entries.pop(filename, None)
+
+    def save(self):
+        atomic_write(self.path, lambda f: json.dump(self.entries, f, indent=2))
@@ -1,17 +1,74 @@
 import pytesseract
 from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+
+from src.utils.metrics import metrics
 
 class OCREngine:
-    def __init__(self, tesseract_cmd=None, lang='eng'):
+    def __init__(self, tesseract_cmd=None, lang='eng', config='', cache=None, num_workers=4):
+        """
+        Args:
+            tesseract_cmd: Path to the tesseract binary
+            lang: Tesseract language(s)
+            config: Extra tesseract command-line options
+            cache: Optional OCRCache; results are reused for identical images and settings
+            num_workers: Concurrent tesseract processes in extract_texts
+        """
         if tesseract_cmd:
             pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
         self.lang = lang
+        self.config = config
+        self.cache = cache
+        self.num_workers = num_workers
+    
+    @property
+    def settings(self):
+        """Everything besides the pixels that changes OCR output, for cache keys."""
+        return f"{pytesseract.pytesseract.tesseract_cmd}|{self.lang}|{self.config}"
     
     def extract_text(self, image):
         """Extract text from an image using OCR."""
+        return self.extract_texts([image])[0]
+    
+    def extract_texts(self, images):
+        """
+        Extract text from many images, running tesseract on a bounded pool of workers.
+
+        Cached results are returned without running tesseract; new results are cached.
+        """
+        texts = [None] * len(images)
+        keys = [None] * len(images)
+        
+        pending = []
+        for i, image in enumerate(images):
+            if self.cache is not None:
+                keys[i] = self.cache.make_key(image, self.settings)
+                texts[i] = self.cache.get(keys[i])
+            if texts[i] is None:
+                pending.append(i)
+        
+        metrics.inc("ocr_images_total", len(images))
+        metrics.inc("ocr_cache_hits_total", len(images) - len(pending))
+        with metrics.span("ocr"):
+            if len(pending) <= 1:
+                results = [self._run_tesseract(images[i]) for i in pending]
+            else:
+                # tesseract runs as a subprocess, so threads are enough to use every core
+                with ThreadPoolExecutor(max_workers=self.num_workers) as pool:
+                    results = list(pool.map(self._run_tesseract, [images[i] for i in pending]))
+        
+        for i, (text, ok) in zip(pending, results):
+            texts[i] = text
+            if ok and self.cache is not None:
+                self.cache.put(keys[i], text)
+        
+        return texts
+    
+    def _run_tesseract(self, image):
+        """Returns (text, ok); failures yield empty text and are not cached."""
         try:
-            text = pytesseract.image_to_string(image, lang=self.lang)
-            return text.strip()
+            text = pytesseract.image_to_string(image, lang=self.lang, config=self.config)
+            return text.strip(), True
         except Exception as e:
             print(f"OCR error: {e}")
-            return ""
\ No newline at end of file
+            return "", False
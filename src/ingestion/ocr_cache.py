@@ -0,0 +1,119 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+from src.utils.lru_cache import cache_stats
+
+
+class OCRCache:
+    """
+    Disk-backed cache of OCR results keyed by image content hash and OCR settings.
+
+    Entries live in a small SQLite database so several ingestion processes can share it.
+    When the stored text exceeds max_size_bytes the least recently used entries are
+    evicted; their total size is kept in the database by triggers, so checking it does
+    not scan the table and stays right when several processes write. One connection is shared by all threads of a process and serialized by a
+    lock, since the ingestion pipeline extracts each document on a new thread.
+    """
+
+    def __init__(self, path, max_size_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        self._connection = None
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def __getstate__(self):
+        # Connections can't cross process boundaries; workers open their own
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS ocr ("
+                "key TEXT PRIMARY KEY, text TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS ocr_last_access ON ocr (last_access)")
+            self._connection.executescript(
+                "BEGIN;"
+                "CREATE TABLE IF NOT EXISTS ocr_size (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL);"
+                # Caches created before the total was tracked are summed once
+                "INSERT OR IGNORE INTO ocr_size SELECT 0, COALESCE(SUM(size), 0) FROM ocr;"
+                "CREATE TRIGGER IF NOT EXISTS ocr_size_insert AFTER INSERT ON ocr "
+                "BEGIN UPDATE ocr_size SET total = total + new.size; END;"
+                "CREATE TRIGGER IF NOT EXISTS ocr_size_update AFTER UPDATE OF size ON ocr "
+                "BEGIN UPDATE ocr_size SET total = total + new.size - old.size; END;"
+                "CREATE TRIGGER IF NOT EXISTS ocr_size_delete AFTER DELETE ON ocr "
+                "BEGIN UPDATE ocr_size SET total = total - old.size; END;"
+                "COMMIT;"
+            )
+        return self._connection
+
+    @staticmethod
+    def make_key(image, settings):
+        """Hash the decoded pixels together with the settings that affect OCR output."""
+        digest = hashlib.sha256()
+        digest.update(f"{image.mode}:{image.width}x{image.height}:{settings}".encode('utf-8'))
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return the cached text for a key, or None."""
+        with self._lock:
+            row = self.connection.execute("SELECT text FROM ocr WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.connection.execute("UPDATE ocr SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.connection.commit()
+            return row[0]
+
+    def put(self, key, text):
+        size = len(text.encode('utf-8'))
+        with self._lock:
+            # An upsert rather than INSERT OR REPLACE, whose implicit delete skips the triggers
+            self.connection.execute(
+                "INSERT INTO ocr (key, text, size, last_access) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET text = excluded.text, size = excluded.size, "
+                "last_access = excluded.last_access",
+                (key, text, size, time.time())
+            )
+            self._evict()
+            self.connection.commit()
+
+    def stats(self):
+        return cache_stats(self.hits, self.misses)
+
+    def _evict(self):
+        """Drop least recently used entries until the stored text fits in max_size_bytes."""
+        total = self.connection.execute("SELECT total FROM ocr_size").fetchone()[0]
+        if total <= self.max_size_bytes:
+            return
+
+        excess = total - self.max_size_bytes
+        freed = 0
+        victims = []
+        for key, size in self.connection.execute("SELECT key, size FROM ocr ORDER BY last_access"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self.connection.executemany("DELETE FROM ocr WHERE key = ?", victims)
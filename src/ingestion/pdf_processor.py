@@ -4,82 +4,294 @@ import numpy as np
 from PIL import Image
 import io
 import sys
+import hashlib
+import multiprocessing
 from pathlib import Path
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 # Add the project root to the Python path
 project_root = Path(__file__).parent.parent.absolute()
 sys.path.append(str(project_root))
 
+from src.utils.metrics import metrics
+
 
 class PDFProcessor:
-    def __init__(self, ocr_engine=None, table_extractor=None, formula_parser=None):
+    def __init__(self, ocr_engine=None, table_extractor=None, formula_parser=None,
+                 num_workers=1, pages_per_task=16):
+        """
+        Args:
+            ocr_engine: Optional OCREngine for text in images
+            table_extractor: Optional extractor with extract_tables(page)
+            formula_parser: Optional parser with extract_formulas(page)
+            num_workers: Processes used to process pages; 1 processes pages serially
+            pages_per_task: Number of consecutive pages handed to a worker at a time
+        """
         self.ocr_engine = ocr_engine
         self.table_extractor = table_extractor
         self.formula_parser = formula_parser
+        self.num_workers = num_workers
+        self.pages_per_task = pages_per_task
+    
+    def process_pdf(self, pdf_path, num_workers=None, pages_per_task=None):
+        """
+        Process a PDF file and extract text, images, tables and formulas.
+
+        With more than one worker, page ranges are processed in a process pool where each
+        worker opens its own document handle; pages are merged back in order, so the
+        result is identical to the serial path.
+
+        Images repeated across pages (same xref or same bytes) are decoded and OCR'd once.
+        Only the first occurrence keeps 'image_bytes' and lists every page it appears on
+        in 'page_nums'; later occurrences reference it through 'duplicate_of'.
+        """
+        pages = list(self.iter_pages(pdf_path, num_workers, pages_per_task))
+        repeats = collect_repeat_pages(pages)
+        for page in pages:
+            for image in page['images']:
+                if image['id'] in repeats:
+                    image['page_nums'] = merge_page_nums(image['page_nums'], repeats[image['id']])
+
+        return {
+            'metadata': self.get_metadata(pdf_path),
+            'pages': pages
+        }
     
-    def process_pdf(self, pdf_path):
-        """Process a PDF file and extract text, images, tables and formulas."""
+    def get_metadata(self, pdf_path):
+        """Read document-level metadata without processing any pages."""
         document = fitz.open(pdf_path)
-        
-        # Initialize results structure
-        result = {
-            'metadata': {
+        try:
+            return {
                 'filename': os.path.basename(pdf_path),
                 'pages': len(document),
                 'title': document.metadata.get('title', ''),
                 'author': document.metadata.get('author', ''),
                 'creation_date': document.metadata.get('creationDate', '')
-            },
-            'pages': []
+            }
+        finally:
+            document.close()
+    
+    def iter_pages(self, pdf_path, num_workers=None, pages_per_task=None):
+        """
+        Yield processed pages in page order without holding the whole document.
+
+        In parallel mode at most two page ranges per worker are in flight, so a slow
+        consumer holds back extraction instead of letting pages pile up. Because pages
+        are handed out as they are processed, 'page_nums' on a repeated image's first
+        occurrence holds only its own page; the pages of its repeats are known once they
+        have been yielded (see collect_repeat_pages).
+        """
+        num_workers = num_workers or self.num_workers
+        pages_per_task = pages_per_task or self.pages_per_task
+        
+        document = fitz.open(pdf_path)
+        page_count = len(document)
+        originals = {}
+        
+        if num_workers <= 1 or page_count <= pages_per_task:
+            # Process each page
+            seen = {'xrefs': {}, 'hashes': {}}
+            try:
+                for page_idx, page in enumerate(document):
+                    page_data = self._process_page(document, page_idx, page, seen)
+                    self._link_duplicate_images([page_data], originals)
+                    yield page_data
+            finally:
+                document.close()
+            return
+        
+        document.close()
+        
+        ranges = [(start, min(start + pages_per_task, page_count))
+                  for start in range(0, page_count, pages_per_task)]
+        # Spawn rather than fork: the ingestion pipeline calls this from a thread, and a
+        # forked child would inherit locks held by the parent's other threads
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=num_workers, mp_context=context) as pool:
+            pending = deque()
+            for start, end in ranges:
+                pending.append(pool.submit(self._process_page_range, pdf_path, start, end))
+                if len(pending) < 2 * num_workers:
+                    continue
+                yield from self._drain_range(pending.popleft(), originals)
+            
+            while pending:
+                yield from self._drain_range(pending.popleft(), originals)
+    
+    def _drain_range(self, future, originals):
+        """Yield the pages of a finished range; workers only deduplicate within their own range."""
+        pages, worker_metrics = future.result()
+        metrics.merge(worker_metrics)
+        self._link_duplicate_images(pages, originals)
+        yield from pages
+    
+    def _process_page_range(self, pdf_path, start, end):
+        """
+        Process pages [start, end) with a document handle owned by this (worker) process.
+
+        Returns the pages and the metrics recorded while processing them, for the parent
+        process to merge into its own.
+        """
+        document = fitz.open(pdf_path)
+        seen = {'xrefs': {}, 'hashes': {}}
+        try:
+            pages = [self._process_page(document, page_idx, document[page_idx], seen)
+                     for page_idx in range(start, end)]
+            return pages, metrics.drain()
+        finally:
+            document.close()
+    
+    def _process_page(self, document, page_idx, page, seen=None):
+        """
+        Extract text, images, tables and formulas from a single page.
+
+        Args:
+            seen: Images already extracted from earlier pages, as {'xrefs': {xref: hash},
+                'hashes': {hash: {'id', 'width', 'height'}}}; updated in place
+        """
+        if seen is None:
+            seen = {'xrefs': {}, 'hashes': {}}
+        
+        with metrics.span("pdf_page"):
+            page_data = self._extract_page(document, page_idx, page, seen)
+        metrics.inc("pages_processed_total")
+        metrics.inc("images_extracted_total", sum('image_bytes' in image for image in page_data['images']))
+        return page_data
+    
+    def _extract_page(self, document, page_idx, page, seen):
+        page_data = {
+            'page_num': page_idx + 1,
+            'text': page.get_text(),
+            'images': [],
+            'tables': [],
+            'formulas': []
         }
         
-        # Process each page
-        for page_idx, page in enumerate(document):
-            page_data = {
-                'page_num': page_idx + 1,
-                'text': page.get_text(),
-                'images': [],
-                'tables': [],
-                'formulas': []
-            }
+        # Extract images
+        image_list = page.get_images(full=True)
+        ocr_images = []
+        for img_idx, img_info in enumerate(image_list):
+            xref = img_info[0]
+            image_id = f"page_{page_idx+1}_img_{img_idx+1}"
             
-            # Extract images
-            image_list = page.get_images(full=True)
-            for img_idx, img_info in enumerate(image_list):
-                xref = img_info[0]
+            # Repeated xrefs (logos, headers, stamps) are not extracted again, and
+            # identical bytes under another xref are not decoded again
+            image_hash = seen['xrefs'].get(xref)
+            if image_hash is None:
                 base_image = document.extract_image(xref)
                 image_bytes = base_image["image"]
-                
-                # Convert to PIL Image for further processing
-                image = Image.open(io.BytesIO(image_bytes))
-                
-                # Use OCR if available and image is large enough to potentially contain text
-                if self.ocr_engine and (image.width > 100 and image.height > 100):
-                    extracted_text = self.ocr_engine.extract_text(image)
-                else:
-                    extracted_text = ""
-                
-                # Store image data
-                image_data = {
-                    'id': f"page_{page_idx+1}_img_{img_idx+1}",
-                    'width': image.width,
-                    'height': image.height,
-                    'extracted_text': extracted_text,
-                    'image_bytes': image_bytes  # Store for embedding generation
-                }
-                page_data['images'].append(image_data)
+                image_hash = hashlib.sha1(image_bytes).hexdigest()
+                seen['xrefs'][xref] = image_hash
+            
+            if image_hash in seen['hashes']:
+                original = seen['hashes'][image_hash]
+                page_data['images'].append({
+                    'id': image_id,
+                    'width': original['width'],
+                    'height': original['height'],
+                    'extracted_text': "",
+                    'image_hash': image_hash,
+                    'duplicate_of': original['id']
+                })
+                continue
             
-            # Extract tables if table extractor is available
-            if self.table_extractor:
-                tables = self.table_extractor.extract_tables(page)
-                page_data['tables'] = tables
+            # Convert to PIL Image for further processing
+            image = Image.open(io.BytesIO(image_bytes))
             
-            # Extract formulas if formula parser is available
-            if self.formula_parser:
-                formulas = self.formula_parser.extract_formulas(page)
-                page_data['formulas'] = formulas
+            # Store image data
+            image_data = {
+                'id': image_id,
+                'width': image.width,
+                'height': image.height,
+                'extracted_text': "",
+                'image_hash': image_hash,
+                'image_bytes': image_bytes  # Store for embedding generation
+            }
+            page_data['images'].append(image_data)
+            seen['hashes'][image_hash] = {'id': image_id, 'width': image.width, 'height': image.height}
             
-            result['pages'].append(page_data)
+            # Use OCR if available and image is large enough to potentially contain text
+            if self.ocr_engine and (image.width > 100 and image.height > 100):
+                ocr_images.append((image_data, image))
         
-        document.close()
-        return result
\ No newline at end of file
+        # OCR the page's images as one batch so they run concurrently
+        if ocr_images:
+            texts = self.ocr_engine.extract_texts([image for _, image in ocr_images])
+            for (image_data, _), text in zip(ocr_images, texts):
+                image_data['extracted_text'] = text
+        
+        # Extract tables if table extractor is available
+        if self.table_extractor:
+            tables = self.table_extractor.extract_tables(page)
+            page_data['tables'] = tables
+        
+        # Extract formulas if formula parser is available
+        if self.formula_parser:
+            formulas = self.formula_parser.extract_formulas(page)
+            page_data['formulas'] = formulas
+        
+        return page_data
+    
+    def _link_duplicate_images(self, pages, originals=None):
+        """
+        Point every repeated image at its first occurrence in page order.
+
+        The first occurrence keeps the bytes and gets 'page_nums' with its own page;
+        repeats drop their bytes and copy its size and OCR text.
+
+        Args:
+            originals: {image_hash: summary of the first occurrence} carried across calls
+                when pages are linked incrementally; updated in place
+        """
+        if originals is None:
+            originals = {}
+        
+        for page in pages:
+            for image in page['images']:
+                original = originals.get(image['image_hash'])
+                if original is None:
+                    image['page_nums'] = [page['page_num']]
+                    # Keep a summary rather than the image itself so its bytes can be freed
+                    originals[image['image_hash']] = {
+                        'id': image['id'],
+                        'width': image['width'],
+                        'height': image['height'],
+                        'extracted_text': image['extracted_text']
+                    }
+                    continue
+                
+                image.pop('image_bytes', None)
+                image['duplicate_of'] = original['id']
+                image['width'] = original['width']
+                image['height'] = original['height']
+                image['extracted_text'] = original['extracted_text']
+
+
+def collect_repeat_pages(pages, repeats=None):
+    """
+    Collect the pages on which repeated images appear again.
+
+    Args:
+        pages: Pages as yielded by PDFProcessor.iter_pages
+        repeats: {first occurrence id: [page numbers]} carried across calls when pages
+            arrive in batches; updated in place
+
+    Returns:
+        The repeats dict
+    """
+    if repeats is None:
+        repeats = {}
+
+    for page in pages:
+        for image in page['images']:
+            if 'duplicate_of' in image:
+                page_nums = repeats.setdefault(image['duplicate_of'], [])
+                if page['page_num'] not in page_nums:
+                    page_nums.append(page['page_num'])
+    return repeats
+
+
+def merge_page_nums(page_nums, repeat_pages):
+    """A new sorted list of the pages in both lists."""
+    return sorted(set(page_nums).union(repeat_pages))
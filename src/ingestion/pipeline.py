@@ -0,0 +1,223 @@
+import os
+import json
+import queue
+import threading
+
+from src.ingestion.pdf_processor import collect_repeat_pages, merge_page_nums
+from src.utils.metrics import metrics
+
+
+# Marks the end of a stage's output
+_DONE = object()
+
+
+class ProcessedDocumentWriter:
+    """Writes processed/<name>.json one page at a time, leaving out raw image bytes."""
+
+    def __init__(self, path, metadata):
+        self.path = path
+        self._tmp_path = path + ".tmp"
+        self._file = open(self._tmp_path, 'w')
+        self._file.write('{"metadata": ' + json.dumps(metadata) + ', "pages": [')
+        self._first = True
+
+    def write_page(self, page):
+        page = dict(page, images=[
+            dict(image, image_bytes='[BINARY DATA REMOVED FOR STORAGE]') if 'image_bytes' in image else image
+            for image in page.get('images', [])
+        ])
+        if not self._first:
+            self._file.write(', ')
+        self._file.write(json.dumps(page))
+        self._first = False
+
+    def close(self):
+        self._file.write(']}')
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        self._file.close()
+        os.remove(self._tmp_path)
+
+
+class IngestionPipeline:
+    """
+    Streams a PDF from PDFProcessor through embedding into the vector store.
+
+    Three stages run concurrently: page extraction (including OCR), embedding, and
+    index writes. Pages move between them in batches of `pages_per_batch` through queues
+    holding at most `max_pending_batches` batches, so a slow stage blocks the one before
+    it. Peak memory is therefore bounded by a few batches of pages regardless of the
+    document's size, and text vectors become searchable batch by batch.
+
+    Vectors of images (and of their OCR text) are held back until the whole document
+    has been extracted, because an image may still turn up on later pages and its
+    'page_nums' is only complete then. If ingestion fails, everything already indexed
+    for the document is deleted again.
+    """
+
+    def __init__(self, pdf_processor, text_embedder, image_embedder, vector_store,
+                 pages_per_batch=8, max_pending_batches=2, chunk_size=1000, chunk_overlap=200):
+        self.pdf_processor = pdf_processor
+        self.text_embedder = text_embedder
+        self.image_embedder = image_embedder
+        self.vector_store = vector_store
+        self.pages_per_batch = pages_per_batch
+        self.max_pending_batches = max_pending_batches
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def ingest(self, pdf_path, processed_file=None):
+        """
+        Process, embed and index one PDF.
+
+        Args:
+            pdf_path: PDF to ingest
+            processed_file: Optional path for the processed JSON (without image bytes)
+
+        Returns:
+            Dict with the document metadata and page/vector counts
+        """
+        with metrics.span("ingest_document"):
+            stats = self._ingest(pdf_path, processed_file)
+        metrics.inc("documents_ingested_total")
+        return stats
+
+    def _ingest(self, pdf_path, processed_file):
+        metadata = self.pdf_processor.get_metadata(pdf_path)
+        writer = ProcessedDocumentWriter(processed_file, metadata) if processed_file else None
+
+        page_batches = queue.Queue(maxsize=self.max_pending_batches)
+        embedded_batches = queue.Queue(maxsize=self.max_pending_batches)
+        stop = threading.Event()
+        errors = []
+
+        extract = threading.Thread(
+            target=self._run_stage, args=(self._extract, (pdf_path,), None, page_batches, stop, errors),
+            daemon=True
+        )
+        embed = threading.Thread(
+            target=self._run_stage, args=(self._embed, (metadata,), page_batches, embedded_batches, stop, errors),
+            daemon=True
+        )
+        extract.start()
+        embed.start()
+
+        stats = {'metadata': metadata, 'pages': 0, 'text_vectors': 0, 'image_vectors': 0}
+        held_text = []
+        held_images = []
+        repeats = {}
+        try:
+            while True:
+                item = self._get(embedded_batches, stop)
+                if item is _DONE:
+                    break
+
+                pages, text_vectors, image_vectors = item
+                collect_repeat_pages(pages, repeats)
+                held_text.extend(vector for vector in text_vectors if 'page_nums' in vector)
+                held_images.extend(image_vectors)
+                self.vector_store.add_text_vectors(
+                    [vector for vector in text_vectors if 'page_nums' not in vector]
+                )
+                if writer:
+                    for page in pages:
+                        writer.write_page(page)
+
+                stats['pages'] += len(pages)
+                stats['text_vectors'] += len(text_vectors)
+                stats['image_vectors'] += len(image_vectors)
+
+            if not stop.is_set():
+                self.vector_store.add_text_vectors(self._with_repeat_pages(held_text, repeats))
+                self.vector_store.add_image_vectors(self._with_repeat_pages(held_images, repeats))
+        except BaseException:
+            stop.set()
+            raise
+        finally:
+            extract.join()
+            embed.join()
+            failed = errors or stop.is_set()
+            if failed:
+                # Don't leave a partially indexed document searchable
+                self.vector_store.delete_document(metadata['filename'])
+            if writer:
+                if failed:
+                    writer.abort()
+                else:
+                    writer.close()
+
+        if errors:
+            raise errors[0]
+        return stats
+
+    def _with_repeat_pages(self, vectors, repeats):
+        """Copies of image-derived vectors whose 'page_nums' include the pages of their repeats."""
+        return [
+            dict(vector, page_nums=merge_page_nums(vector['page_nums'], repeats[vector['image_id']]))
+            if vector.get('image_id') in repeats else vector
+            for vector in vectors
+        ]
+
+    def _extract(self, pdf_path):
+        """Stage 1: yield batches of processed pages."""
+        batch = []
+        for page in self.pdf_processor.iter_pages(pdf_path):
+            batch.append(page)
+            if len(batch) == self.pages_per_batch:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _embed(self, metadata, pages):
+        """Stage 2: embed one batch of pages."""
+        document_data = {'metadata': metadata, 'pages': pages}
+        text_vectors = self.text_embedder.embed_document(document_data, self.chunk_size, self.chunk_overlap)
+        image_vectors = self.image_embedder.embed_document_images(document_data)
+        return pages, text_vectors, image_vectors
+
+    def _run_stage(self, stage, args, inbox, outbox, stop, errors):
+        """
+        Drive a stage in its own thread.
+
+        A source stage (no inbox) is a generator of items; other stages map each item
+        from the inbox to one item in the outbox. Errors are recorded and stop the pipeline.
+        """
+        try:
+            if inbox is None:
+                for item in stage(*args):
+                    if not self._put(outbox, item, stop):
+                        return
+            else:
+                while True:
+                    item = self._get(inbox, stop)
+                    if item is _DONE:
+                        break
+                    if not self._put(outbox, stage(*args, item), stop):
+                        return
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            self._put(outbox, _DONE, stop)
+
+    def _put(self, q, item, stop):
+        """Blocking put that gives up once the pipeline is stopping."""
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q, stop):
+        """Blocking get that returns _DONE once the pipeline is stopping."""
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if stop.is_set():
+                    return _DONE
@@ -0,0 +1,163 @@
+import numpy as np
+
+from src.retrieval.embedding_matrix import top_k_indices
+from src.utils.atomic_write import atomic_write
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest-neighbour index over normalized vectors.
+
+    A spherical k-means coarse quantizer splits the rows into `n_lists` clusters. A query
+    is scored exactly against the rows of its `nprobe` closest clusters only, so nprobe
+    trades recall for speed. New rows are assigned to their nearest centroid, so inserts
+    are incremental; the centroids themselves are only learned by `train`.
+
+    The index stores row numbers, not vectors: scoring reads the rows from the store's
+    resident EmbeddingMatrix.
+    """
+
+    def __init__(self, n_lists=None, nprobe=8, train_iterations=10, max_train_rows=100000, seed=0):
+        """
+        Args:
+            n_lists: Number of clusters; defaults to 4 * sqrt(rows) at training time
+            nprobe: Default number of clusters scored per query
+            train_iterations: k-means iterations
+            max_train_rows: Rows sampled for k-means training
+            seed: Seed for sampling and centroid initialization
+        """
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.train_iterations = train_iterations
+        self.max_train_rows = max_train_rows
+        self.seed = seed
+        self.centroids = None
+        self.lists = []
+        self.ntotal = 0
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def train(self, vectors):
+        """Learn the coarse centroids from (a sample of) the normalized vectors."""
+        rng = np.random.default_rng(self.seed)
+        n_lists = self.n_lists or max(1, int(4 * np.sqrt(len(vectors))))
+        n_lists = min(n_lists, len(vectors))
+
+        sample_size = min(len(vectors), max(self.max_train_rows, n_lists))
+        sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))])
+
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(self.train_iterations):
+            assignments = self._assign(sample, centroids)
+            counts = np.bincount(assignments, minlength=n_lists)
+
+            # Per-cluster sums via one sort and a segmented reduction
+            sums = np.zeros_like(centroids)
+            nonempty = np.flatnonzero(counts)
+            starts = (np.cumsum(counts) - counts)[nonempty]
+            sums[nonempty] = np.add.reduceat(sample[np.argsort(assignments, kind='stable')], starts, axis=0)
+
+            # Re-seed empty clusters with random sample rows
+            empty = counts == 0
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = sums / norms
+
+        self.n_lists = n_lists
+        self.centroids = centroids.astype(np.float32)
+        self.reset()
+
+    def reset(self):
+        """Empty the inverted lists but keep the trained centroids."""
+        self.lists = [np.zeros(0, dtype=np.int64) for _ in range(self.n_lists)]
+        self.ntotal = 0
+
+    def add(self, vectors):
+        """Assign normalized rows to clusters; they get row ids ntotal, ntotal + 1, ..."""
+        if len(vectors) == 0:
+            return
+
+        assignments = self._assign(vectors, self.centroids)
+        row_ids = np.arange(self.ntotal, self.ntotal + len(vectors), dtype=np.int64)
+
+        order = np.argsort(assignments, kind='stable')
+        clusters, starts = np.unique(assignments[order], return_index=True)
+        for cluster, ids in zip(clusters, np.split(row_ids[order], starts[1:])):
+            self.lists[cluster] = np.concatenate([self.lists[cluster], ids])
+
+        self.ntotal += len(vectors)
+
+    def search(self, embeddings, query, top_k, nprobe=None):
+        """
+        Approximate top-k rows for a normalized query.
+
+        Args:
+            embeddings: The (n, dim) matrix the row ids refer to
+            query: Normalized query vector
+            top_k: Number of results
+            nprobe: Clusters to score; defaults to self.nprobe
+
+        Returns:
+            (row_ids, similarities), best first
+        """
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        probes = top_k_indices(self.centroids @ query, nprobe)
+
+        candidates = np.concatenate([self.lists[cluster] for cluster in probes])
+        if len(candidates) == 0:
+            return candidates, np.zeros(0, dtype=np.float32)
+
+        scores = embeddings[candidates] @ query
+        best = top_k_indices(scores, top_k)
+        return candidates[best], scores[best]
+
+    def save(self, path, generation=0):
+        """
+        Write centroids and inverted lists to a single .npz file, replacing it atomically.
+
+        Args:
+            generation: Numbering of the rows the ids refer to, returned by load
+        """
+        offsets = np.cumsum([0] + [len(ids) for ids in self.lists])
+        ids = np.concatenate(self.lists) if self.lists else np.zeros(0, dtype=np.int64)
+
+        atomic_write(
+            path,
+            lambda f: np.savez(f, centroids=self.centroids, ids=ids, offsets=offsets, ntotal=self.ntotal,
+                               generation=generation),
+            mode='wb'
+        )
+
+    def load(self, path):
+        data = np.load(path)
+        offsets = data['offsets']
+        ids = data['ids']
+        self.centroids = data['centroids']
+        self.n_lists = len(self.centroids)
+        self.lists = [ids[offsets[i]:offsets[i + 1]] for i in range(self.n_lists)]
+        self.ntotal = int(data['ntotal'])
+        return int(data['generation']) if 'generation' in data else 0
+
+    def _assign(self, vectors, centroids, block_size=65536):
+        """Nearest centroid (max inner product) for each row, in blocks to bound memory."""
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), block_size):
+            block = np.asarray(vectors[start:start + block_size])
+            assignments[start:start + block_size] = np.argmax(block @ centroids.T, axis=1)
+        return assignments
+
+
+# Index types SimpleVectorStore can be configured with
+ANN_INDEXES = {
+    'ivf': IVFIndex
+}
+
+
+def create_ann_index(index_type, **params):
+    if index_type not in ANN_INDEXES:
+        raise ValueError(f"Unknown ANN index type: {index_type}")
+    return ANN_INDEXES[index_type](**params)
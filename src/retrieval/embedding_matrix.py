@@ -0,0 +1,233 @@
+import numpy as np
+
+
+def normalize_rows(vectors):
+    """Return a float32 copy of the vectors scaled to unit L2 norm."""
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k_indices(scores, top_k):
+    """Indices of the top_k highest scores, best first, without a full sort."""
+    top_k = min(top_k, len(scores))
+    if top_k <= 0:
+        return np.zeros(0, dtype=np.int64)
+
+    if top_k < len(scores):
+        candidates = np.argpartition(scores, -top_k)[-top_k:]
+    else:
+        candidates = np.arange(len(scores))
+
+    return candidates[np.argsort(scores[candidates])[::-1]]
+
+
+def blocked_top_k(matrix, queries, top_k, block_rows=16384, query_block=256, exclude=None):
+    """
+    Top-k rows of a matrix by inner product for every query, without materializing the
+    full (queries x rows) score matrix.
+
+    The corpus is scored in tiles of block_rows rows with one matrix-matrix product per
+    tile (and per query_block queries); each tile's best k per query are merged into a
+    running top k, so memory stays at query_block x block_rows scores.
+
+    Args:
+        matrix: (n, dim) rows, e.g. a resident or memory-mapped embedding matrix
+        queries: (q, dim) normalized queries
+        top_k: Results per query
+        block_rows: Corpus rows scored per tile
+        query_block: Queries scored together per tile
+        exclude: Optional sorted array of rows never to return (e.g. deleted rows)
+
+    Returns:
+        (indices, scores): (q, k) arrays, best first per row, with k = min(top_k, n)
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    top_k = min(top_k, len(matrix))
+    indices = np.zeros((len(queries), top_k), dtype=np.int64)
+    scores = np.full((len(queries), top_k), -np.inf, dtype=np.float32)
+    if top_k <= 0:
+        return indices, scores
+
+    for q_start in range(0, len(queries), query_block):
+        query_tile = queries[q_start:q_start + query_block]
+        best_indices = np.zeros((len(query_tile), 0), dtype=np.int64)
+        best_scores = np.zeros((len(query_tile), 0), dtype=np.float32)
+
+        for start in range(0, len(matrix), block_rows):
+            tile = np.asarray(matrix[start:start + block_rows])
+            tile_scores = query_tile @ tile.T
+            if exclude is not None and len(exclude):
+                lo, hi = np.searchsorted(exclude, [start, start + len(tile)])
+                tile_scores[:, exclude[lo:hi] - start] = -np.inf
+
+            k = min(top_k, len(tile))
+            if k < len(tile):
+                candidates = np.argpartition(tile_scores, -k, axis=1)[:, -k:]
+            else:
+                candidates = np.broadcast_to(np.arange(len(tile)), tile_scores.shape)
+
+            # Merge this tile's candidates into the running best k
+            merged_indices = np.concatenate([best_indices, candidates + start], axis=1)
+            merged_scores = np.concatenate(
+                [best_scores, np.take_along_axis(tile_scores, candidates, axis=1)], axis=1
+            )
+            if merged_scores.shape[1] > top_k:
+                keep = np.argpartition(merged_scores, -top_k, axis=1)[:, -top_k:]
+                merged_indices = np.take_along_axis(merged_indices, keep, axis=1)
+                merged_scores = np.take_along_axis(merged_scores, keep, axis=1)
+            best_indices, best_scores = merged_indices, merged_scores
+
+        order = np.argsort(-best_scores, axis=1)
+        indices[q_start:q_start + len(query_tile)] = np.take_along_axis(best_indices, order, axis=1)
+        scores[q_start:q_start + len(query_tile)] = np.take_along_axis(best_scores, order, axis=1)
+
+    return indices, scores
+
+
+class EmbeddingMatrix:
+    """
+    Resident, row-normalized float32 matrix for one modality.
+
+    Rows are kept unit-length so cosine similarity is a single matrix-vector product.
+    The initial rows may be a read-only memory map; the first append copies them into
+    an in-memory buffer with spare capacity, and later appends fill it in place.
+    """
+
+    def __init__(self, data=None):
+        """
+        Args:
+            data: Optional (n, dim) array of already-normalized rows, e.g. a memory map
+        """
+        if data is None or len(data) == 0:
+            data = np.zeros((0, 0), dtype=np.float32)
+        self._data = data
+        self._size = len(data)
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def dim(self):
+        return self._data.shape[1]
+
+    @property
+    def array(self):
+        """View of the populated rows."""
+        return self._data[:self._size]
+
+    def append(self, vectors):
+        """Normalize vectors and append them, growing the buffer geometrically."""
+        if len(vectors) == 0:
+            return
+        vectors = normalize_rows(vectors)
+
+        if self._size == 0:
+            self._data = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected vectors of dimension {self.dim}, got {vectors.shape[1]}")
+
+        needed = self._size + len(vectors)
+        if needed > len(self._data) or not self._data.flags.writeable:
+            capacity = max(needed, 2 * len(self._data), 1024)
+            grown = np.empty((capacity, vectors.shape[1]), dtype=np.float32)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+
+        self._data[self._size:needed] = vectors
+        self._size = needed
+
+    def scores(self, query_vector):
+        """Cosine similarity of the query against every row."""
+        query = normalize_rows(query_vector)[0]
+        return self.array @ query
+
+
+class MappedEmbeddingMatrix:
+    """
+    Read-only, row-normalized float32 rows left in their memory-mapped segment files.
+
+    Stands in for EmbeddingMatrix when the store searches quantized codes: rows are read
+    from the page cache only where they are indexed (e.g. a rescoring shortlist), so no
+    float32 copy of the modality is held in memory. Appended rows stay in memory until
+    the store maps the segment they were written to.
+    """
+
+    def __init__(self, segments=()):
+        """
+        Args:
+            segments: (n, dim) arrays in row order, e.g. memory maps of the segment matrices
+        """
+        self._segments = [segment for segment in segments if len(segment)]
+        self._starts = np.cumsum([0] + [len(segment) for segment in self._segments])
+
+    def __len__(self):
+        return int(self._starts[-1])
+
+    @property
+    def dim(self):
+        return self._segments[0].shape[1] if self._segments else 0
+
+    @property
+    def shape(self):
+        return (len(self), self.dim)
+
+    @property
+    def array(self):
+        """The rows, indexable like an array; indexing reads only the rows selected."""
+        return self
+
+    def append(self, vectors):
+        """Normalize vectors and hold them in memory after the mapped rows."""
+        if len(vectors) == 0:
+            return
+        vectors = normalize_rows(vectors)
+        if len(self) and vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected vectors of dimension {self.dim}, got {vectors.shape[1]}")
+
+        self._segments.append(vectors)
+        self._starts = np.append(self._starts, len(self) + len(vectors))
+
+    def scores(self, query_vector):
+        """Cosine similarity of the query against every row."""
+        query = normalize_rows(query_vector)[0]
+        return self @ query
+
+    def __matmul__(self, query):
+        if not self._segments:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate([segment @ query for segment in self._segments])
+
+    def __array__(self, dtype=None, copy=None):
+        rows = self[:]
+        return rows if dtype is None else rows.astype(dtype)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                return self._read_range(start, stop)
+            key = np.arange(start, stop, step)
+        if isinstance(key, (int, np.integer)):
+            return self._read_rows(np.array([key]))[0]
+        return self._read_rows(np.asarray(key, dtype=np.int64))
+
+    def _read_range(self, start, stop):
+        parts = []
+        for segment, offset in zip(self._segments, self._starts):
+            lo, hi = max(start - offset, 0), min(stop - offset, len(segment))
+            if lo < hi:
+                parts.append(segment[lo:hi])
+        if not parts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.asarray(parts[0]) if len(parts) == 1 else np.concatenate(parts)
+
+    def _read_rows(self, rows):
+        rows = np.where(rows < 0, rows + len(self), rows)
+        out = np.empty((len(rows), self.dim), dtype=np.float32)
+        owners = np.searchsorted(self._starts, rows, side='right') - 1
+        for owner in np.unique(owners):
+            selected = owners == owner
+            out[selected] = self._segments[owner][rows[selected] - self._starts[owner]]
+        return out
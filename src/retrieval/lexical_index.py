@@ -0,0 +1,182 @@
+import re
+import json
+from collections import Counter
+
+import numpy as np
+
+from src.retrieval.embedding_matrix import top_k_indices
+from src.utils.atomic_write import atomic_write
+
+
+# Words and identifiers; hyphen/dot/slash-joined runs such as "NASA-STD-6016C",
+# "3.2.1" or "P/N" are kept together as one token
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-./][a-z0-9]+)*")
+
+
+def tokenize(text):
+    """
+    Lowercased tokens of a text.
+
+    A compound identifier yields itself and its parts, so "NASA-STD-6016C" matches both
+    an exact identifier query and a query for "6016C".
+    """
+    tokens = []
+    for match in _TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(match)
+        if not match.isalnum():
+            tokens.extend(part for part in re.split(r"[-./]", match) if part)
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuse several rankings of row ids into one.
+
+    Each row scores sum(1 / (k + rank)) over the rankings it appears in (rank from 1).
+
+    Args:
+        rankings: Sequences of row ids, best first
+        k: Damping constant; larger values flatten the advantage of top ranks
+
+    Returns:
+        (rows, scores) best first
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            fused[int(row)] = fused.get(int(row), 0.0) + 1.0 / (k + rank)
+
+    rows = np.fromiter(fused.keys(), dtype=np.int64, count=len(fused))
+    scores = np.fromiter(fused.values(), dtype=np.float64, count=len(fused))
+    order = np.argsort(-scores, kind='stable')
+    return rows[order], scores[order]
+
+
+class BM25Index:
+    """
+    Inverted index over chunk text scored with Okapi BM25.
+
+    Documents are identified by row number, aligned with the rows of a VectorCollection,
+    and are added incrementally. Each term's posting list holds (row, term frequency)
+    pairs; a query only touches the postings of its own terms.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        """
+        Args:
+            k1: Term frequency saturation
+            b: Strength of document length normalization
+        """
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.doc_lengths = []
+        self.total_length = 0
+        # Posting lists converted to arrays for scoring, dropped when a term gets new rows
+        self._arrays = {}
+
+    @property
+    def ntotal(self):
+        return len(self.doc_lengths)
+
+    def add(self, texts):
+        """Index texts as the next rows, in order."""
+        for text in texts:
+            row = len(self.doc_lengths)
+            tokens = tokenize(text or "")
+            for term, tf in Counter(tokens).items():
+                rows, tfs = self.postings.setdefault(term, ([], []))
+                rows.append(row)
+                tfs.append(tf)
+                self._arrays.pop(term, None)
+            self.doc_lengths.append(len(tokens))
+            self.total_length += len(tokens)
+
+    def reset(self):
+        self.postings = {}
+        self.doc_lengths = []
+        self.total_length = 0
+        self._arrays = {}
+
+    def search(self, query, top_k, exclude=None, within=None):
+        """
+        Rows with the highest BM25 score for the query.
+
+        Args:
+            query: Query text
+            top_k: Maximum number of rows to return
+            exclude: Optional set of rows to leave out (e.g. deleted rows)
+            within: Optional array of the only rows that may be returned (e.g. a filter's matches)
+
+        Returns:
+            (rows, scores) best first; only rows sharing a term with the query
+        """
+        terms = [term for term in set(tokenize(query)) if term in self.postings]
+        if not terms or not self.doc_lengths:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        doc_lengths = np.asarray(self.doc_lengths, dtype=np.float32)
+        average_length = self.total_length / len(self.doc_lengths) or 1.0
+
+        all_rows, all_scores = [], []
+        for term in terms:
+            rows, tfs = self._posting_arrays(term)
+            idf = np.log(1.0 + (len(self.doc_lengths) - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * doc_lengths[rows] / average_length)
+            all_rows.append(rows)
+            all_scores.append(idf * tfs * (self.k1 + 1.0) / (tfs + norm))
+
+        rows, inverse = np.unique(np.concatenate(all_rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores)).astype(np.float32)
+
+        if exclude:
+            keep = ~np.isin(rows, np.fromiter(exclude, dtype=np.int64, count=len(exclude)))
+            rows, scores = rows[keep], scores[keep]
+        if within is not None:
+            keep = np.isin(rows, within)
+            rows, scores = rows[keep], scores[keep]
+
+        top = top_k_indices(scores, top_k)
+        return rows[top], scores[top]
+
+    def save(self, path, generation=0):
+        """
+        Write the postings to a single .npz file, replacing it atomically.
+
+        Args:
+            generation: Numbering of the rows the postings refer to, returned by load
+        """
+        terms = list(self.postings)
+        offsets = np.cumsum([0] + [len(self.postings[term][0]) for term in terms])
+        rows = np.fromiter((row for term in terms for row in self.postings[term][0]), dtype=np.int64)
+        tfs = np.fromiter((tf for term in terms for tf in self.postings[term][1]), dtype=np.int32)
+
+        atomic_write(
+            path,
+            lambda f: np.savez(f, terms=np.array(json.dumps(terms)), offsets=offsets, rows=rows, tfs=tfs,
+                               doc_lengths=np.asarray(self.doc_lengths, dtype=np.int32), generation=generation),
+            mode='wb'
+        )
+
+    def load(self, path):
+        data = np.load(path)
+        terms = json.loads(str(data['terms']))
+        offsets = data['offsets']
+        rows = data['rows'].tolist()
+        tfs = data['tfs'].tolist()
+        self.postings = {
+            term: (rows[offsets[i]:offsets[i + 1]], tfs[offsets[i]:offsets[i + 1]])
+            for i, term in enumerate(terms)
+        }
+        self.doc_lengths = data['doc_lengths'].tolist()
+        self.total_length = sum(self.doc_lengths)
+        self._arrays = {}
+        return int(data['generation']) if 'generation' in data else 0
+
+    def _posting_arrays(self, term):
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            rows, tfs = self.postings[term]
+            arrays = (np.asarray(rows, dtype=np.int64), np.asarray(tfs, dtype=np.float32))
+            self._arrays[term] = arrays
+        return arrays
@@ -0,0 +1,89 @@
+import numpy as np
+
+
+# Fields that can be filtered on, with the record key their values come from
+FILTER_FIELDS = ('document_id', 'chunk_type', 'page_num')
+
+
+class MetadataIndex:
+    """
+    Posting lists from metadata values to row numbers for one VectorCollection.
+
+    Supports exact matches on document_id and chunk_type and ranges on page_num. A row
+    with 'page_nums' (an image repeated on several pages) is posted under each page.
+    Rows are appended in order, so every posting list is sorted.
+    """
+
+    def __init__(self):
+        self.postings = {field: {} for field in FILTER_FIELDS}
+        self.ntotal = 0
+
+    def add(self, records):
+        """Index records as the next rows, in order."""
+        for record in records:
+            row = self.ntotal
+            for field in ('document_id', 'chunk_type'):
+                value = record.get(field)
+                if value is not None:
+                    self.postings[field].setdefault(value, []).append(row)
+
+            pages = record.get('page_nums') or [record.get('page_num')]
+            for page in set(pages):
+                if page is not None:
+                    self.postings['page_num'].setdefault(page, []).append(row)
+
+            self.ntotal += 1
+
+    def reset(self):
+        self.postings = {field: {} for field in FILTER_FIELDS}
+        self.ntotal = 0
+
+    def rows(self, filters):
+        """
+        Rows matching every filter.
+
+        Args:
+            filters: Dict with any of
+                'document_id': a value or a list of values
+                'chunk_type': a value or a list of values (e.g. 'table', 'formula', 'image_text')
+                'page_num': a page number, a list or set of page numbers, or an inclusive
+                    (first, last) tuple; either end of the tuple may be None for an open range
+
+        Returns:
+            Sorted array of row numbers
+        """
+        unknown = set(filters) - set(FILTER_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown filter fields: {sorted(unknown)}")
+
+        matched = None
+        for field, condition in filters.items():
+            if condition is None:
+                continue
+            rows = self._field_rows(field, condition)
+            matched = rows if matched is None else np.intersect1d(matched, rows, assume_unique=True)
+            if len(matched) == 0:
+                break
+
+        if matched is None:
+            return np.arange(self.ntotal, dtype=np.int64)
+        return matched
+
+    def _field_rows(self, field, condition):
+        postings = self.postings[field]
+        if field == 'page_num' and isinstance(condition, tuple):
+            if len(condition) != 2:
+                raise ValueError(f"A page_num range must be a (first, last) tuple, got {condition!r}")
+            first, last = condition
+            lists = [rows for page, rows in postings.items()
+                     if (first is None or page >= first) and (last is None or page <= last)]
+        elif isinstance(condition, (list, tuple, set, frozenset)):
+            lists = [postings.get(value, []) for value in condition]
+        else:
+            lists = [postings.get(condition, [])]
+
+        if not lists:
+            return np.zeros(0, dtype=np.int64)
+        if len(lists) == 1:
+            return np.asarray(lists[0], dtype=np.int64)
+        return np.unique(np.concatenate([np.asarray(rows, dtype=np.int64) for rows in lists]))
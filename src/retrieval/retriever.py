@@ -1,40 +1,174 @@
+import hashlib
 import numpy as np
 
+from src.utils.lru_cache import LRUCache
+from src.utils.metrics import metrics
+
 class MultimodalRetriever:
-    def __init__(self, vector_store, text_embedder, image_embedder=None):
+    def __init__(self, vector_store, text_embedder, image_embedder=None,
+                 query_cache_size=1024, result_cache_size=256, lexical_candidates=100):
+        """
+        Args:
+            vector_store: SimpleVectorStore to search
+            text_embedder: TextEmbedder used for query text
+            image_embedder: Optional ImageEmbedder used for image queries
+            query_cache_size: Number of query embeddings kept, keyed by model and
+                normalized query text (0 disables)
+            result_cache_size: Number of retrieval results kept, keyed by query, mode,
+                top_k and store version (0 disables)
+            lexical_candidates: Number of BM25 candidates dense-scored in 'lexical_hybrid' mode
+        """
         self.vector_store = vector_store
         self.text_embedder = text_embedder
         self.image_embedder = image_embedder
-    
-    def retrieve(self, query, top_k=5, mode="text", image_bytes=None):
+        self.query_cache = LRUCache(query_cache_size)
+        self.result_cache = LRUCache(result_cache_size)
+        self.lexical_candidates = lexical_candidates
+        self._result_cache_version = vector_store.version
+
+    def retrieve(self, query, top_k=5, mode="text", image_bytes=None, filters=None):
         """
         Retrieve relevant content based on query.
-        
+
+        Results for a repeated query are served from a cache until vectors are added to
+        or removed from the store.
+
         Args:
             query: Text query or image query path
             top_k: Number of results to return
-            mode: 'text', 'image', or 'hybrid'
+            mode: 'text', 'image', 'hybrid' (text and image), or 'lexical_hybrid' (BM25
+                candidates fused with their dense ranking; useful for identifiers such as
+                standard or part numbers)
             image_bytes: Raw image bytes if mode is 'image' or 'hybrid'
+            filters: Optional dict scoping the search by 'document_id', 'chunk_type' and/or
+                'page_num' (a number, a list of numbers or an inclusive (first, last) tuple)
         """
+        query = self._normalize_query(query)
+        metrics.inc("queries_total", mode=mode)
+
+        version = self.vector_store.version
+        if version != self._result_cache_version:
+            # Every cached result predates the change; drop them rather than let them age out
+            self.result_cache.clear()
+            self._result_cache_version = version
+
+        image_key = hashlib.sha256(image_bytes).hexdigest() if image_bytes else None
+        cache_key = self._cache_key(query, mode, top_k, image_key, filters, False, version)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            metrics.inc("result_cache_hits_total", mode=mode)
+            return [dict(result) for result in cached]
+
+        if mode == "lexical_hybrid":
+            results = self.vector_store.hybrid_search_text(
+                query, self.embed_query(query), top_k=top_k, candidates=max(self.lexical_candidates, top_k),
+                filters=filters
+            )
+            self.result_cache.put(cache_key, results)
+            return [dict(result) for result in results]
+
         results = []
-        
+
         if mode == "text" or mode == "hybrid":
             # Generate text query embedding
-            query_embedding = self.text_embedder.generate_embeddings([query])[0]
-            
+            query_embedding = self.embed_query(query)
+
             # Search vector store
-            text_results = self.vector_store.search_text(query_embedding, top_k=top_k)
+            text_results = self.vector_store.search_text(query_embedding, top_k=top_k, filters=filters)
             results.extend(text_results)
-        
+
         if (mode == "image" or mode == "hybrid") and self.image_embedder and image_bytes:
             # Generate image query embedding
             query_embedding = self.image_embedder.generate_embedding(image_bytes)
-            
+
             if query_embedding:
                 # Search vector store for similar images
-                image_results = self.vector_store.search_images(query_embedding, top_k=top_k)
+                image_results = self.vector_store.search_images(query_embedding, top_k=top_k, filters=filters)
                 results.extend(image_results)
-        
+
         # Sort by similarity and take top_k
         results.sort(key=lambda x: x.get('similarity', 0), reverse=True)
-        return results[:top_k]
+        results = results[:top_k]
+
+        self.result_cache.put(cache_key, results)
+        return [dict(result) for result in results]
+
+    def retrieve_many(self, queries, top_k=5, mode="text", filters=None):
+        """
+        Retrieve for many text queries at once, e.g. for offline evaluation.
+
+        In 'text' mode, queries missing from the caches are embedded in one batched
+        TextEmbedder call and scored against the store together with blocked
+        matrix-matrix products. Other modes fall back to one retrieve call per query.
+
+        Returns:
+            One list of results per query, as retrieve returns them
+        """
+        if mode != "text":
+            return [self.retrieve(query, top_k=top_k, mode=mode, filters=filters) for query in queries]
+
+        queries = [self._normalize_query(query) for query in queries]
+        version = self.vector_store.version
+        if version != self._result_cache_version:
+            self.result_cache.clear()
+            self._result_cache_version = version
+
+        # search_text_many always scores exactly, unlike search_text with an ANN index or
+        # quantized codes, so its results are cached apart
+        cache_keys = [self._cache_key(query, mode, top_k, None, filters, True, version) for query in queries]
+        results = [self.result_cache.get(key) for key in cache_keys]
+
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            embeddings = self.embed_queries([queries[i] for i in missing])
+            searched = self.vector_store.search_text_many(embeddings, top_k=top_k, filters=filters)
+            for i, result in zip(missing, searched):
+                results[i] = result
+                self.result_cache.put(cache_keys[i], result)
+
+        return [[dict(result) for result in query_results] for query_results in results]
+
+    def _cache_key(self, query, mode, top_k, image_key, filters, exact, version):
+        """Result cache key; `exact` marks results scored by brute force against every row."""
+        filter_key = tuple(sorted((field, repr(value)) for field, value in (filters or {}).items()))
+        return (query, mode, top_k, image_key, filter_key, exact, version)
+
+    def embed_queries(self, queries):
+        """Embeddings of several query texts; cache misses are encoded in one batch."""
+        queries = [self._normalize_query(query) for query in queries]
+        keys = [(self.text_embedder.model_name, query) for query in queries]
+        embeddings = [self.query_cache.get(key) for key in keys]
+
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            # Encode each distinct text once even if it is repeated in the batch
+            texts = list(dict.fromkeys(queries[i] for i in missing))
+            with metrics.span("query_embedding"):
+                encoded = dict(zip(texts, self.text_embedder.generate_embeddings(texts)))
+            for i in missing:
+                embeddings[i] = encoded[queries[i]]
+                self.query_cache.put(keys[i], embeddings[i])
+
+        return embeddings
+
+    def embed_query(self, query):
+        """Embedding of a query text, from the LRU cache when the same query was seen before."""
+        query = self._normalize_query(query)
+        cache_key = (self.text_embedder.model_name, query)
+        embedding = self.query_cache.get(cache_key)
+        if embedding is None:
+            with metrics.span("query_embedding"):
+                embedding = self.text_embedder.generate_embeddings([query])[0]
+            self.query_cache.put(cache_key, embedding)
+        return embedding
+
+    def cache_stats(self):
+        """Hit/miss counters of the query embedding and retrieval result caches."""
+        return {
+            'query_embeddings': self.query_cache.stats(),
+            'results': self.result_cache.stats()
+        }
+
+    def _normalize_query(self, query):
+        """Collapse runs of whitespace so trivially different spellings share cache entries."""
+        return " ".join(query.split()) if query else query
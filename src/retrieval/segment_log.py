@@ -0,0 +1,188 @@
+import os
+import re
+import json
+import numpy as np
+
+from src.utils.atomic_write import atomic_write, fsync_dir
+
+
+class SegmentLog:
+    """
+    Append-only segment storage for one modality of the vector store.
+
+    Each append writes a new segment: a normalized float32 matrix (.npy) plus a JSON
+    metadata sidecar. A manifest lists the committed segments and is replaced
+    atomically, so a crash mid-append leaves only unreferenced files behind and the
+    previous state intact. Compaction rewrites segments into one and commits a new
+    manifest the same way.
+
+    Segments are numbered in the order they are written, and the manifest records the
+    next number. Files of unreferenced segment numbers below it are garbage; files from
+    there on may belong to another process's append that has not committed yet, so they
+    are left alone (an append after a crash overwrites them). A segment may also have
+    quantized codes of its rows in a third file, written the first time they are asked for.
+
+    Deleted rows are recorded in the manifest as tombstones (global row numbers) until a
+    full compaction rewrites the log without them. Full compactions are the only writes
+    that renumber rows, and the manifest counts them as its generation; indexes built
+    over the rows record it so that indexes of an older numbering can be told apart.
+    """
+
+    def __init__(self, storage_dir, prefix):
+        self.storage_dir = storage_dir
+        self.prefix = prefix
+        self.manifest_file = os.path.join(storage_dir, f"{prefix}_manifest.json")
+        self.segments = []
+        self.next_segment = 1
+        self.deleted = []
+        self.generation = 0
+
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file, 'r') as f:
+                manifest = json.load(f)
+            self.segments = manifest['segments']
+            self.next_segment = manifest['next_segment']
+            self.deleted = manifest.get('deleted', [])
+            self.generation = manifest.get('generation', 0)
+
+    def exists(self):
+        return os.path.exists(self.manifest_file)
+
+    @property
+    def rows(self):
+        return sum(segment['rows'] for segment in self.segments)
+
+    def load(self, concatenate=True):
+        """
+        Return (records, embeddings) for all committed segments, memory-mapping the matrices.
+
+        Args:
+            concatenate: Return the embeddings as one matrix; otherwise as the list of
+                per-segment memory maps (see matrices), so nothing is copied into memory
+        """
+        self._remove_orphans()
+
+        records = []
+        for segment in self.segments:
+            if segment['rows'] == 0:
+                continue
+            with open(self._path(segment['metadata']), 'r') as f:
+                records.extend(json.load(f)['records'])
+
+        matrices = self.matrices()
+        if not concatenate:
+            return records, matrices
+        if not matrices:
+            return records, None
+        if len(matrices) == 1:
+            # A single (compacted) segment is used straight from the page cache
+            return records, matrices[0]
+        return records, np.concatenate(matrices)
+
+    def matrices(self):
+        """Memory maps of the committed segments' matrices, in row order."""
+        return [np.load(self._path(segment['matrix']), mmap_mode='r')
+                for segment in self.segments if segment['rows']]
+
+    def codes(self, quantizer):
+        """
+        Memory maps of the committed segments' codes, in row order.
+
+        Codes are encoded from the segment's matrix and saved next to it the first time
+        they are asked for, so later loads only map them.
+        """
+        codes = []
+        for segment in self.segments:
+            if segment['rows'] == 0:
+                continue
+            path = self._path(f"{os.path.splitext(segment['matrix'])[0]}.{quantizer.name}.npy")
+            if not os.path.exists(path):
+                matrix = np.load(self._path(segment['matrix']), mmap_mode='r')
+                encoded = quantizer.encode(matrix)
+                atomic_write(path, lambda f: np.save(f, encoded), mode='wb')
+            codes.append(np.load(path, mmap_mode='r'))
+        return codes
+
+    def append(self, records, embeddings):
+        """Write normalized rows and their metadata as a new segment and commit it."""
+        if not records:
+            return
+        self.segments.append(self._write_segment(records, embeddings))
+        self._commit()
+
+    def delete(self, rows):
+        """Tombstone rows by their global row number and commit."""
+        self.deleted = sorted(set(self.deleted).union(int(row) for row in rows))
+        self._commit()
+
+    def compact(self, records, embeddings, start_segment=0):
+        """
+        Replace segments[start_segment:] with a single segment.
+
+        A full compaction (start_segment=0) is given only the live rows and clears the
+        tombstones; a partial one keeps row numbers, and therefore tombstones, unchanged.
+
+        Args:
+            records: Metadata for every row covered by the segments being replaced
+            embeddings: Normalized rows for the same range
+            start_segment: Index of the first segment to merge; earlier segments are kept
+        """
+        kept = self.segments[:start_segment]
+        superseded = self.segments[start_segment:]
+        merged = [self._write_segment(records, embeddings)] if records else []
+        self.segments = kept + merged
+        if start_segment == 0:
+            self.deleted = []
+            self.generation += 1
+        self._commit()
+
+        # Matrix, metadata and any codes of the superseded segments
+        stems = {os.path.splitext(segment['matrix'])[0] + "." for segment in superseded}
+        for filename in os.listdir(self.storage_dir):
+            if filename[:filename.find(".") + 1] in stems:
+                try:
+                    os.remove(self._path(filename))
+                except OSError:
+                    pass
+
+    def _write_segment(self, records, embeddings):
+        name = f"{self.prefix}_seg_{self.next_segment:06d}"
+        self.next_segment += 1
+        segment = {'matrix': f"{name}.npy", 'metadata': f"{name}.json", 'rows': len(records)}
+
+        atomic_write(
+            self._path(segment['matrix']),
+            lambda f: np.save(f, np.ascontiguousarray(embeddings, dtype=np.float32)),
+            mode='wb'
+        )
+        atomic_write(
+            self._path(segment['metadata']),
+            lambda f: json.dump({'normalized': True, 'records': records}, f, separators=(',', ':'))
+        )
+        return segment
+
+    def _commit(self):
+        manifest = {'segments': self.segments, 'next_segment': self.next_segment, 'deleted': self.deleted,
+                    'generation': self.generation}
+        atomic_write(self.manifest_file, lambda f: json.dump(manifest, f))
+        fsync_dir(self.storage_dir)
+
+    def _remove_orphans(self):
+        """Delete the files of unreferenced segments numbered below the next segment."""
+        pattern = re.compile(rf"{re.escape(self.prefix)}_seg_(\d+)\.")
+        referenced = {int(pattern.match(segment['matrix']).group(1)) for segment in self.segments}
+
+        for filename in os.listdir(self.storage_dir):
+            match = pattern.match(filename)
+            if match is None:
+                continue
+            number = int(match.group(1))
+            if number in referenced or number >= self.next_segment:
+                continue
+            try:
+                os.remove(self._path(filename))
+            except OSError:
+                pass
+
+    def _path(self, filename):
+        return os.path.join(self.storage_dir, filename)
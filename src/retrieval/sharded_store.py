@@ -0,0 +1,466 @@
+"""
+Vector store partitioned by document across worker processes.
+
+Each shard is a SimpleVectorStore owned by its own process: either a local worker started
+by ShardedVectorStore, or a shard server reached over a socket:
+
+    python -m src.retrieval.sharded_store --storage-dir /data/shard_0 --port 6001
+
+Shard servers exchange pickled messages, so they authenticate the coordinator with an
+authkey (SHARD_AUTHKEY) and should only listen on trusted networks.
+"""
+import os
+import sys
+import argparse
+import threading
+import multiprocessing
+from multiprocessing.connection import Client, Listener
+
+from src.retrieval.lexical_index import reciprocal_rank_fusion
+from src.retrieval.vector_store import SimpleVectorStore
+from src.utils.metrics import metrics
+
+
+# SimpleVectorStore members a coordinator may call on a shard
+SHARD_METHODS = frozenset([
+    'add_text_vectors', 'add_image_vectors', 'delete_document', 'export_document', 'document_counts',
+    'search_text', 'search_images', 'search_text_many', 'search_images_many', 'hybrid_search_text',
+    'build_ann_indexes', 'compact', 'text_vectors', 'image_vectors', 'drain_metrics'
+])
+
+
+def _handle_requests(connection, store):
+    """
+    Answer (method, args, kwargs) requests until the connection closes or None arrives.
+
+    Replies are ('ok', result, store version) or ('error', message, store version).
+    """
+    while True:
+        try:
+            request = connection.recv()
+        except (EOFError, OSError):
+            return
+        if request is None:
+            return
+
+        method, args, kwargs = request
+        try:
+            if method not in SHARD_METHODS:
+                raise ValueError(f"Unknown shard method: {method}")
+            if method == 'drain_metrics':
+                result = metrics.drain()
+            else:
+                member = getattr(store, method)
+                result = member(*args, **kwargs) if callable(member) else member
+            reply = ('ok', result, store.version)
+        except Exception as e:
+            reply = ('error', f"{type(e).__name__}: {e}", store.version)
+        connection.send(reply)
+
+
+def _local_shard_main(connection, storage_dir, store_kwargs):
+    """Entry point of a local shard process."""
+    store = SimpleVectorStore(storage_dir, **store_kwargs)
+    try:
+        _handle_requests(connection, store)
+    finally:
+        connection.close()
+
+
+def serve_shard(storage_dir, address, authkey, store_kwargs=None):
+    """
+    Serve a SimpleVectorStore to coordinators connecting over a socket, one at a time.
+
+    Args:
+        storage_dir: Directory of this shard's store
+        address: (host, port) to listen on, or a Unix socket path
+        authkey: Shared secret coordinators must present (bytes)
+        store_kwargs: Keyword arguments for SimpleVectorStore
+    """
+    store = SimpleVectorStore(storage_dir, **(store_kwargs or {}))
+    with Listener(address, authkey=authkey) as listener:
+        print(f"Shard {storage_dir} listening on {listener.address}")
+        while True:
+            try:
+                connection = listener.accept()
+            except Exception as e:
+                print(f"Rejected shard connection: {e}")
+                continue
+            with connection:
+                _handle_requests(connection, store)
+
+
+class ShardedVectorStore:
+    """
+    Vectors partitioned by document_id over several SimpleVectorStore shards.
+
+    All vectors of a document live on one shard, so deletes and document filters touch a
+    single shard. A new document goes to the shard holding the fewest vectors; when the
+    largest and smallest shards drift more than `imbalance_tolerance` of the mean load
+    apart (e.g. after shards are added or documents deleted), whole documents are moved
+    from the fullest shard to the emptiest.
+
+    Searches are sent to every shard at once and run in parallel, one process per shard;
+    each returns its own top k and the coordinator merges them by similarity. For exact
+    (flat) search the merged result equals the top k of a single store holding every
+    vector. In hybrid_search_text the BM25 statistics are per shard, so lexical scores
+    from different shards are only approximately comparable.
+
+    The store has the search and update interface of SimpleVectorStore and can be handed
+    to MultimodalRetriever in its place. Calls are serialized by a lock; use
+    search_text_many to keep every shard busy with many queries at once.
+    """
+
+    def __init__(self, storage_dir, num_shards=None, shard_addresses=None, authkey=None,
+                 imbalance_tolerance=0.2, **store_kwargs):
+        """
+        Args:
+            storage_dir: Directory holding the local shards' directories (shard_000, ...)
+            num_shards: Number of local shard processes (defaults to the CPU count, and is
+                never fewer than the shards already on disk)
+            shard_addresses: Instead of local processes, connect to shard servers at these
+                (host, port) tuples or Unix socket paths
+            authkey: Shared secret of the shard servers (defaults to SHARD_AUTHKEY)
+            imbalance_tolerance: Allowed gap between the largest and smallest shard, as a
+                fraction of the mean shard size, before documents are moved
+            **store_kwargs: Passed to each local shard's SimpleVectorStore
+        """
+        self.storage_dir = storage_dir
+        self.imbalance_tolerance = imbalance_tolerance
+        self._processes = []
+        self._connections = []
+        self._lock = threading.RLock()
+
+        if shard_addresses:
+            authkey = authkey or os.environ.get("SHARD_AUTHKEY", "").encode() or None
+            for address in shard_addresses:
+                self._connections.append(Client(address, authkey=authkey))
+        else:
+            os.makedirs(storage_dir, exist_ok=True)
+            existing = len([name for name in os.listdir(storage_dir) if name.startswith("shard_")])
+            num_shards = max(num_shards or os.cpu_count() or 1, existing)
+
+            # Spawned rather than forked: the parent may be running threads (UI, ingestion)
+            context = multiprocessing.get_context("spawn")
+            for shard in range(num_shards):
+                parent_end, child_end = context.Pipe()
+                process = context.Process(
+                    target=_local_shard_main,
+                    args=(child_end, os.path.join(storage_dir, f"shard_{shard:03d}"), store_kwargs),
+                    daemon=True
+                )
+                process.start()
+                child_end.close()
+                self._processes.append(process)
+                self._connections.append(parent_end)
+
+        self._versions = [0] * len(self._connections)
+
+        # document_id -> [shard, live vector count], rebuilt from the shards themselves
+        self._documents = {}
+        for shard, counts in enumerate(self._scatter('document_counts')):
+            for document_id, count in counts.items():
+                self._place_existing(document_id, shard, count)
+        self.rebalance()
+
+    @property
+    def num_shards(self):
+        return len(self._connections)
+
+    @property
+    def version(self):
+        """Sum of the shard versions; changes whenever any shard's vectors change."""
+        return sum(self._versions)
+
+    @property
+    def text_vectors(self):
+        """Metadata of the live text chunks of every shard (transfers them all)."""
+        return [record for records in self._scatter('text_vectors') for record in records]
+
+    @property
+    def image_vectors(self):
+        """Metadata of the live images of every shard (transfers them all)."""
+        return [record for records in self._scatter('image_vectors') for record in records]
+
+    def shard_loads(self):
+        """Number of live vectors per shard."""
+        loads = [0] * self.num_shards
+        for shard, count in self._documents.values():
+            loads[shard] += count
+        return loads
+
+    def add_text_vectors(self, vectors):
+        self._add('add_text_vectors', vectors)
+
+    def add_image_vectors(self, vectors):
+        self._add('add_image_vectors', vectors)
+
+    def _add(self, method, vectors):
+        if not vectors:
+            return
+        with self._lock:
+            loads = self.shard_loads()
+            by_shard = {}
+            for vector in vectors:
+                document_id = vector.get('document_id')
+                placement = self._documents.get(document_id)
+                if placement is None:
+                    # New document: the least loaded shard, counting what this call adds
+                    shard = min(range(self.num_shards), key=lambda i: (loads[i], i))
+                    placement = self._documents[document_id] = [shard, 0]
+                placement[1] += 1
+                loads[placement[0]] += 1
+                by_shard.setdefault(placement[0], []).append(vector)
+
+            shards = sorted(by_shard)
+            self._scatter(method, shards=shards, per_shard_args=[(by_shard[shard],) for shard in shards])
+            metrics.inc("sharded_vectors_added_total", len(vectors))
+            if self._imbalanced():
+                # Documents still being added stay put, or a growing one would bounce around
+                self._rebalance(exclude={vector.get('document_id') for vector in vectors})
+
+    def delete_document(self, document_id):
+        """Remove every vector of a document from its shard; returns the number removed."""
+        with self._lock:
+            placement = self._documents.pop(document_id, None)
+            if placement is None:
+                return 0
+            removed, = self._scatter('delete_document', document_id, shards=[placement[0]])
+            if self._imbalanced():
+                self.rebalance()
+            return removed
+
+    def replace_document(self, document_id, text_vectors, image_vectors):
+        """Delete a document's vectors and add new ones in their place."""
+        with self._lock:
+            self.delete_document(document_id)
+            self.add_text_vectors(text_vectors)
+            self.add_image_vectors(image_vectors)
+
+    def rebalance(self):
+        """
+        Move whole documents from the fullest shard to the emptiest until their gap is
+        within imbalance_tolerance of the mean shard size.
+
+        Each move takes the largest document that still narrows the gap. A document is
+        added to its new shard before it is deleted from the old one, so an interrupted
+        move leaves a duplicate (removed when the store is next opened), never a loss.
+
+        Returns:
+            Number of documents moved
+        """
+        return self._rebalance()
+
+    def _rebalance(self, exclude=()):
+        moved = 0
+        with self._lock:
+            while self._imbalanced():
+                loads = self.shard_loads()
+                heavy = max(range(self.num_shards), key=lambda i: (loads[i], -i))
+                light = min(range(self.num_shards), key=lambda i: (loads[i], i))
+                gap = loads[heavy] - loads[light]
+                candidates = [(count, str(document_id), document_id)
+                              for document_id, (shard, count) in self._documents.items()
+                              if shard == heavy and 0 < count < gap and document_id not in exclude]
+                if not candidates:
+                    break
+                _, _, document_id = max(candidates)
+                self._move(document_id, heavy, light)
+                moved += 1
+
+        if moved:
+            print(f"Rebalanced shards: moved {moved} documents, loads now {self.shard_loads()}")
+        return moved
+
+    def _imbalanced(self):
+        loads = self.shard_loads()
+        if self.num_shards < 2 or not any(loads):
+            return False
+        mean = sum(loads) / len(loads)
+        return max(loads) - min(loads) > max(1.0, self.imbalance_tolerance * mean)
+
+    def _move(self, document_id, source, target):
+        with metrics.span("shard_rebalance_move"):
+            exported, = self._scatter('export_document', document_id, shards=[source])
+            if exported['text']:
+                self._scatter('add_text_vectors', exported['text'], shards=[target])
+            if exported['image']:
+                self._scatter('add_image_vectors', exported['image'], shards=[target])
+            self._scatter('delete_document', document_id, shards=[source])
+        self._documents[document_id][0] = target
+
+    def _place_existing(self, document_id, shard, count):
+        """Record a document found on a shard, dropping a copy left by an interrupted move."""
+        placement = self._documents.get(document_id)
+        if placement is None:
+            self._documents[document_id] = [shard, count]
+            return
+
+        # Keep the larger copy: a partial one is the target of a move that did not finish
+        keep, drop = (placement[0], shard) if placement[1] >= count else (shard, placement[0])
+        print(f"Document {document_id} found on shards {keep} and {drop}; removing it from shard {drop}")
+        self._scatter('delete_document', document_id, shards=[drop])
+        self._documents[document_id] = [keep, max(placement[1], count)]
+
+    def build_ann_indexes(self):
+        self._scatter('build_ann_indexes')
+
+    def compact(self):
+        self._scatter('compact')
+
+    def collect_metrics(self):
+        """Merge the metrics recorded inside the shard processes into this process's registry."""
+        for snapshot in self._scatter('drain_metrics'):
+            metrics.merge(snapshot)
+
+    def search_text(self, query_vector, top_k=5, exact=False, nprobe=None, filters=None):
+        """Search text vectors on every relevant shard and merge the per-shard top k."""
+        return self._search('search_text', query_vector, top_k, exact, nprobe, filters)
+
+    def search_images(self, query_vector, top_k=5, exact=False, nprobe=None, filters=None):
+        """Search image vectors on every relevant shard and merge the per-shard top k."""
+        return self._search('search_images', query_vector, top_k, exact, nprobe, filters)
+
+    def _search(self, method, query_vector, top_k, exact, nprobe, filters):
+        with metrics.span("sharded_search"):
+            results = self._scatter(method, query_vector, top_k=top_k, exact=exact, nprobe=nprobe,
+                                    filters=filters, shards=self._shards_for(filters))
+        return self._merge(results, top_k)
+
+    def search_text_many(self, query_vectors, top_k=5, filters=None):
+        """Exact top k for many queries; every shard scores the whole batch in parallel."""
+        return self._search_many('search_text_many', query_vectors, top_k, filters)
+
+    def search_images_many(self, query_vectors, top_k=5, filters=None):
+        return self._search_many('search_images_many', query_vectors, top_k, filters)
+
+    def _search_many(self, method, query_vectors, top_k, filters):
+        if len(query_vectors) == 0:
+            return []
+        with metrics.span("sharded_search_many"):
+            per_shard = self._scatter(method, query_vectors, top_k=top_k, filters=filters,
+                                      shards=self._shards_for(filters))
+        return [self._merge(results, top_k) for results in zip(*per_shard)] if per_shard else \
+            [[] for _ in query_vectors]
+
+    def hybrid_search_text(self, query_text, query_vector, top_k=5, candidates=100, rrf_k=60, filters=None):
+        """
+        Fuse BM25 and dense rankings over the candidates of all shards.
+
+        Each shard returns up to `candidates` rows with their BM25 score and cosine
+        similarity; the coordinator ranks the union by each score and fuses the two
+        rankings with reciprocal rank fusion, as SimpleVectorStore does within one store.
+        When fewer than top_k rows share a term with the query, the rest are the best
+        dense hits of the shards.
+        """
+        with metrics.span("sharded_search", mode="lexical_hybrid"):
+            per_shard = self._scatter('hybrid_search_text', query_text, query_vector, top_k=max(candidates, top_k),
+                                      candidates=candidates, rrf_k=rrf_k, filters=filters,
+                                      shards=self._shards_for(filters))
+
+        pool = [result for results in per_shard for result in results]
+        matched = [result for result in pool if 'bm25_score' in result]
+        if not matched:
+            return self._merge(per_shard, top_k)
+
+        # Stable sorts keep shard order between equal scores, as _merge does
+        lexical = sorted(range(len(matched)), key=lambda i: -matched[i]['bm25_score'])[:candidates]
+        dense = sorted(lexical, key=lambda i: -matched[i]['similarity'])
+        rows, rrf_scores = reciprocal_rank_fusion([lexical, dense], k=rrf_k)
+
+        results = []
+        for row, rrf_score in zip(rows[:top_k].tolist(), rrf_scores[:top_k].tolist()):
+            results.append(dict(matched[row], rrf_score=float(rrf_score)))
+
+        if len(results) < top_k:
+            # Too few rows share a term with the query: fill up with the shards' dense hits
+            dense_only = [[result for result in results_of_shard if 'bm25_score' not in result]
+                          for results_of_shard in per_shard]
+            results.extend(self._merge(dense_only, top_k - len(results)))
+        return results
+
+    def _shards_for(self, filters):
+        """Shards that can hold matches: only the owners of the filtered documents, if any."""
+        document_ids = (filters or {}).get('document_id')
+        if document_ids is None:
+            return None
+        if not isinstance(document_ids, (list, tuple, set)):
+            document_ids = [document_ids]
+        return sorted({self._documents[document_id][0] for document_id in document_ids
+                       if document_id in self._documents})
+
+    def _merge(self, results_per_shard, top_k):
+        """Exact top k of per-shard result lists (each best first) by similarity."""
+        ranked = [(-result['similarity'], shard, rank, result)
+                  for shard, results in enumerate(results_per_shard)
+                  for rank, result in enumerate(results)]
+        ranked.sort(key=lambda entry: entry[:3])
+        return [result for _, _, _, result in ranked[:top_k]]
+
+    def _scatter(self, method, *args, shards=None, per_shard_args=None, **kwargs):
+        """
+        Call a method on several shards at once and return their results in shard order.
+
+        Requests go out to every shard before any reply is read, so the shards work in
+        parallel. Raises RuntimeError if a shard reports an error.
+
+        Args:
+            shards: Shard numbers to call (default: all)
+            per_shard_args: Positional arguments per shard, instead of the shared args
+        """
+        with self._lock:
+            shards = list(range(self.num_shards)) if shards is None else shards
+            for i, shard in enumerate(shards):
+                shard_args = per_shard_args[i] if per_shard_args is not None else args
+                self._connections[shard].send((method, shard_args, kwargs))
+
+            results, errors = [], []
+            for shard in shards:
+                status, result, version = self._connections[shard].recv()
+                self._versions[shard] = version
+                if status == 'ok':
+                    results.append(result)
+                else:
+                    results.append(None)
+                    errors.append(f"shard {shard}: {result}")
+            if errors:
+                raise RuntimeError(f"{method} failed on {'; '.join(errors)}")
+            return results
+
+    def close(self):
+        """Stop the local shard processes and close every connection."""
+        with self._lock:
+            for connection in self._connections:
+                try:
+                    connection.send(None)
+                    connection.close()
+                except OSError:
+                    pass
+            for process in self._processes:
+                process.join(timeout=10)
+            self._connections, self._processes = [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve one vector store shard over a socket.")
+    parser.add_argument('--storage-dir', required=True)
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=6001)
+    parser.add_argument('--index-type', default="flat")
+    args = parser.parse_args()
+
+    authkey = os.environ.get("SHARD_AUTHKEY")
+    if not authkey:
+        print("Set SHARD_AUTHKEY to the secret shared with the coordinator.")
+        sys.exit(1)
+    serve_shard(args.storage_dir, (args.host, args.port), authkey.encode(), {'index_type': args.index_type})
+
+
+if __name__ == "__main__":
+    main()
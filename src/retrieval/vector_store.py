@@ -1,92 +1,704 @@
 import os
 import json
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+
+from src.retrieval.ann_index import create_ann_index
+from src.retrieval.embedding_matrix import (
+    EmbeddingMatrix, MappedEmbeddingMatrix, blocked_top_k, normalize_rows, top_k_indices
+)
+from src.retrieval.lexical_index import BM25Index, reciprocal_rank_fusion
+from src.retrieval.metadata_index import MetadataIndex
+from src.retrieval.quantization import QuantizedMatrix, create_quantizer
+from src.retrieval.segment_log import SegmentLog
+from src.utils.atomic_write import atomic_write
+from src.utils.metrics import metrics
+
+
+class VectorCollection:
+    """The rows of one modality: chunk metadata, resident embeddings and their indexes."""
+
+    def __init__(self, name, storage_dir, index_type, log=None):
+        self.name = name
+        self.index_file = os.path.join(storage_dir, f"{name}_index.json")
+        self.ann_file = os.path.join(storage_dir, f"{name}_{index_type}.npz")
+        self.lexical_file = os.path.join(storage_dir, f"{name}_bm25.npz")
+        self.log = log
+
+        # Chunk metadata (everything except the embedding), row-aligned with the
+        # resident normalized embedding matrix
+        self.records = []
+        self.embeddings = EmbeddingMatrix()
+        self.ann = None
+
+        # Quantized copy of the embeddings searched first when quantization is enabled
+        self.codes = None
+
+        # BM25 index over the rows' 'content' (text modality only)
+        self.lexical = None
+
+        # Posting lists of document_id, chunk_type and page_num for filtered searches
+        self.metadata = MetadataIndex()
+
+        # Rows of deleted documents, skipped by search until the next full compaction
+        self.deleted = set()
+
+    def __len__(self):
+        return len(self.records) - len(self.deleted)
+
+    def live_records(self):
+        if not self.deleted:
+            return self.records
+        return [record for i, record in enumerate(self.records) if i not in self.deleted]
+
 
 class SimpleVectorStore:
-    def __init__(self, storage_dir):
+    def __init__(self, storage_dir, storage_format="binary", max_segments=32, merge_factor=4, index_type="flat",
+                 ann_params=None, max_deleted_fraction=0.25, quantization=None, rescore_factor=None,
+                 lexical_index=True):
+        """
+        Args:
+            storage_dir: Directory holding the index files
+            storage_format: 'binary' stores embeddings as append-only float32 matrix segments
+                (.npy, memory-mapped on load) with chunk metadata in JSON sidecars; 'json'
+                keeps the legacy text_index.json / image_index.json files
+            max_segments: Number of segments per modality above which the newest ones are
+                merged together, whatever their size
+            merge_factor: Number of adjacent segments of similar size (the same power of
+                merge_factor rows) that are merged into one
+            index_type: 'flat' for exact brute-force search, or an approximate index from
+                ann_index.ANN_INDEXES (e.g. 'ivf')
+            ann_params: Parameters for the approximate index (e.g. {'nprobe': 16}), plus
+                'min_train_size', the number of rows below which search stays exact
+            max_deleted_fraction: Fraction of deleted rows in a modality above which it is
+                compacted to reclaim them
+            quantization: None, or a key of quantization.QUANTIZERS ('binary'); searches
+                without an approximate index then score compact codes of every row and
+                rescore only a shortlist of top_k * rescore_factor rows at full precision.
+                In 'binary' storage the codes are saved next to each segment and both
+                they and the float32 rows stay memory-mapped rather than copied into memory
+            rescore_factor: Shortlist size as a multiple of top_k (defaults to the
+                quantizer's own setting)
+            lexical_index: Maintain a BM25 inverted index over text chunk content for
+                hybrid_search_text
+        """
+        if storage_format not in ("binary", "json"):
+            raise ValueError(f"Unknown storage format: {storage_format}")
+
         self.storage_dir = storage_dir
-        self.text_index_file = os.path.join(storage_dir, "text_index.json")
-        self.image_index_file = os.path.join(storage_dir, "image_index.json")
-        self.text_vectors = []
-        self.image_vectors = []
-        
+        self.storage_format = storage_format
+        self.max_segments = max_segments
+        self.merge_factor = merge_factor
+        self.index_type = index_type
+        self.ann_params = dict(ann_params or {})
+        self.ann_min_rows = self.ann_params.pop('min_train_size', 10000)
+        self.max_deleted_fraction = max_deleted_fraction
+        self.quantization = quantization
+        if quantization is not None:
+            create_quantizer(quantization)
+        self.rescore_factor = rescore_factor
+        self.lexical_index = lexical_index
+
         # Create storage directory if it doesn't exist
         os.makedirs(storage_dir, exist_ok=True)
-        
+
+        # Incremented whenever vectors are added or removed, so callers can tell whether
+        # results they cached (in memory or on disk) are still current
+        self.version_file = os.path.join(storage_dir, "version.json")
+        self.version = 0
+        if os.path.exists(self.version_file):
+            with open(self.version_file, 'r') as f:
+                self.version = json.load(f)['version']
+
+        binary = storage_format == "binary"
+        self.text = VectorCollection(
+            "text", storage_dir, index_type, SegmentLog(storage_dir, "text") if binary else None
+        )
+        self.image = VectorCollection(
+            "image", storage_dir, index_type, SegmentLog(storage_dir, "image") if binary else None
+        )
+
         # Load existing indices if they exist
         self._load_indices()
-    
+
+    @property
+    def text_vectors(self):
+        """Metadata of the live text chunks."""
+        return self.text.live_records()
+
+    @property
+    def image_vectors(self):
+        """Metadata of the live images."""
+        return self.image.live_records()
+
+    def _collections(self):
+        return [self.text, self.image]
+
     def _load_indices(self):
         """Load existing vector indices if available."""
-        if os.path.exists(self.text_index_file):
-            with open(self.text_index_file, 'r') as f:
-                self.text_vectors = json.load(f)
-        
-        if os.path.exists(self.image_index_file):
-            with open(self.image_index_file, 'r') as f:
-                self.image_vectors = json.load(f)
-    
+        for collection in self._collections():
+            self._load_collection(collection)
+            collection.ann = self._load_ann(collection)
+            self._update_codes(collection)
+            collection.metadata.add(collection.records)
+        self.text.lexical = self._load_lexical(self.text)
+
+    def _load_collection(self, collection):
+        """Load one modality from its segment log or, in 'json' mode, its legacy index file."""
+        log = collection.log
+        if log is not None:
+            if not log.exists():
+                self._migrate_to_segments(collection)
+            mapped = self.quantization is not None
+            records, embeddings = log.load(concatenate=not mapped)
+            collection.records = records
+            collection.embeddings = MappedEmbeddingMatrix(embeddings) if mapped else EmbeddingMatrix(embeddings)
+            collection.deleted = set(log.deleted)
+            return
+
+        if not os.path.exists(collection.index_file):
+            return
+
+        with open(collection.index_file, 'r') as f:
+            items = json.load(f)
+        records, embeddings = self._split_records(items)
+        collection.records = records
+        collection.embeddings = EmbeddingMatrix(embeddings)
+
+    def _migrate_to_segments(self, collection):
+        """Seed a new segment log from a legacy JSON index."""
+        if not os.path.exists(collection.index_file):
+            return
+
+        with open(collection.index_file, 'r') as f:
+            items = json.load(f)
+        print(f"Converting {os.path.basename(collection.index_file)} to binary format ({len(items)} vectors)")
+        records, embeddings = self._split_records(items)
+        collection.log.append(records, embeddings)
+
+    def _load_ann(self, collection):
+        """Load a persisted approximate index and catch it up with rows added since it was saved."""
+        if self.index_type == "flat":
+            return None
+
+        if not os.path.exists(collection.ann_file):
+            return self._update_ann(collection, save=True)
+
+        ann = create_ann_index(self.index_type, **self.ann_params)
+        if not self._load_saved(ann, collection.ann_file, collection, len(collection.embeddings)):
+            return self._build_ann(collection)
+
+        ann.add(collection.embeddings.array[ann.ntotal:])
+        return ann
+
+    def _load_saved(self, index, path, collection, rows):
+        """
+        Load a saved ANN or BM25 index and tell whether it can be caught up with `rows` rows.
+
+        An index saved for another numbering of the rows (by a full compaction that did
+        not commit, or before one that did) or covering more rows than exist (saved
+        before a crash undid the append) is rebuilt rather than trusted.
+        """
+        generation = index.load(path)
+        return generation == self._generation(collection) and index.ntotal <= rows
+
+    def _generation(self, collection):
+        """Numbering of the collection's rows, recorded with its saved indexes."""
+        return collection.log.generation if collection.log is not None else 0
+
+    def _build_ann(self, collection):
+        """Train a new approximate index on all rows, fill it and save it."""
+        ann = create_ann_index(self.index_type, **self.ann_params)
+        ann.train(collection.embeddings.array)
+        ann.add(collection.embeddings.array)
+        ann.save(collection.ann_file, self._generation(collection))
+        return ann
+
+    def _update_ann(self, collection, save):
+        """
+        Add new rows to an approximate index, building it once the modality is large enough.
+
+        The index is only written when `save` is set (at compaction); rows added after the
+        last save are re-assigned on load.
+        """
+        if self.index_type == "flat":
+            return None
+
+        ann = collection.ann
+        if ann is None:
+            if len(collection.embeddings) < self.ann_min_rows:
+                return None
+            return self._build_ann(collection)
+
+        ann.add(collection.embeddings.array[ann.ntotal:])
+        if save:
+            ann.save(collection.ann_file, self._generation(collection))
+        return ann
+
+    def _load_lexical(self, collection):
+        """Load the persisted BM25 index and catch it up with rows added since it was saved."""
+        if not self.lexical_index:
+            return None
+
+        lexical = BM25Index()
+        if os.path.exists(collection.lexical_file):
+            if not self._load_saved(lexical, collection.lexical_file, collection, len(collection.records)):
+                lexical.reset()
+
+        saved = lexical.ntotal
+        lexical.add(record.get('content', '') for record in collection.records[saved:])
+        if lexical.ntotal != saved or not os.path.exists(collection.lexical_file):
+            lexical.save(collection.lexical_file, self._generation(collection))
+        return lexical
+
+    def _update_lexical(self, collection, save):
+        """Index rows added since the last update; written to disk only when `save` is set."""
+        lexical = collection.lexical
+        if lexical is None:
+            return
+
+        lexical.add(record.get('content', '') for record in collection.records[lexical.ntotal:])
+        if save:
+            lexical.save(collection.lexical_file, self._generation(collection))
+
+    def _update_codes(self, collection):
+        """Map the codes of every segment (encoding new ones), or encode all rows without segments."""
+        if self.quantization is None:
+            return
+
+        quantizer = create_quantizer(self.quantization)
+        if collection.log is not None:
+            blocks = collection.log.codes(quantizer)
+        elif len(collection.embeddings):
+            blocks = [quantizer.encode(collection.embeddings.array)]
+        else:
+            blocks = []
+        collection.codes = QuantizedMatrix(quantizer, blocks)
+
+    def _map_embeddings(self, collection):
+        """With quantization, read persisted float32 rows from their segment files again."""
+        if self.quantization is not None and collection.log is not None:
+            collection.embeddings = MappedEmbeddingMatrix(collection.log.matrices())
+
+    def build_ann_indexes(self):
+        """Retrain the approximate indices from scratch, e.g. after the corpus has drifted."""
+        if self.index_type == "flat":
+            return
+
+        for collection in self._collections():
+            if len(collection.embeddings):
+                collection.ann = self._build_ann(collection)
+
     def _save_indices(self):
-        """Save vector indices to disk."""
-        with open(self.text_index_file, 'w') as f:
-            json.dump(self.text_vectors, f)
-        
-        with open(self.image_index_file, 'w') as f:
-            json.dump(self.image_vectors, f)
-    
+        """Save legacy JSON vector indices to disk."""
+        for collection in self._collections():
+            with open(collection.index_file, 'w') as f:
+                json.dump(self._merge_records(collection.records, collection.embeddings), f)
+
+    def _split_records(self, items):
+        """Separate chunk metadata from normalized float32 embeddings."""
+        records = [{k: v for k, v in item.items() if k != 'embedding'} for item in items]
+        if not items:
+            return records, np.zeros((0, 0), dtype=np.float32)
+
+        return records, normalize_rows([item['embedding'] for item in items])
+
+    def _merge_records(self, records, embeddings):
+        """Recombine metadata and embeddings into the legacy JSON layout."""
+        return [dict(record, embedding=embeddings.array[i].tolist()) for i, record in enumerate(records)]
+
+    def _append(self, collection, vectors):
+        """Extend the metadata list and grow the resident matrix in place."""
+        if not vectors:
+            return
+
+        collection.records.extend({k: v for k, v in item.items() if k != 'embedding'} for item in vectors)
+        collection.embeddings.append([item['embedding'] for item in vectors])
+
+    def _persist(self, collection, start):
+        """
+        Write rows from `start` onwards as a new segment (or rewrite the JSON indices).
+
+        Returns True if the whole modality was rewritten.
+        """
+        if collection.log is None:
+            self._save_indices()
+            return True
+
+        collection.log.append(collection.records[start:], collection.embeddings.array[start:])
+        return self._maybe_compact(collection)
+
+    def _maybe_compact(self, collection):
+        """
+        Merge segments so that each row is rewritten O(log n) times as the store grows.
+
+        Segments after the base are tiered by size, tier t holding merge_factor**t up to
+        merge_factor**(t + 1) rows. Whenever the newest merge_factor segments share a
+        tier they are merged into one of a higher tier, which may cascade; since only the
+        newest segments are merged, sizes never increase along the log. The newer
+        segments are folded into the base once they hold as many rows as it does, and
+        the newest are merged regardless of size if there are more than max_segments.
+        """
+        log = collection.log
+        if len(log.segments) < 2:
+            return False
+
+        base_rows = log.segments[0]['rows']
+        if len(collection.records) - base_rows >= base_rows:
+            self._rewrite(collection)
+            return True
+
+        while len(log.segments) > self.merge_factor:
+            tail = log.segments[-self.merge_factor:]
+            if len({self._tier(segment['rows']) for segment in tail}) > 1:
+                break
+            self._merge_tail(collection, len(log.segments) - self.merge_factor)
+
+        if len(log.segments) > self.max_segments:
+            self._merge_tail(collection, self.max_segments - 1)
+        return False
+
+    def _tier(self, rows):
+        tier = 0
+        while rows >= self.merge_factor:
+            rows //= self.merge_factor
+            tier += 1
+        return tier
+
+    def _merge_tail(self, collection, start_segment):
+        """Merge segments[start_segment:] into one segment, keeping row numbers."""
+        start = sum(segment['rows'] for segment in collection.log.segments[:start_segment])
+        collection.log.compact(
+            collection.records[start:], collection.embeddings.array[start:], start_segment=start_segment
+        )
+
+    def _rewrite(self, collection):
+        """Drop deleted rows and persist the modality as a single segment (or JSON file)."""
+        if collection.deleted:
+            live = np.array([i for i in range(len(collection.records)) if i not in collection.deleted],
+                            dtype=np.int64)
+            collection.records = [collection.records[i] for i in live]
+            collection.embeddings = EmbeddingMatrix(np.ascontiguousarray(collection.embeddings.array[live]))
+            collection.deleted = set()
+
+            # Row ids changed: re-assign every row to the existing clusters
+            if collection.ann is not None:
+                collection.ann.reset()
+                collection.ann.add(collection.embeddings.array)
+            if collection.lexical is not None:
+                collection.lexical.reset()
+                self._update_lexical(collection, save=False)
+            collection.metadata.reset()
+            collection.metadata.add(collection.records)
+
+        # The indexes are written first, for the numbering the compaction is about to
+        # commit; if it never commits they don't match the manifest and are rebuilt on load
+        generation = collection.log.generation + 1 if collection.log is not None else 0
+        if collection.ann is not None:
+            collection.ann.save(collection.ann_file, generation)
+        if collection.lexical is not None:
+            collection.lexical.save(collection.lexical_file, generation)
+
+        if collection.log is None:
+            self._save_indices()
+        else:
+            collection.log.compact(collection.records, collection.embeddings.array)
+            self._map_embeddings(collection)
+        self._update_codes(collection)
+
+    def compact(self):
+        """
+        Rewrite each modality as a single segment without deleted rows, so the next load
+        is a single memory map.
+        """
+        for collection in self._collections():
+            if collection.deleted or (collection.log is not None and len(collection.log.segments) > 1):
+                self._rewrite(collection)
+            else:
+                if collection.ann is not None:
+                    collection.ann.save(collection.ann_file, self._generation(collection))
+                if collection.lexical is not None:
+                    collection.lexical.save(collection.lexical_file, self._generation(collection))
+
     def add_text_vectors(self, vectors):
         """Add text vectors to the index."""
-        self.text_vectors.extend(vectors)
-        self._save_indices()
-    
+        self._add(self.text, vectors)
+
     def add_image_vectors(self, vectors):
         """Add image vectors to the index."""
-        self.image_vectors.extend(vectors)
-        self._save_indices()
-    
-    def search_text(self, query_vector, top_k=5):
-        """Search for similar text vectors."""
-        if not self.text_vectors:
+        self._add(self.image, vectors)
+
+    def _add(self, collection, vectors):
+        if not vectors:
+            return
+        with metrics.span("index_write", collection=collection.name):
+            start = len(collection.records)
+            self._append(collection, vectors)
+            rewritten = self._persist(collection, start)
+            self._map_embeddings(collection)
+            collection.ann = self._update_ann(collection, rewritten)
+            self._update_codes(collection)
+            self._update_lexical(collection, rewritten)
+            collection.metadata.add(collection.records[collection.metadata.ntotal:])
+        metrics.inc("vectors_indexed_total", len(vectors), collection=collection.name)
+        self._bump_version()
+
+    def _bump_version(self):
+        self.version += 1
+        atomic_write(self.version_file, lambda f: json.dump({'version': self.version}, f))
+
+    def delete_document(self, document_id):
+        """
+        Remove every text and image vector of a document.
+
+        Rows are tombstoned (recorded in the segment manifest) and skipped by search; they
+        are physically dropped at the next full compaction, which is triggered once
+        deleted rows exceed max_deleted_fraction of a modality.
+
+        Returns:
+            Number of vectors removed
+        """
+        removed = 0
+        for collection in self._collections():
+            rows = [i for i, record in enumerate(collection.records)
+                    if record.get('document_id') == document_id and i not in collection.deleted]
+            if not rows:
+                continue
+
+            removed += len(rows)
+            collection.deleted.update(rows)
+            if collection.log is None:
+                self._rewrite(collection)
+            elif len(collection.deleted) > self.max_deleted_fraction * len(collection.records):
+                self._rewrite(collection)
+            else:
+                collection.log.delete(rows)
+
+        if removed:
+            self._bump_version()
+        return removed
+
+    def replace_document(self, document_id, text_vectors, image_vectors):
+        """Delete a document's vectors and add new ones in their place."""
+        self.delete_document(document_id)
+        self.add_text_vectors(text_vectors)
+        self.add_image_vectors(image_vectors)
+
+    def export_document(self, document_id):
+        """
+        Live vectors of a document in the form add_text_vectors/add_image_vectors take.
+
+        Returns:
+            {'text': [...], 'image': [...]}, each record carrying its (normalized) 'embedding'
+        """
+        exported = {}
+        for collection in self._collections():
+            rows = [row for row in collection.metadata.rows({'document_id': document_id}).tolist()
+                    if row not in collection.deleted]
+            exported[collection.name] = [
+                dict(collection.records[row], embedding=collection.embeddings.array[row].tolist()) for row in rows
+            ]
+        return exported
+
+    def document_counts(self):
+        """Number of live text and image vectors per document_id."""
+        counts = {}
+        for collection in self._collections():
+            for record in collection.live_records():
+                document_id = record.get('document_id')
+                counts[document_id] = counts.get(document_id, 0) + 1
+        return counts
+
+    def _search(self, collection, query_vector, top_k, ann=None, nprobe=None, codes=None, filters=None):
+        """
+        Score rows against the query and select the top k.
+
+        With filters only the matching rows (looked up in the metadata index) are scored,
+        exactly. Otherwise, with an approximate index only the rows of the probed clusters
+        are scored; with quantized codes every code is scored and the best
+        top_k * rescore_factor rows are rescored at full precision; and without either
+        every row is scored with one matrix-vector product.
+        """
+        if len(collection) == 0:
             return []
-        
-        # Extract embeddings for similarity calculation
-        embeddings = np.array([item['embedding'] for item in self.text_vectors])
-        query_vector = np.array(query_vector).reshape(1, -1)
-        
-        # Calculate similarities
-        similarities = cosine_similarity(query_vector, embeddings)[0]
-        
-        # Get top k results
-        top_indices = np.argsort(similarities)[-top_k:][::-1]
-        
+
+        if filters:
+            rows = collection.metadata.rows(filters)
+            if collection.deleted:
+                rows = rows[~np.isin(rows, list(collection.deleted))]
+            query = normalize_rows(query_vector)[0]
+            scores = collection.embeddings.array[rows] @ query
+            order = top_k_indices(scores, top_k)
+            top_indices, similarities = rows[order], scores[order]
+        elif ann is not None:
+            query = normalize_rows(query_vector)[0]
+            # Ask for enough extra hits to make up for deleted rows among the candidates
+            top_indices, similarities = ann.search(
+                collection.embeddings.array, query, top_k + len(collection.deleted), nprobe=nprobe
+            )
+            keep = [i for i, idx in enumerate(top_indices) if idx not in collection.deleted][:top_k]
+            top_indices, similarities = top_indices[keep], similarities[keep]
+        elif codes is not None:
+            query = normalize_rows(query_vector)[0]
+            scores = codes.scores(query)
+            if collection.deleted:
+                scores[list(collection.deleted)] = -np.inf
+            factor = self.rescore_factor or codes.quantizer.default_rescore_factor
+            shortlist = top_k_indices(scores, min(top_k * factor, len(collection)))
+            shortlist.sort()  # Ascending rows read the (possibly memory-mapped) matrix in order
+            exact_scores = collection.embeddings.array[shortlist] @ query
+            order = top_k_indices(exact_scores, top_k)
+            top_indices, similarities = shortlist[order], exact_scores[order]
+        else:
+            scores = collection.embeddings.scores(query_vector)
+            if collection.deleted:
+                scores[list(collection.deleted)] = -np.inf
+            top_indices = top_k_indices(scores, min(top_k, len(collection)))
+            similarities = scores[top_indices]
+
         results = []
-        for idx in top_indices:
-            result = self.text_vectors[idx].copy()
-            result['similarity'] = float(similarities[idx])
+        for idx, similarity in zip(top_indices, similarities):
+            result = collection.records[idx].copy()
+            result['similarity'] = float(similarity)
             results.append(result)
-        
+
         return results
-    
-    def search_images(self, query_vector, top_k=5):
-        """Search for similar image vectors."""
-        if not self.image_vectors:
+
+    def search_text(self, query_vector, top_k=5, exact=False, nprobe=None, filters=None):
+        """
+        Search for similar text vectors.
+
+        Args:
+            exact: Bypass the approximate index and quantized codes and score every row
+            nprobe: Override the approximate index's recall/speed setting for this query
+            filters: Optional dict restricting the search to rows by 'document_id',
+                'chunk_type' and/or 'page_num' (see MetadataIndex.rows)
+        """
+        with metrics.span("retrieval_scoring", collection="text"):
+            if exact or filters:
+                return self._search(self.text, query_vector, top_k, filters=filters)
+            return self._search(self.text, query_vector, top_k, self.text.ann, nprobe, self.text.codes)
+
+    def search_images(self, query_vector, top_k=5, exact=False, nprobe=None, filters=None):
+        """
+        Search for similar image vectors.
+
+        Args:
+            exact: Bypass the approximate index and quantized codes and score every row
+            nprobe: Override the approximate index's recall/speed setting for this query
+            filters: Optional dict restricting the search to rows by 'document_id',
+                'chunk_type' and/or 'page_num' (see MetadataIndex.rows)
+        """
+        with metrics.span("retrieval_scoring", collection="image"):
+            if exact or filters:
+                return self._search(self.image, query_vector, top_k, filters=filters)
+            return self._search(self.image, query_vector, top_k, self.image.ann, nprobe, self.image.codes)
+
+    def _search_many(self, collection, query_vectors, top_k, filters=None):
+        """
+        Exact top k for many queries with blocked matrix-matrix scoring.
+
+        Returns one result list per query, as _search would.
+        """
+        if len(query_vectors) == 0:
             return []
-        
-        # Extract embeddings for similarity calculation
-        embeddings = np.array([item['embedding'] for item in self.image_vectors])
-        query_vector = np.array(query_vector).reshape(1, -1)
-        
-        # Calculate similarities
-        similarities = cosine_similarity(query_vector, embeddings)[0]
-        
-        # Get top k results
-        top_indices = np.argsort(similarities)[-top_k:][::-1]
-        
+        if len(collection) == 0:
+            return [[] for _ in query_vectors]
+
+        queries = normalize_rows(query_vectors)
+        with metrics.span("batch_retrieval_scoring", collection=collection.name):
+            if filters:
+                rows = collection.metadata.rows(filters)
+                if collection.deleted:
+                    rows = rows[~np.isin(rows, list(collection.deleted))]
+                indices, scores = blocked_top_k(collection.embeddings.array[rows], queries, top_k)
+                indices = rows[indices]
+            else:
+                exclude = np.array(sorted(collection.deleted), dtype=np.int64) if collection.deleted else None
+                indices, scores = blocked_top_k(collection.embeddings.array, queries, top_k, exclude=exclude)
+
+        all_results = []
+        for row_indices, row_scores in zip(indices, scores):
+            results = []
+            for idx, similarity in zip(row_indices, row_scores):
+                if similarity == -np.inf:
+                    # Fewer live rows than top_k
+                    break
+                result = collection.records[idx].copy()
+                result['similarity'] = float(similarity)
+                results.append(result)
+            all_results.append(results)
+
+        return all_results
+
+    def search_text_many(self, query_vectors, top_k=5, filters=None):
+        """
+        Exact search for many text queries at once.
+
+        The queries are scored against the corpus in tiles with matrix-matrix products,
+        which is much faster than calling search_text once per query.
+
+        Returns:
+            One list of results per query
+        """
+        return self._search_many(self.text, query_vectors, top_k, filters)
+
+    def search_images_many(self, query_vectors, top_k=5, filters=None):
+        """Exact search for many image queries at once (see search_text_many)."""
+        return self._search_many(self.image, query_vectors, top_k, filters)
+
+    def hybrid_search_text(self, query_text, query_vector, top_k=5, candidates=100, rrf_k=60, filters=None):
+        """
+        Search text chunks by fusing BM25 and dense rankings.
+
+        The BM25 index supplies up to `candidates` rows sharing terms with the query; only
+        those rows are scored against the query vector, and the lexical and dense rankings
+        are combined with reciprocal rank fusion. When fewer than top_k rows share a term
+        with the query (or there is no lexical index) the rest comes from search_text.
+
+        Args:
+            query_text: Query as text, for BM25
+            query_vector: Query embedding, for dense scoring
+            top_k: Number of results to return
+            candidates: Number of BM25 candidates to dense-score
+            rrf_k: Reciprocal rank fusion damping constant
+            filters: Optional metadata filters, as for search_text
+
+        Returns:
+            Records with 'similarity' (cosine), 'bm25_score' and 'rrf_score', best fused first
+        """
+        collection = self.text
+        within = collection.metadata.rows(filters) if filters else None
+        with metrics.span("lexical_search", collection="text"):
+            lexical_rows, bm25_scores = (
+                collection.lexical.search(query_text, candidates, exclude=collection.deleted, within=within)
+                if collection.lexical is not None else ([], [])
+            )
+        if len(lexical_rows) == 0:
+            return self.search_text(query_vector, top_k, filters=filters)
+
+        with metrics.span("retrieval_scoring", collection="text", mode="lexical_hybrid"):
+            query = normalize_rows(query_vector)[0]
+            dense_scores = collection.embeddings.array[lexical_rows] @ query
+            dense_rows = lexical_rows[np.argsort(-dense_scores, kind='stable')]
+            rows, rrf_scores = reciprocal_rank_fusion([lexical_rows, dense_rows], k=rrf_k)
+        similarity = dict(zip(lexical_rows.tolist(), dense_scores.tolist()))
+        bm25 = dict(zip(lexical_rows.tolist(), bm25_scores.tolist()))
+
         results = []
-        for idx in top_indices:
-            result = self.image_vectors[idx].copy()
-            result['similarity'] = float(similarities[idx])
+        for row, rrf_score in zip(rows[:top_k].tolist(), rrf_scores[:top_k].tolist()):
+            result = collection.records[row].copy()
+            result['similarity'] = float(similarity[row])
+            result['bm25_score'] = float(bm25[row])
+            result['rrf_score'] = float(rrf_score)
             results.append(result)
-        
-        return results
\ No newline at end of file
+
+        if len(results) < top_k:
+            # Too few rows share a term with the query: fill up with dense hits
+            seen = {(result.get('document_id'), result.get('chunk_id')) for result in results}
+            for result in self.search_text(query_vector, top_k + len(results), filters=filters):
+                if len(results) == top_k:
+                    break
+                if (result.get('document_id'), result.get('chunk_id')) not in seen:
+                    results.append(result)
+
+        return results
@@ -0,0 +1,25 @@
+import os
+
+
+def fsync_dir(directory):
+    """Flush a directory entry so renames inside it survive a crash."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, write, mode='w'):
+    """Write a file through a temporary sibling, fsync it and rename it into place."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, mode) as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
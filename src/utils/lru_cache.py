@@ -0,0 +1,52 @@
+import threading
+from collections import OrderedDict
+
+
+def cache_stats(hits, misses, **extra):
+    """Hit and miss counts with the hit rate, in the layout every cache's stats() returns."""
+    total = hits + misses
+    return dict(extra, hits=hits, misses=misses, hit_rate=hits / total if total else 0.0)
+
+
+class LRUCache:
+    """Thread-safe in-memory mapping that evicts the least recently used entry when full."""
+
+    def __init__(self, max_size):
+        """
+        Args:
+            max_size: Maximum number of entries; 0 disables the cache
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return the cached value or None, counting the lookup as a hit or miss."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return cache_stats(self.hits, self.misses, entries=len(self._entries))
@@ -0,0 +1,300 @@
+"""
+Process-wide timing spans, counters and latency histograms.
+
+    from src.utils.metrics import metrics
+
+    with metrics.span("ocr"):
+        ...
+    metrics.inc("ocr_images_total", len(images))
+
+Spans record their duration in the `stage_duration_seconds` histogram under a `stage`
+label. The registry can be rendered in the Prometheus text exposition format or as a
+per-stage summary, saved to a JSON file, and dumped from the command line:
+
+    python -m src.utils.metrics data/cache/metrics.json [--format prometheus]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from contextlib import contextmanager
+
+from src.utils.atomic_write import atomic_write
+
+
+# Upper bounds (seconds) of the latency histogram buckets; an implicit +Inf bucket follows
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_HISTOGRAM = "stage_duration_seconds"
+
+
+class Histogram:
+    """Counts of observed values per bucket, plus their number and sum."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Estimate the q-quantile by interpolating linearly inside its bucket."""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                if index == len(self.buckets):
+                    # Above the largest bound there is nothing to interpolate towards
+                    return lower
+                return lower + (self.buckets[index] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def state(self):
+        return {'buckets': list(self.buckets), 'counts': list(self.counts), 'count': self.count, 'sum': self.sum}
+
+    def merge(self, state):
+        if tuple(state['buckets']) != self.buckets:
+            raise ValueError("Cannot merge histograms with different buckets")
+        self.counts = [a + b for a, b in zip(self.counts, state['counts'])]
+        self.count += state['count']
+        self.sum += state['sum']
+
+
+class MetricsRegistry:
+    """
+    Thread-safe counters and histograms keyed by metric name and labels.
+
+    Worker processes start with an empty registry after a fork; they hand their
+    measurements back with drain() and the parent adds them with merge().
+    """
+
+    def __init__(self, namespace="rag", buckets=DEFAULT_BUCKETS):
+        """
+        Args:
+            namespace: Prefix of metric names in the Prometheus output
+            buckets: Upper bounds of histogram buckets in seconds
+        """
+        self.namespace = namespace
+        self.buckets = tuple(buckets)
+        self._reset_state()
+
+    def _reset_state(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        """Add to a counter."""
+        key = (name, self._label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Record a value (normally seconds) in a histogram."""
+        key = (name, self._label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, stage, **labels):
+        """
+        Time a block as one occurrence of `stage`.
+
+        The duration is recorded whether or not the block raises; exceptions are also
+        counted in `errors_total`. (A generator closed early inside a span is not an error.)
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc("errors_total", stage=stage, **labels)
+            raise
+        finally:
+            self.observe(STAGE_HISTOGRAM, time.perf_counter() - start, stage=stage, **labels)
+
+    def snapshot(self):
+        """JSON-serializable copy of every counter and histogram."""
+        with self._lock:
+            return self._snapshot(self._counters, self._histograms)
+
+    def merge(self, snapshot):
+        """Add the counts of a snapshot (e.g. from a worker process) to this registry."""
+        for name, labels, value in snapshot['counters']:
+            self.inc(name, value, **labels)
+        with self._lock:
+            for name, labels, state in snapshot['histograms']:
+                key = (name, self._label_key(labels))
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram(state['buckets'])
+                histogram.merge(state)
+
+    def drain(self):
+        """Return a snapshot and clear the registry."""
+        with self._lock:
+            counters, histograms = self._counters, self._histograms
+            self._counters, self._histograms = {}, {}
+        return self._snapshot(counters, histograms)
+
+    def reset(self):
+        with self._lock:
+            self._counters, self._histograms = {}, {}
+
+    def to_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        return render_prometheus(self.snapshot(), self.namespace)
+
+    def summary(self):
+        """Per-stage latency table, stages taking the most total time first."""
+        return render_summary(self.snapshot())
+
+    def save(self, path):
+        """Write a snapshot to a JSON file (atomically)."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        snapshot = dict(self.snapshot(), namespace=self.namespace, saved=time.time())
+        atomic_write(path, lambda f: json.dump(snapshot, f))
+
+    def _snapshot(self, counters, histograms):
+        return {
+            'counters': [[name, dict(labels), value] for (name, labels), value in counters.items()],
+            'histograms': [[name, dict(labels), histogram.state()] for (name, labels), histogram in histograms.items()]
+        }
+
+    def _label_key(self, labels):
+        return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def render_prometheus(snapshot, namespace="rag"):
+    """Prometheus text exposition format of a snapshot, metric names prefixed with namespace."""
+    lines = []
+    counters = {}
+    for name, labels, value in snapshot['counters']:
+        counters.setdefault(name, []).append((labels, value))
+    for name in sorted(counters):
+        full_name = f"{namespace}_{name}"
+        lines.append(f"# TYPE {full_name} counter")
+        for labels, value in sorted(counters[name], key=lambda entry: sorted(entry[0].items())):
+            lines.append(f"{full_name}{_format_labels(labels)} {_format_value(value)}")
+
+    histograms = {}
+    for name, labels, state in snapshot['histograms']:
+        histograms.setdefault(name, []).append((labels, state))
+    for name in sorted(histograms):
+        full_name = f"{namespace}_{name}"
+        lines.append(f"# TYPE {full_name} histogram")
+        for labels, state in sorted(histograms[name], key=lambda entry: sorted(entry[0].items())):
+            cumulative = 0
+            for bound, count in zip(list(state['buckets']) + ['+Inf'], state['counts']):
+                cumulative += count
+                bucket_labels = dict(labels, le=bound if bound == '+Inf' else _format_value(bound))
+                lines.append(f"{full_name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+            lines.append(f"{full_name}_sum{_format_labels(labels)} {_format_value(state['sum'])}")
+            lines.append(f"{full_name}_count{_format_labels(labels)} {state['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def render_summary(snapshot):
+    """
+    Table of stage spans with count, total, mean and estimated p50/p95/p99 in ms.
+
+    Stages nest (OCR runs inside page processing, retrieval scoring inside retrieve),
+    so shares are of the summed stage time rather than of wall time.
+    """
+    rows = []
+    for name, labels, state in snapshot['histograms']:
+        if name != STAGE_HISTOGRAM:
+            continue
+        histogram = Histogram(state['buckets'])
+        histogram.merge(state)
+        other = ",".join(f"{key}={value}" for key, value in sorted(labels.items()) if key != 'stage')
+        stage = labels.get('stage', '?') + (f" [{other}]" if other else "")
+        rows.append((stage, histogram))
+    if not rows:
+        return "No spans recorded."
+
+    rows.sort(key=lambda row: row[1].sum, reverse=True)
+    grand_total = sum(histogram.sum for _, histogram in rows) or 1.0
+    width = max(len("stage"), max(len(stage) for stage, _ in rows))
+    lines = [f"{'stage':<{width}} {'count':>8} {'total s':>9} {'share':>6} {'mean ms':>9} "
+             f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"]
+    for stage, histogram in rows:
+        lines.append(
+            f"{stage:<{width}} {histogram.count:>8} {histogram.sum:>9.3f} {histogram.sum / grand_total:>6.1%} "
+            f"{histogram.sum / histogram.count * 1000:>9.2f} {histogram.quantile(0.5) * 1000:>9.2f} "
+            f"{histogram.quantile(0.95) * 1000:>9.2f} {histogram.quantile(0.99) * 1000:>9.2f}"
+        )
+
+    counters = sorted(snapshot['counters'], key=lambda entry: (entry[0], sorted(entry[1].items())))
+    if counters:
+        lines.append("")
+        for name, labels, value in counters:
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in sorted(labels.items()):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+# The registry every component records into
+metrics = MetricsRegistry()
+
+# A forked worker must not inherit the parent's counts (they would be merged back twice)
+# or a lock another thread held at the moment of the fork
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=metrics._reset_state)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print metrics saved by the application.")
+    parser.add_argument('path', nargs='?', default=os.path.join("data", "cache", "metrics.json"),
+                        help="Metrics file written by MetricsRegistry.save")
+    parser.add_argument('--format', choices=['summary', 'prometheus', 'json'], default='summary')
+    args = parser.parse_args()
+
+    try:
+        with open(args.path) as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Error reading metrics from {args.path}: {e}")
+        sys.exit(1)
+
+    if args.format == 'prometheus':
+        print(render_prometheus(snapshot, snapshot.get('namespace', 'rag')), end="")
+    elif args.format == 'json':
+        print(json.dumps(snapshot, indent=2))
+    else:
+        print(render_summary(snapshot))
+
+
+if __name__ == "__main__":
+    main()
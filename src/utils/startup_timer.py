@@ -0,0 +1,45 @@
+import time
+import threading
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """Records how long each startup stage takes and prints a breakdown."""
+
+    def __init__(self, start=None):
+        """
+        Args:
+            start: time.perf_counter() value startup is measured from (defaults to now),
+                e.g. taken before the application's imports
+        """
+        self.start = time.perf_counter() if start is None else start
+        self.stages = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as one stage; stages may run on different threads."""
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - began)
+
+    def record(self, name, seconds):
+        with self._lock:
+            self.stages.append((name, seconds))
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def report(self):
+        """Return the stages and the total time since start as a printable table."""
+        with self._lock:
+            stages = list(self.stages)
+
+        width = max([len(name) for name, _ in stages] + [len("total")])
+        lines = ["Startup timing:"]
+        for name, seconds in stages:
+            lines.append(f"  {name:<{width}}  {seconds:8.2f}s")
+        lines.append(f"  {'total':<{width}}  {self.elapsed():8.2f}s")
+        return "\n".join(lines)
@@ -0,0 +1,46 @@
+import os
+
+import numpy as np
+
+from src.embedding.embedding_cache import EmbeddingCache
+
+
+def make_cache(cache_dir, entries=50):
+    # Slots of the 32-byte key plus a 4-dimensional float32 vector
+    return EmbeddingCache(str(cache_dir), "model", max_size_bytes=(32 + 16) * entries)
+
+
+def test_flushes_append_to_the_log_and_survive_reload(tmp_path):
+    cache = make_cache(tmp_path)
+    rng = np.random.default_rng(0)
+    stored = {}
+    for batch in range(20):
+        keys = [cache.make_key(f"text {batch} {i}") for i in range(5)]
+        vectors = rng.standard_normal((5, 4)).astype(np.float32)
+        cache.put_many(keys, vectors)
+        stored.update(zip(keys, vectors))
+        cache.flush()
+
+    reloaded = make_cache(tmp_path)
+    assert len(reloaded.index) == 50
+    for key, vector in zip(stored, reloaded.get_many(list(stored))):
+        if key in cache.index:
+            np.testing.assert_array_equal(vector, stored[key])
+        else:
+            # Evicted, and its slot reused by a later entry
+            assert vector is None
+
+
+def test_hits_do_not_rewrite_the_index(tmp_path):
+    cache = make_cache(tmp_path)
+    keys = [cache.make_key(f"text {i}") for i in range(3)]
+    cache.put_many(keys, np.ones((3, 4), dtype=np.float32))
+    cache.flush()
+    index_file = os.path.join(cache.directory, "index.json")
+    mtime = os.stat(index_file).st_mtime_ns
+
+    assert all(vector is not None for vector in cache.get_many(keys))
+    cache.flush()
+
+    assert os.stat(index_file).st_mtime_ns == mtime
+    assert not os.path.exists(cache.log_file)
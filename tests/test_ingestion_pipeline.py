@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from benchmarks.stubs import StubTextEmbedder, StubImageEmbedder, generate_pdf
+from src.ingestion.ocr import OCREngine
+from src.ingestion.ocr_cache import OCRCache
+from src.ingestion.pdf_processor import PDFProcessor
+from src.ingestion.pipeline import IngestionPipeline
+from src.retrieval.vector_store import SimpleVectorStore
+
+
+class FakeTesseractOCREngine(OCREngine):
+    """OCREngine with the tesseract call replaced, so the cache path runs unchanged."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.runs = 0
+
+    def _run_tesseract(self, image):
+        self.runs += 1
+        return f"figure {image.width}x{image.height}", True
+
+
+class FailingTextEmbedder(StubTextEmbedder):
+    """Fails on the n-th batch of pages."""
+
+    def __init__(self, fail_on_batch):
+        super().__init__()
+        self.fail_on_batch = fail_on_batch
+        self.batches = 0
+
+    def embed_document(self, document_data, chunk_size=1000, chunk_overlap=200):
+        self.batches += 1
+        if self.batches == self.fail_on_batch:
+            raise RuntimeError("embedding failed")
+        return super().embed_document(document_data, chunk_size, chunk_overlap)
+
+
+def make_pdf(tmp_path, name="manual.pdf", pages=12):
+    path = str(tmp_path / name)
+    generate_pdf(path, pages, np.random.default_rng(0))
+    return path
+
+
+def make_pipeline(store, ocr_engine=None, text_embedder=None):
+    return IngestionPipeline(
+        PDFProcessor(ocr_engine=ocr_engine), text_embedder or StubTextEmbedder(), StubImageEmbedder(), store,
+        pages_per_batch=2
+    )
+
+
+def test_ingest_twice_with_ocr_cache(tmp_path):
+    pdf_path = make_pdf(tmp_path)
+    ocr_engine = FakeTesseractOCREngine(cache=OCRCache(str(tmp_path / "ocr.sqlite")))
+    store = SimpleVectorStore(str(tmp_path / "embeddings"))
+    pipeline = make_pipeline(store, ocr_engine)
+
+    # Each ingest extracts on a new thread; the cache connection must work on both
+    first = pipeline.ingest(pdf_path)
+    runs = ocr_engine.runs
+    store.delete_document("manual.pdf")
+    second = pipeline.ingest(pdf_path)
+
+    assert runs > 0
+    assert ocr_engine.runs == runs
+    assert ocr_engine.cache.stats()['hits'] == runs
+    assert second['text_vectors'] == first['text_vectors']
+    assert len(store.text_vectors) == first['text_vectors']
+
+
+def test_failed_ingest_leaves_no_vectors(tmp_path):
+    store = SimpleVectorStore(str(tmp_path / "embeddings"))
+    make_pipeline(store).ingest(make_pdf(tmp_path, "other.pdf", pages=4))
+    before = (len(store.text_vectors), len(store.image_vectors))
+
+    pipeline = make_pipeline(store, text_embedder=FailingTextEmbedder(fail_on_batch=3))
+    with pytest.raises(RuntimeError):
+        pipeline.ingest(make_pdf(tmp_path), str(tmp_path / "manual.json"))
+
+    assert (len(store.text_vectors), len(store.image_vectors)) == before
+    assert all(record['document_id'] == "other.pdf" for record in store.text_vectors)
+    assert not (tmp_path / "manual.json").exists()
+
+    reloaded = SimpleVectorStore(str(tmp_path / "embeddings"))
+    assert (len(reloaded.text_vectors), len(reloaded.image_vectors)) == before
+
+
+def test_repeated_image_lists_every_page(tmp_path):
+    storage_dir = str(tmp_path / "embeddings")
+    store = SimpleVectorStore(storage_dir)
+    make_pipeline(store).ingest(make_pdf(tmp_path, pages=12))
+    query = np.ones(512, dtype=np.float32)
+
+    # The logo on every page is embedded once, at its first occurrence
+    for current in (store, SimpleVectorStore(storage_dir)):
+        logos = [record for record in current.image_vectors if record['width'] == 120]
+        assert len(logos) == 1
+        assert logos[0]['page_nums'] == list(range(1, 13))
+
+        hits = current.search_images(query, top_k=10, filters={'page_num': 11})
+        assert [hit['chunk_id'] for hit in hits] == [logos[0]['chunk_id']]
@@ -0,0 +1,37 @@
+import sqlite3
+
+from src.ingestion.ocr_cache import OCRCache
+
+
+def stored_sizes(path):
+    with sqlite3.connect(path) as connection:
+        total = connection.execute("SELECT total FROM ocr_size").fetchone()[0]
+        summed = connection.execute("SELECT COALESCE(SUM(size), 0) FROM ocr").fetchone()[0]
+    return total, summed
+
+
+def test_running_total_tracks_inserts_replacements_and_evictions(tmp_path):
+    path = str(tmp_path / "ocr.sqlite")
+    cache = OCRCache(path, max_size_bytes=100)
+    for i in range(30):
+        cache.put(f"key{i % 12}", "x" * (5 + i % 7))
+
+    total, summed = stored_sizes(path)
+    assert total == summed <= 100
+    # Last written at i = 29, so the most recently used entry
+    assert cache.get("key5") == "x" * 6
+
+
+def test_total_is_summed_once_for_an_existing_cache(tmp_path):
+    path = str(tmp_path / "ocr.sqlite")
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            "CREATE TABLE ocr (key TEXT PRIMARY KEY, text TEXT NOT NULL, size INTEGER NOT NULL, "
+            "last_access REAL NOT NULL)"
+        )
+        connection.execute("INSERT INTO ocr VALUES ('old', 'legacy text', 11, 0)")
+
+    cache = OCRCache(path)
+    cache.put("new", "abc")
+    assert stored_sizes(path) == (14, 14)
+    assert cache.get("old") == "legacy text"
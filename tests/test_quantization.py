@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+
+from src.retrieval.embedding_matrix import MappedEmbeddingMatrix
+from src.retrieval.quantization import BinaryQuantizer
+from src.retrieval.vector_store import SimpleVectorStore
+from tests.test_segment_log import chunk_ids, make_vectors
+
+
+def test_codes_are_saved_with_the_segments_and_memory_mapped(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    store = SimpleVectorStore(str(tmp_path), quantization='binary', rescore_factor=20)
+    for batch in range(3):
+        store.add_text_vectors(make_vectors(f"doc{batch}.pdf", 20, rng))
+    store.delete_document("doc1.pdf")
+
+    code_files = sorted(name for name in os.listdir(tmp_path) if name.endswith(".binary.npy"))
+    assert code_files == [segment['matrix'].replace(".npy", ".binary.npy") for segment in store.text.log.segments]
+
+    # Reopening maps the saved codes instead of encoding the rows again
+    monkeypatch.setattr(BinaryQuantizer, "encode", None)
+    for current in (store, SimpleVectorStore(str(tmp_path), quantization='binary', rescore_factor=20)):
+        assert isinstance(current.text.embeddings, MappedEmbeddingMatrix)
+        assert all(isinstance(block, np.memmap) for block in current.text.codes.blocks)
+        assert len(current.text.codes) == len(current.text.embeddings) == 40
+
+        query = rng.standard_normal(8)
+        exact = chunk_ids(current.search_text(query, top_k=5, exact=True))
+        assert chunk_ids(current.search_text(query, top_k=5)) == exact
+
+
+def test_mapped_rows_index_like_an_array(tmp_path):
+    rng = np.random.default_rng(1)
+    parts = [rng.standard_normal((n, 4)).astype(np.float32) for n in (3, 5, 2)]
+    rows = np.concatenate(parts)
+    mapped = MappedEmbeddingMatrix(parts)
+
+    assert len(mapped) == 10 and mapped.shape == (10, 4)
+    np.testing.assert_array_equal(mapped[2:7], rows[2:7])
+    np.testing.assert_array_equal(mapped[::3], rows[::3])
+    np.testing.assert_array_equal(mapped[[9, 0, 4]], rows[[9, 0, 4]])
+    np.testing.assert_array_equal(mapped[-1], rows[-1])
+    np.testing.assert_array_equal(np.asarray(mapped), rows)
+    np.testing.assert_allclose(mapped @ rows[0], rows @ rows[0], rtol=1e-6)
@@ -0,0 +1,72 @@
+import json
+
+import numpy as np
+import pytest
+import requests
+
+from src.generation.answer_cache import SemanticAnswerCache
+from src.generation.llm_interface import LLMInterface, LLMStreamError
+from src.generation.response_builder import ResponseBuilder
+
+
+ITEMS = [{'document_id': 'manual.pdf', 'page_num': 1, 'chunk_id': 'page_1_chunk_1', 'chunk_type': 'text',
+          'content': 'The chamber pressure is 7 MPa.'}]
+
+
+class FakeHTTPClient:
+    """Replays server-sent event lines, then optionally fails or stops without [DONE]."""
+
+    def __init__(self, words, ending):
+        self.words = words
+        self.ending = ending
+
+    def post_stream(self, url, payload, headers=None):
+        for word in self.words:
+            yield f"data: {json.dumps({'choices': [{'delta': {'content': word}}]})}"
+            yield ""
+        if self.ending == 'done':
+            yield "data: [DONE]"
+        elif self.ending == 'error':
+            raise requests.ConnectionError("connection reset")
+
+
+def make_llm(ending):
+    return LLMInterface(api_key='test', http_client=FakeHTTPClient(["The ", "pressure ", "is"], ending))
+
+
+@pytest.mark.parametrize('ending', ['error', 'truncated'])
+def test_stream_failure_is_raised(ending):
+    stream = make_llm(ending).stream_response("question")
+    assert [next(stream) for _ in range(3)] == ["The ", "pressure ", "is"]
+    with pytest.raises(LLMStreamError):
+        next(stream)
+
+
+@pytest.mark.parametrize('ending', ['error', 'truncated'])
+def test_failed_stream_is_not_cached(tmp_path, ending):
+    cache = SemanticAnswerCache(str(tmp_path / "answers.json"))
+    builder = ResponseBuilder(make_llm(ending), str(tmp_path), answer_cache=cache)
+    query_embedding = np.ones(8, dtype=np.float32)
+
+    for _ in range(2):
+        responses = list(builder.stream_response("question", ITEMS, query_embedding=query_embedding,
+                                                 store_version=1))
+        last = responses[-1]
+        assert last['done'] and not last.get('cached')
+        assert last['text_response'].startswith("The pressure is")
+        assert "Error generating response" in last['error']
+
+    assert cache.stats()['entries'] == 0
+
+
+def test_complete_stream_is_cached(tmp_path):
+    cache = SemanticAnswerCache(str(tmp_path / "answers.json"))
+    builder = ResponseBuilder(make_llm('done'), str(tmp_path), answer_cache=cache)
+    query_embedding = np.ones(8, dtype=np.float32)
+
+    first = list(builder.stream_response("question", ITEMS, query_embedding=query_embedding, store_version=1))
+    second = list(builder.stream_response("question", ITEMS, query_embedding=query_embedding, store_version=1))
+
+    assert first[-1]['text_response'] == "The pressure is" and 'error' not in first[-1]
+    assert second == [dict(second[0], cached=True)]
+    assert second[0]['text_response'] == "The pressure is"
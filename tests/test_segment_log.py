@@ -0,0 +1,203 @@
+import os
+
+import numpy as np
+import pytest
+
+from src.retrieval import segment_log
+from src.retrieval.lexical_index import BM25Index
+from src.retrieval.segment_log import SegmentLog
+from src.retrieval.vector_store import SimpleVectorStore
+
+
+def make_vectors(document_id, count, rng, dim=8, first_page=1):
+    return [
+        {'document_id': document_id, 'chunk_id': f"{document_id}_{i}", 'page_num': first_page + i,
+         'chunk_type': 'text', 'content': f"chunk {i} of {document_id}",
+         'embedding': rng.standard_normal(dim).tolist()}
+        for i in range(count)
+    ]
+
+
+def chunk_ids(results):
+    return [result['chunk_id'] for result in results]
+
+
+def test_append_then_reload(tmp_path):
+    rng = np.random.default_rng(0)
+    store = SimpleVectorStore(str(tmp_path))
+    for batch in range(3):
+        store.add_text_vectors(make_vectors(f"doc{batch}.pdf", 10, rng))
+    query = rng.standard_normal(8)
+    expected = chunk_ids(store.search_text(query, top_k=5))
+
+    reloaded = SimpleVectorStore(str(tmp_path))
+    assert len(reloaded.text_vectors) == 30
+    assert chunk_ids(reloaded.search_text(query, top_k=5)) == expected
+    np.testing.assert_allclose(reloaded.text.embeddings.array, store.text.embeddings.array)
+
+
+def test_delete_then_compaction(tmp_path):
+    rng = np.random.default_rng(1)
+    store = SimpleVectorStore(str(tmp_path), max_deleted_fraction=1.0)
+    store.add_text_vectors(make_vectors("keep.pdf", 10, rng))
+    store.add_text_vectors(make_vectors("drop.pdf", 10, rng))
+
+    assert store.delete_document("drop.pdf") == 10
+    assert store.text.log.deleted == list(range(10, 20))
+    reloaded = SimpleVectorStore(str(tmp_path))
+    assert {record['document_id'] for record in reloaded.text_vectors} == {"keep.pdf"}
+
+    reloaded.compact()
+    assert reloaded.text.log.deleted == []
+    assert len(reloaded.text.log.segments) == 1
+    assert len(reloaded.text.embeddings) == 10
+
+    compacted = SimpleVectorStore(str(tmp_path))
+    hits = compacted.search_text(rng.standard_normal(8), top_k=20)
+    assert len(hits) == 10
+    assert {hit['document_id'] for hit in hits} == {"keep.pdf"}
+    files = [name for name in os.listdir(tmp_path) if name.startswith("text_seg_")]
+    assert sorted(files) == sorted([compacted.text.log.segments[0]['matrix'],
+                                    compacted.text.log.segments[0]['metadata']])
+
+
+def test_small_appends_are_merged_in_tiers(tmp_path, monkeypatch):
+    rng = np.random.default_rng(6)
+    store = SimpleVectorStore(str(tmp_path), lexical_index=False)
+    store.add_text_vectors(make_vectors("base.pdf", 4000, rng))
+
+    written = []
+    write_segment = SegmentLog._write_segment
+
+    def count_rows(log, records, embeddings):
+        written.append(len(records))
+        return write_segment(log, records, embeddings)
+
+    monkeypatch.setattr(SegmentLog, "_write_segment", count_rows)
+    for batch in range(1000):
+        store.add_text_vectors(make_vectors(f"doc{batch}.pdf", 3, rng))
+
+    # Each added row is written once and then rewritten at most once per tier
+    # (log4(3000 / 3) < 5), not again with every later merge
+    assert sum(written) <= 6 * 3000
+    assert len(store.text.log.segments) <= store.max_segments
+    sizes = [segment['rows'] for segment in store.text.log.segments]
+    assert sizes == sorted(sizes, reverse=True)
+
+    reloaded = SimpleVectorStore(str(tmp_path), lexical_index=False)
+    assert [record['chunk_id'] for record in reloaded.text_vectors] == [record['chunk_id'] for record in store.text_vectors]
+    np.testing.assert_array_equal(reloaded.text.embeddings.array, store.text.embeddings.array)
+
+
+def test_crash_before_manifest_rename(tmp_path, monkeypatch):
+    rng = np.random.default_rng(2)
+    store = SimpleVectorStore(str(tmp_path))
+    store.add_text_vectors(make_vectors("first.pdf", 5, rng))
+
+    original = segment_log.atomic_write
+
+    def crash_on_manifest(path, write, mode='w'):
+        if path.endswith("_manifest.json"):
+            with open(path + ".tmp", mode) as f:
+                write(f)
+            raise KeyboardInterrupt("crashed")
+        original(path, write, mode)
+
+    monkeypatch.setattr(segment_log, "atomic_write", crash_on_manifest)
+    with pytest.raises(KeyboardInterrupt):
+        store.add_text_vectors(make_vectors("second.pdf", 5, rng))
+    monkeypatch.setattr(segment_log, "atomic_write", original)
+
+    # The segment was written but never committed: the store opens in its previous state
+    recovered = SimpleVectorStore(str(tmp_path))
+    assert [record['document_id'] for record in recovered.text_vectors] == ["first.pdf"] * 5
+
+    recovered.add_text_vectors(make_vectors("third.pdf", 5, rng))
+    reloaded = SimpleVectorStore(str(tmp_path))
+    assert [record['document_id'] for record in reloaded.text_vectors] == ["first.pdf"] * 5 + ["third.pdf"] * 5
+
+
+@pytest.mark.parametrize('failing', [(BM25Index, 'save'), (SegmentLog, 'compact')])
+def test_crash_during_compaction_never_trusts_stale_indexes(tmp_path, monkeypatch, failing):
+    rng = np.random.default_rng(7)
+
+    def chunk(document_id, chunk_id):
+        return {'document_id': document_id, 'chunk_id': chunk_id, 'content': f"{chunk_id} common",
+                'embedding': rng.standard_normal(8).tolist()}
+
+    store = SimpleVectorStore(str(tmp_path), max_deleted_fraction=0)
+    store.add_text_vectors([chunk("alpha.pdf", "alpha")])
+    store.add_text_vectors([chunk("bravo.pdf", f"bravo{i}") for i in range(33)])
+    store.compact()
+    store.add_text_vectors([chunk("charlie.pdf", "charlie")])
+
+    def crash(*args, **kwargs):
+        raise KeyboardInterrupt("crashed")
+
+    # Deleting the first row renumbers every other row when the modality is rewritten;
+    # the saved BM25 index covers no more rows than remain, so only its generation
+    # tells that it is stale
+    monkeypatch.setattr(*failing, crash)
+    with pytest.raises(KeyboardInterrupt):
+        store.delete_document("alpha.pdf")
+    monkeypatch.undo()
+
+    for current in (SimpleVectorStore(str(tmp_path)), SimpleVectorStore(str(tmp_path))):
+        for chunk_id in ("bravo5", "charlie"):
+            hits = current.hybrid_search_text(chunk_id, rng.standard_normal(8), top_k=1)
+            assert chunk_ids(hits) == [chunk_id]
+
+
+def test_load_keeps_uncommitted_segments_of_another_writer(tmp_path):
+    rng = np.random.default_rng(3)
+    writer = SegmentLog(str(tmp_path), "text")
+    writer.append([{'chunk_id': 'a'}], rng.standard_normal((1, 8)))
+    writer.append([{'chunk_id': 'b'}], rng.standard_normal((1, 8)))
+    writer.compact([{'chunk_id': 'a'}, {'chunk_id': 'b'}], rng.standard_normal((2, 8)))
+
+    # A superseded segment that survived an interrupted compaction, and a segment of an
+    # append in progress in another process
+    stale = tmp_path / "text_seg_000001.npy"
+    stale.write_bytes(b"")
+    pending = writer._write_segment([{'chunk_id': 'c'}], rng.standard_normal((1, 8)))
+
+    records, _ = SegmentLog(str(tmp_path), "text").load()
+    assert [record['chunk_id'] for record in records] == ['a', 'b']
+    assert not stale.exists()
+    assert (tmp_path / pending['matrix']).exists() and (tmp_path / pending['metadata']).exists()
+
+
+def test_filter_search(tmp_path):
+    rng = np.random.default_rng(4)
+    store = SimpleVectorStore(str(tmp_path))
+    store.add_text_vectors(make_vectors("a.pdf", 10, rng))
+    store.add_text_vectors(make_vectors("b.pdf", 10, rng))
+    store.delete_document("b.pdf")
+    store.add_text_vectors(make_vectors("c.pdf", 10, rng, first_page=11))
+    query = rng.standard_normal(8)
+
+    for current in (store, SimpleVectorStore(str(tmp_path))):
+        hits = current.search_text(query, top_k=20, filters={'document_id': "c.pdf"})
+        assert len(hits) == 10 and {hit['document_id'] for hit in hits} == {"c.pdf"}
+
+        hits = current.search_text(query, top_k=20, filters={'page_num': (5, 12)})
+        assert sorted(hit['page_num'] for hit in hits) == [5, 6, 7, 8, 9, 10, 11, 12]
+
+        hits = current.search_text(query, top_k=20, filters={'page_num': [3, 15]})
+        assert sorted(chunk_ids(hits)) == ["a.pdf_2", "c.pdf_4"]
+
+        assert current.search_text(query, top_k=5, filters={'document_id': "b.pdf"}) == []
+
+
+def test_migrates_legacy_json_index(tmp_path):
+    rng = np.random.default_rng(5)
+    vectors = make_vectors("legacy.pdf", 6, rng)
+    legacy = SimpleVectorStore(str(tmp_path), storage_format="json")
+    legacy.add_text_vectors(vectors)
+    query = rng.standard_normal(8)
+    expected = chunk_ids(legacy.search_text(query, top_k=3))
+
+    store = SimpleVectorStore(str(tmp_path))
+    assert store.text.log.exists()
+    assert [record['chunk_id'] for record in store.text_vectors] == [vector['chunk_id'] for vector in vectors]
+    assert chunk_ids(store.search_text(query, top_k=3)) == expected
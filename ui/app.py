@@ -1,10 +1,12 @@
-import gradio as gr
+import time
+_IMPORT_START = time.perf_counter()
+
 import os
 import tempfile
-import json
 from PIL import Image
 import io
 import sys
+import threading
 from pathlib import Path
 
 # Add the project root to the Python path
@@ -18,30 +20,68 @@ load_dotenv()
 # Import our components
 from src.ingestion.pdf_processor import PDFProcessor
 from src.ingestion.ocr import OCREngine
+from src.ingestion.ocr_cache import OCRCache
+from src.ingestion.pipeline import IngestionPipeline
+from src.ingestion.document_manifest import DocumentManifest
 from src.embedding.text_embedder import TextEmbedder
 from src.embedding.image_embedder import ImageEmbedder
 from src.retrieval.vector_store import SimpleVectorStore
 from src.retrieval.retriever import MultimodalRetriever
 from src.generation.llm_interface import LLMInterface
 from src.generation.response_builder import ResponseBuilder
+from src.generation.answer_cache import SemanticAnswerCache
+from src.utils.startup_timer import StartupTimer
+from src.utils.metrics import metrics
+
+_IMPORT_SECONDS = time.perf_counter() - _IMPORT_START
 
 class AerospaceRAGApp:
-    def __init__(self, data_dir="./data"):
+    def __init__(self, data_dir="./data", background_startup=True):
+        """
+        Args:
+            data_dir: Root of the raw/processed/embeddings/cache directories
+            background_startup: Load the models and process new PDFs in a background
+                thread so the UI can start right away; if False, do both before returning.
+                Queries are served from the persisted index as soon as the models are
+                loaded (`ready`); new or changed PDFs are indexed after that
+                (`indexing_done`)
+        """
+        self.startup_timer = StartupTimer(start=_IMPORT_START)
+        self.startup_timer.record("imports", _IMPORT_SECONDS)
+        self.ready = threading.Event()
+        self.startup_status = "Starting up..."
+        self.startup_error = None
+        self.indexing_done = threading.Event()
+        self.indexing_status = "Waiting for the models to load..."
+        self.indexing_error = None
+
         # Create necessary directories
         self.data_dir = data_dir
         self.raw_dir = os.path.join(data_dir, "raw")
         self.processed_dir = os.path.join(data_dir, "processed")
         self.embeddings_dir = os.path.join(data_dir, "embeddings")
+        self.cache_dir = os.path.join(data_dir, "cache")
+        self.metrics_file = os.path.join(self.cache_dir, "metrics.json")
         
-        for dir_path in [self.data_dir, self.raw_dir, self.processed_dir, self.embeddings_dir]:
+        for dir_path in [self.data_dir, self.raw_dir, self.processed_dir, self.embeddings_dir, self.cache_dir]:
             os.makedirs(dir_path, exist_ok=True)
         
-        # Initialize components
+        # Initialize components (models are loaded on first use)
         print("Initializing components...")
-        self.ocr_engine = OCREngine()
-        self.pdf_processor = PDFProcessor(ocr_engine=self.ocr_engine)
-        self.text_embedder = TextEmbedder()
-        self.image_embedder = ImageEmbedder()
+        with self.startup_timer.stage("components"):
+            self._init_components()
+
+        if background_startup:
+            threading.Thread(target=self._warm_up, daemon=True).start()
+        else:
+            self._warm_up()
+
+    def _init_components(self):
+        self.ocr_engine = OCREngine(cache=OCRCache(os.path.join(self.cache_dir, "ocr_cache.sqlite")))
+        self.pdf_processor = PDFProcessor(ocr_engine=self.ocr_engine, num_workers=os.cpu_count() or 1)
+        embedding_cache_dir = os.path.join(self.cache_dir, "embeddings")
+        self.text_embedder = TextEmbedder(cache_dir=embedding_cache_dir)
+        self.image_embedder = ImageEmbedder(cache_dir=embedding_cache_dir)
         self.vector_store = SimpleVectorStore(self.embeddings_dir)
         self.retriever = MultimodalRetriever(
             self.vector_store, 
@@ -49,77 +89,133 @@ class AerospaceRAGApp:
             self.image_embedder
         )
         self.llm_interface = LLMInterface()
-        self.response_builder = ResponseBuilder(self.llm_interface, self.data_dir)
-        
-        # Automatically process any PDFs in the raw directory
-        self.process_existing_pdfs()
+        self.response_builder = ResponseBuilder(
+            self.llm_interface,
+            self.data_dir,
+            answer_cache=SemanticAnswerCache(os.path.join(self.cache_dir, "answer_cache.npz"))
+        )
+        self.ingestion_pipeline = IngestionPipeline(
+            self.pdf_processor,
+            self.text_embedder,
+            self.image_embedder,
+            self.vector_store
+        )
+        self.document_manifest = DocumentManifest(os.path.join(self.embeddings_dir, "documents.json"))
+
+    def _warm_up(self):
+        """
+        Load the models and mark the app ready for queries against the persisted index,
+        then process any new or changed PDFs in the raw directory.
+        """
+        import traceback
+        try:
+            self.startup_status = "Loading text embedding model..."
+            with self.startup_timer.stage("text model"):
+                self.text_embedder.model
+            self.startup_status = "Loading image embedding model..."
+            with self.startup_timer.stage("image model"):
+                self.image_embedder.load()
+            self.startup_status = "Ready"
+        except Exception as e:
+            self.startup_error = e
+            self.startup_status = f"Startup failed: {str(e)}"
+            traceback.print_exc()
+        finally:
+            self.ready.set()
+
+        try:
+            if self.startup_error is None:
+                with self.startup_timer.stage("existing PDFs"):
+                    self.process_existing_pdfs()
+        except Exception as e:
+            self.indexing_error = e
+            self.indexing_status = f"Indexing PDF files failed: {str(e)}"
+            traceback.print_exc()
+        finally:
+            self.indexing_done.set()
+            print(self.startup_timer.report())
+
+    def status(self):
+        """Readiness message for the UI."""
+        if not self.ready.is_set():
+            return f"{self.startup_status} ({self.startup_timer.elapsed():.0f}s)"
+        status = (f"{self.startup_status}: {len(self.vector_store.text_vectors)} text vectors and "
+                  f"{len(self.vector_store.image_vectors)} image vectors indexed")
+        if not self.indexing_done.is_set() or self.indexing_error is not None:
+            status += f" ({self.indexing_status})"
+        return status
+
+    def save_metrics(self):
+        """Write the process's metrics to the cache directory for `python -m src.utils.metrics`."""
+        try:
+            metrics.save(self.metrics_file)
+        except Exception as e:
+            print(f"Error saving metrics: {e}")
     
     def process_existing_pdfs(self):
-        """Automatically process any PDF files in the raw directory that haven't been processed yet."""
+        """Bring the index in line with the PDF files in the raw directory.
+
+        New files are ingested, files whose content changed since they were ingested are
+        re-ingested in place of their old vectors, and the vectors of removed files are
+        deleted. Unchanged files are skipped without being read.
+        """
         # Get all PDF files in the raw directory
         pdf_files = [f for f in os.listdir(self.raw_dir) if f.lower().endswith('.pdf')]
-        
-        if not pdf_files:
-            print("No PDF files found in the raw directory.")
-            return
-        
-        # Check which files have already been processed
-        processed_files = [os.path.splitext(f)[0] for f in os.listdir(self.processed_dir) 
-                          if f.endswith('.json')]
-        
-        # Filter to only unprocessed files
-        new_pdf_files = [f for f in pdf_files 
-                        if os.path.splitext(f)[0] not in processed_files]
-        
-        if not new_pdf_files:
+
+        # Files processed before the manifest existed are taken as they are
+        for pdf_file in pdf_files:
+            if pdf_file not in self.document_manifest and os.path.exists(self._processed_path(pdf_file)):
+                self.document_manifest.record(pdf_file, os.path.join(self.raw_dir, pdf_file))
+
+        changes = self.document_manifest.diff(self.raw_dir, pdf_files)
+
+        for pdf_file in changes['removed']:
+            print(f"Removing {pdf_file} from the index...")
+            self.vector_store.delete_document(pdf_file)
+            processed_file = self._processed_path(pdf_file)
+            if os.path.exists(processed_file):
+                os.remove(processed_file)
+            self.document_manifest.remove(pdf_file)
+
+        to_process = changes['new'] + changes['changed']
+        if not to_process:
             print("All PDF files have already been processed.")
-            return
-        
-        print(f"Found {len(new_pdf_files)} new PDF files in raw directory. Processing...")
-        
-        # Process each new PDF file
-        for pdf_file in new_pdf_files:
+        else:
+            print(f"Found {len(changes['new'])} new and {len(changes['changed'])} changed PDF files "
+                  f"in raw directory. Processing...")
+
+        # Process each new or changed PDF file
+        for i, pdf_file in enumerate(to_process, 1):
             pdf_path = os.path.join(self.raw_dir, pdf_file)
             print(f"Processing {pdf_file}...")
-            
+            self.indexing_status = f"Indexing new PDF files: {pdf_file} ({i} of {len(to_process)})"
+
             try:
-                # Process PDF and extract content
-                document_data = self.pdf_processor.process_pdf(pdf_path)
-                
-                # Save processed data
-                processed_file = os.path.join(
-                    self.processed_dir, 
-                    f"{os.path.splitext(os.path.basename(pdf_file))[0]}.json"
-                )
-                
-                # Remove image bytes before saving (too large)
-                save_data = document_data.copy()
-                for page in save_data['pages']:
-                    for img in page.get('images', []):
-                        if 'image_bytes' in img:
-                            img['image_bytes'] = '[BINARY DATA REMOVED FOR STORAGE]'
-                
-                with open(processed_file, "w") as f:
-                    json.dump(save_data, f)
-                
-                # Generate text embeddings
-                text_vectors = self.text_embedder.embed_document(document_data)
-                self.vector_store.add_text_vectors(text_vectors)
-                
-                # Generate image embeddings
-                image_vectors = self.image_embedder.embed_document_images(document_data)
-                self.vector_store.add_image_vectors(image_vectors)
-                
-                print(f"Successfully processed {pdf_file} with {len(document_data['pages'])} pages")
-                print(f"Generated {len(text_vectors)} text vectors and {len(image_vectors)} image vectors")
-                
+                # Stream pages through OCR and embedding into the vector store
+                self.vector_store.delete_document(pdf_file)
+                stats = self.ingestion_pipeline.ingest(pdf_path, self._processed_path(pdf_file))
+                self.document_manifest.record(pdf_file, pdf_path)
+
+                print(f"Successfully processed {pdf_file} with {stats['pages']} pages")
+                print(f"Generated {stats['text_vectors']} text vectors and {stats['image_vectors']} image vectors")
+
             except Exception as e:
                 print(f"Error processing {pdf_file}: {str(e)}")
-    
+
+        self.document_manifest.save()
+        self.save_metrics()
+        self.indexing_status = "Indexed"
+
+    def _processed_path(self, pdf_file):
+        return os.path.join(self.processed_dir, f"{os.path.splitext(os.path.basename(pdf_file))[0]}.json")
+
     def ingest_document(self, file_obj):
         """Process and ingest a document into the RAG system."""
         if file_obj is None:
             return "No file provided."
+        if not self.indexing_done.is_set():
+            status = self.indexing_status if self.ready.is_set() else self.startup_status
+            return f"The system is still indexing its PDF files ({status}). Please try again shortly."
             
         try:
             # Save uploaded file temporarily
@@ -129,34 +225,13 @@ class AerospaceRAGApp:
             with open(temp_path, "wb") as f:
                 f.write(file_obj.read())
             
-            # Process PDF and extract content
-            document_data = self.pdf_processor.process_pdf(temp_path)
+            # Stream pages through OCR and embedding into the vector store, replacing
+            # any earlier version of the same document
+            self.vector_store.delete_document(os.path.basename(file_obj.name))
+            stats = self.ingestion_pipeline.ingest(temp_path, self._processed_path(file_obj.name))
+            self.save_metrics()
             
-            # Save processed data
-            processed_file = os.path.join(
-                self.processed_dir, 
-                f"{os.path.splitext(os.path.basename(file_obj.name))[0]}.json"
-            )
-            
-            # Remove image bytes before saving (too large)
-            save_data = document_data.copy()
-            for page in save_data['pages']:
-                for img in page.get('images', []):
-                    if 'image_bytes' in img:
-                        img['image_bytes'] = '[BINARY DATA REMOVED FOR STORAGE]'
-            
-            with open(processed_file, "w") as f:
-                json.dump(save_data, f)
-            
-            # Generate text embeddings
-            text_vectors = self.text_embedder.embed_document(document_data)
-            self.vector_store.add_text_vectors(text_vectors)
-            
-            # Generate image embeddings
-            image_vectors = self.image_embedder.embed_document_images(document_data)
-            self.vector_store.add_image_vectors(image_vectors)
-            
-            return f"Successfully ingested {file_obj.name} with {len(document_data['pages'])} pages, {len(text_vectors)} text chunks, and {len(image_vectors)} images."
+            return f"Successfully ingested {file_obj.name} with {stats['pages']} pages, {stats['text_vectors']} text chunks, and {stats['image_vectors']} images."
         
         except Exception as e:
             import traceback
@@ -166,67 +241,142 @@ class AerospaceRAGApp:
     def query(self, query_text, top_k=5):
         """Query the RAG system with text."""
         try:
-            print(f"Received query: {query_text}")
-            
-            # Check for empty query
-            if not query_text or query_text.strip() == "":
-                return "Error: Please provide a text query", None
-            
-            # Text-only mode
-            mode = "text"
-            image_bytes = None
-            
-            # Check if we have any vectors
-            print(f"Text vectors: {len(self.vector_store.text_vectors)}")
-            print(f"Image vectors: {len(self.vector_store.image_vectors)}")
-            
-            if len(self.vector_store.text_vectors) == 0:
-                return "No documents have been indexed yet. Please add documents first.", None
-            
-            # Retrieve relevant content
-            try:
-                print("Retrieving relevant content...")
-                retrieved_items = self.retriever.retrieve(
-                    query_text, 
-                    top_k=top_k, 
-                    mode=mode, 
-                    image_bytes=image_bytes
-                )
-                print(f"Retrieved {len(retrieved_items)} items")
-            except Exception as e:
-                print(f"Error during retrieval: {str(e)}")
-                return f"Error during retrieval: {str(e)}", None
+            retrieved_items, error = self._retrieve(query_text, top_k)
+            if error:
+                return error, None
             
             # Build response
             try:
                 print("Building response...")
-                response = self.response_builder.build_response(query_text, retrieved_items)
+                response = self.response_builder.build_response(
+                    query_text,
+                    retrieved_items,
+                    query_embedding=self.retriever.embed_query(query_text),
+                    store_version=self.vector_store.version
+                )
                 print("Response built successfully")
             except Exception as e:
                 print(f"Error building response: {str(e)}")
                 return f"Error building response: {str(e)}", None
-            
-            # Format the response for display
-            formatted_response = response['text_response']
-            
-            if response['sources']:
-                formatted_response += "\n\nSources:\n"
-                for source in response['sources']:
-                    formatted_response += f"- {source['document_id']}, Page {source['page_num']}\n"
+            finally:
+                self.save_metrics()
             
             # Return the full response and formatted text
-            return formatted_response, response
+            return self._format_response(response), response
         
         except Exception as e:
             print(f"Unexpected error in query: {str(e)}")
             import traceback
             traceback.print_exc()
             return f"An unexpected error occurred: {str(e)}", None
+
+    def query_stream(self, query_text, top_k=5):
+        """
+        Query the RAG system with text, streaming the answer as it is generated.
+
+        Yields (formatted_text, response) pairs, like query returns, as the answer grows;
+        sources are appended once it is complete. Time to first token is measured from
+        when the query was received and reported with the final response.
+        """
+        start = time.perf_counter()
+        try:
+            retrieved_items, error = self._retrieve(query_text, top_k)
+            if error:
+                yield error, None
+                return
+            retrieval_seconds = time.perf_counter() - start
+
+            print("Streaming response...")
+            response = None
+            first_token = None
+            stream = self.response_builder.stream_response(
+                query_text,
+                retrieved_items,
+                query_embedding=self.retriever.embed_query(query_text),
+                store_version=self.vector_store.version
+            )
+            for response in stream:
+                if first_token is None and response['timings']['time_to_first_token'] is not None:
+                    first_token = time.perf_counter() - start
+                    print(f"Time to first token: {first_token:.2f}s "
+                          f"(retrieval {retrieval_seconds:.2f}s, LLM {response['timings']['time_to_first_token']:.2f}s)")
+                if response['done']:
+                    break
+                yield response['text_response'], response
+
+            response['timings']['query_time_to_first_token'] = first_token
+            if first_token is not None:
+                metrics.observe("query_time_to_first_token_seconds", first_token)
+            metrics.observe("query_seconds", time.perf_counter() - start)
+            self.save_metrics()
+            if response.get('cached'):
+                print(f"Answer served from cache ({self.response_builder.answer_cache.stats()})")
+            yield self._format_response(response), response
+            print(f"Response streamed in {time.perf_counter() - start:.2f}s")
+
+        except Exception as e:
+            print(f"Unexpected error in query: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            yield f"An unexpected error occurred: {str(e)}", None
+
+    def _retrieve(self, query_text, top_k):
+        """Retrieve items for a query; returns (items, None) or (None, error message)."""
+        print(f"Received query: {query_text}")
+        
+        # Check for empty query
+        if not query_text or query_text.strip() == "":
+            return None, "Error: Please provide a text query"
+
+        if not self.ready.is_set():
+            return None, f"The system is still starting up ({self.startup_status}). Please try again shortly."
+        
+        # Text-only mode
+        mode = "text"
+        image_bytes = None
+        
+        # Check if we have any vectors
+        print(f"Text vectors: {len(self.vector_store.text_vectors)}")
+        print(f"Image vectors: {len(self.vector_store.image_vectors)}")
+        
+        if len(self.vector_store.text_vectors) == 0:
+            return None, "No documents have been indexed yet. Please add documents first."
+        
+        # Retrieve relevant content
+        try:
+            print("Retrieving relevant content...")
+            retrieved_items = self.retriever.retrieve(
+                query_text, 
+                top_k=top_k, 
+                mode=mode, 
+                image_bytes=image_bytes
+            )
+            print(f"Retrieved {len(retrieved_items)} items")
+            print(f"Retrieval cache stats: {self.retriever.cache_stats()}")
+        except Exception as e:
+            print(f"Error during retrieval: {str(e)}")
+            return None, f"Error during retrieval: {str(e)}"
+
+        return retrieved_items, None
+
+    def _format_response(self, response):
+        """Format the response for display."""
+        formatted_response = response['text_response']
+        
+        if response['sources']:
+            formatted_response += "\n\nSources:\n"
+            for source in response['sources']:
+                formatted_response += f"- {source['document_id']}, Page {source['page_num']}\n"
+        
+        return formatted_response
     
     def create_ui(self):
         """Create the Gradio UI for the application."""
+        import gradio as gr
+
         with gr.Blocks(title="Aerospace Multimodal RAG") as app:
             gr.Markdown("# Aerospace Multimodal RAG System")
+            status_text = gr.Markdown(f"**Status:** {self.status()}")
             
             with gr.Row():
                 # Left column - Document Ingestion
@@ -260,39 +410,61 @@ class AerospaceRAGApp:
                     query_button = gr.Button("Submit Query", variant="primary")
                     response_text = gr.Textbox(label="Response", lines=20)
                     
-                    # Simple query function that returns only a string
+                    # Streams the answer into the textbox as tokens arrive
                     def simple_query(text):
                         try:
-                            result, _ = self.query(text)
-                            return result
+                            for result, _ in self.query_stream(text):
+                                yield result
                         except Exception as e:
                             import traceback
                             traceback.print_exc()
-                            return f"Error: {str(e)}"
+                            yield f"Error: {str(e)}"
                     
-                    # Use the simple function directly
+                    # Use the generator function directly
                     query_button.click(
                         fn=simple_query,
                         inputs=[query_text],
                         outputs=[response_text]
                     )
+
+            with gr.Accordion("Stage timings", open=False):
+                metrics_text = gr.Textbox(label="Per-stage latency since startup", lines=15, max_lines=30)
+
+            # Poll the startup status and metrics until the page is closed
+            app.load(fn=lambda: f"**Status:** {self.status()}", outputs=[status_text], every=2)
+            app.load(fn=metrics.summary, outputs=[metrics_text], every=5)
             
             return app
     
     def interpreter_mode(self):
         """Run in interpreter mode for direct interaction."""
         print("\n=== Aerospace RAG Interpreter Mode ===")
-        print("Type 'exit' or 'quit' to end the session\n")
+        print("Type 'exit' or 'quit' to end the session, 'metrics' for per-stage timings\n")
+
+        if not self.ready.is_set():
+            print("Waiting for startup to finish...")
+            self.ready.wait()
+        print(self.status())
         
         while True:
             query = input("\nEnter your query: ")
             if query.lower() in ['exit', 'quit']:
                 print("Exiting interpreter mode.")
                 break
+            if query.lower() == 'metrics':
+                print(metrics.summary())
+                continue
             
-            response, _ = self.query(query)
             print("\n--- Response ---")
-            print(response)
+            printed = ""
+            response = None
+            for text, response in self.query_stream(query):
+                # Each update extends the previous one; print only what is new
+                print(text[len(printed):] if text.startswith(printed) else text, end="", flush=True)
+                printed = text
+            print()
+            if response is not None and response['timings'].get('query_time_to_first_token') is not None:
+                print(f"(time to first token: {response['timings']['query_time_to_first_token']:.2f}s)")
             print("----------------")
 
 # Script execution logic
@@ -305,11 +477,8 @@ if __name__ == "__main__":
     print("Initializing Aerospace RAG system...")
     print("This will check for new PDF files in the data/raw/ directory")
     app = AerospaceRAGApp()
-    
-    # Display vector store stats
-    text_count = len(app.vector_store.text_vectors)
-    image_count = len(app.vector_store.image_vectors)
-    print(f"Vector store contains {text_count} text vectors and {image_count} image vectors")
+    print(f"Application created in {app.startup_timer.elapsed():.2f}s; "
+          f"models and new PDFs are loading in the background")
     
     # Check for command line arguments
     if len(sys.argv) > 1 and sys.argv[1] == '--interpreter':